@@ -0,0 +1,199 @@
+#!/bin/env python
+
+"""
+aioscope.py
+
+asyncio front end for pyoscope.
+
+PyOscopeRealtime is normally driven by a matplotlib timer, which needs a
+GUI event loop. AsyncScope drives a non-interactive PyOscopeRealtime from
+an asyncio event loop instead, so that one loop can run many scopes
+alongside e.g. instrument I/O. Reader updates, i.e. reading and parsing
+the new data, run in an executor; the plot is updated on the loop.
+
+Requires Python 3.6 or later.
+
+Example:
+
+    async def main():
+        scope = AsyncScope('testdata.txt', header=0)
+        scope.plot('second', ['first', 'third'], legend=True)
+        scope.windowsize(200)
+        async for frame in scope.frames(interval=0.5):
+            print(len(frame.new), 'new rows')
+            await scope.render('scope.png')
+
+    asyncio.get_event_loop().run_until_complete(main())
+"""
+releasestatus = 'dev'
+
+import asyncio
+import functools
+from collections import namedtuple
+from pyoscope import PyOscopeRealtime
+
+
+__all__ = ['AsyncScope', 'Frame']
+
+
+class Frame(namedtuple('Frame', ['data', 'new', 'reset', 'time'])):
+    """
+    Result of a single update of an AsyncScope.
+
+    `data` is the full data set after the update and `new` holds the rows
+    added by the update. `reset` is True if the data did not simply grow,
+    e.g. because the file was truncated or switched, in which case `new` is
+    all of `data`. `time` is the event loop time of the update.
+    """
+    __slots__ = ()
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except AttributeError:  # Python < 3.7
+        return asyncio.get_event_loop()
+
+
+class AsyncScope(object):
+    """
+    Drives a PyOscopeRealtime from an asyncio event loop.
+
+    Creates a non-interactive PyOscopeRealtime for the file `f` read by
+    `reader`, passing it the remaining keyword arguments. Alternatively, an
+    existing non-interactive PyOscopeRealtime may be passed as `scope`.
+    Attributes that are not defined here, e.g. `plot`, `windowsize` and
+    `data`, are those of the scope.
+
+    `executor` is the concurrent.futures executor that reader updates and
+    rendering run in, by default the loop's default executor. A reader may
+    instead define a coroutine method `update_data_async`, e.g. to read
+    from a socket, which is then awaited on the loop.
+
+    Updates of a single AsyncScope never overlap. The scope's lock is only
+    taken on the loop thread, to apply an update to the plot, and its
+    `readlock` in the executor, to read, so neither a slow read nor a render
+    blocks other scopes or the loop. Use `update`,
+    `frames` or `run` instead of `export_frames`, and `switch_file` and
+    `render` of the AsyncScope rather than those of the scope.
+    """
+    def __init__(self, f=None, reader=None, scope=None, executor=None,
+                 **kwargs):
+        if scope is None:
+            scope = PyOscopeRealtime(f=f, reader=reader, interactive=False,
+                                     **kwargs)
+        elif scope.interactive:
+            raise ValueError('scope must not be interactive.')
+        self.scope = scope
+        self.executor = executor
+        self._guard = None  # asyncio.Lock, created on the loop
+
+    def __getattr__(self, name):
+        if name == 'scope':  # Not set yet
+            raise AttributeError(name)
+        return getattr(self.scope, name)
+
+    def _lock(self):
+        if self._guard is None:
+            self._guard = asyncio.Lock()
+        return self._guard
+
+    async def _call(self, func, *args, **kwargs):
+        """
+        Run `func` in the executor.
+        """
+        return await _running_loop().run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs))
+
+    async def read(self):
+        """
+        Read the changes to the data file, without showing them.
+
+        Returns the reader's updated data.
+        """
+        reader = self.scope.reader
+        update = getattr(reader, 'update_data_async', None)
+        if update is not None:
+            return await update()
+        return await self._call(self._read)
+
+    def _read(self):
+        with self.scope.readlock:
+            return self.scope.reader.update_data()
+
+    async def update(self):
+        """
+        Read the changes to the data file and update the plot.
+
+        Returns a Frame, or None if the scope has no file.
+        """
+        async with self._lock():
+            scope = self.scope
+            if not scope._initialized:
+                return None
+            old = scope.data
+            dropped = scope.dropped
+            scope._apply_update(await self.read())
+            return self._frame(old, scope.data, scope.dropped - dropped)
+
+    @staticmethod
+    def _frame(old, data, dropped=0):
+        # `dropped` rows of the old data were dropped by a memory budget,
+        # see memory.MemoryBudget
+        n = 0 if (old is None) else max(len(old) - dropped, 0)
+        reset = ((old is None) or (len(data) < n)
+                 or (list(data.columns) != list(old.columns)))
+        new = data if reset else data.iloc[n:]
+        return Frame(data, new, reset, _running_loop().time())
+
+    async def frames(self, interval=0.5, maxframes=None, changes=False):
+        """
+        Asynchronous iterator of the Frames of periodic updates.
+
+        Updates every `interval` seconds, for at most `maxframes` frames or
+        forever if None. An update that is late, e.g. because the loop was
+        busy, starts the next period rather than being made up for. If
+        `changes` is True, updates that read no new data are not yielded.
+        """
+        loop = _running_loop()
+        count = 0
+        due = loop.time()
+        while (maxframes is None) or (count < maxframes):
+            frame = await self.update()
+            if (frame is not None) and (frame.reset or len(frame.new)
+                                        or not changes):
+                count += 1
+                yield frame
+            due = max(due + interval, loop.time())
+            await asyncio.sleep(due - loop.time())
+
+    async def run(self, interval=0.5):
+        """
+        Update every `interval` seconds until cancelled.
+
+        Run it as a task, e.g. asyncio.ensure_future(scope.run()), and
+        cancel the task to stop.
+        """
+        async for frame in self.frames(interval):
+            pass
+
+    async def render(self, fname, **kwargs):
+        """
+        Render the current plot to the file `fname` in the executor. See
+        PyOscopeStatic.render_to_file.
+        """
+        async with self._lock():
+            return await self._call(self.scope.render_to_file, fname,
+                                    **kwargs)
+
+    async def switch_file(self, newfile, reader=None, **kwargs):
+        """
+        Switch the file that is plotted, reading it in the executor. See
+        PyOscopeStatic.switch_file.
+        """
+        async with self._lock():
+            return await self._call(self.scope.switch_file, newfile, reader,
+                                    **kwargs)
+
+    def stop(self):
+        self.scope.stop()
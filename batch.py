@@ -0,0 +1,236 @@
+#!/bin/env python
+
+"""
+batch.py
+
+Parallel batch rendering of static pyoscope plots.
+
+Renders many data files to image files using a single plot
+specification, spreading the files over a pool of worker processes.
+Each worker owns a single non-interactive PyOscopeStatic object and
+reuses its figure for every file it renders.
+
+Example:
+
+    spec = {'xnames': ['second'], 'ynames': ['first', 'third'],
+            'legendflag': True}
+    results = render_batch(['run1.txt', 'run2.txt'], spec,
+                           output='plots/{stem}.png', header=0)
+    for r in results:
+        print r.filename, r.elapsed, r.error
+
+or from the command line:
+
+    python batch.py -x second -y first -y third --legend \\
+        -o 'plots/{stem}.png' run1.txt run2.txt
+"""
+releasestatus = 'dev'
+
+import os
+import sys
+import time
+import json
+import argparse
+import traceback
+import multiprocessing
+from collections import namedtuple
+from pyoscope import PlotSpec, PyOscopeStatic
+
+
+__all__ = ['render_batch', 'BatchResult']
+
+
+class BatchResult(namedtuple('BatchResult', ['filename', 'output',
+                                             'elapsed', 'error'])):
+    """
+    Result of rendering a single file in a batch.
+
+    `elapsed` is the wall-clock time in seconds spent reading, plotting and
+    writing the file. `error` is None on success, otherwise the formatted
+    traceback of the failure.
+    """
+    __slots__ = ()
+
+
+# Per-process state, set up by _init_worker
+_worker = {}
+
+
+def _output_name(filename, output):
+    """
+    Expand the output filename template `output` for the data file
+    `filename`.
+    """
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    stem = os.path.splitext(basename)[0]
+    return output.format(dirname=dirname, basename=basename, stem=stem)
+
+
+def _init_worker(spec, reader, figsize, dpi, format, reader_kwargs):
+    scope = PyOscopeStatic(interactive=False)
+    if figsize is not None:
+        scope.fig.set_size_inches(figsize)
+    _worker['scope'] = scope
+    _worker['spec'] = spec
+    _worker['reader'] = reader
+    _worker['dpi'] = dpi
+    _worker['format'] = format
+    _worker['reader_kwargs'] = reader_kwargs
+
+
+def _render_one(job):
+    index, filename, outname = job
+    scope = _worker['scope']
+    t0 = time.time()
+    try:
+        # Close the previous file before the reader opens the next one, or
+        # a long batch runs out of file handles
+        if scope.reader is not None:
+            scope.reader.close()
+        scope.apply_spec(_worker['spec'], filename, _worker['reader'],
+                         **_worker['reader_kwargs'])
+        scope.render_to_file(outname, format=_worker['format'],
+                             dpi=_worker['dpi'])
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    elapsed = time.time() - t0
+    return index, BatchResult(filename, outname, elapsed, error)
+
+
+def render_batch(files, spec, output=None, reader=None, processes=None,
+                 figsize=None, dpi=None, format=None, callback=None,
+                 **kwargs):
+    """
+    Render each file in `files` to an image file in parallel.
+
+    `spec` is a PlotSpec, or a plot specification dictionary with the same
+    keys used by `PyOscopeStatic._plot_from_dict`, i.e. 'xnames', 'ynames',
+    'xlabels', 'ylabels', 'labels', 'legendflag', 'legendloc', 'splitx',
+    'splity', 'sharex', 'sharey', 'xtrans' and 'ytrans'. Only 'ynames' is
+    required; missing keys take the `plot` defaults. Transformation
+    functions must be picklable, i.e. defined at module level.
+
+    `output` is a template for the output filename of each file. It may
+    contain the fields {dirname}, {basename} and {stem} (basename without
+    extension) of the data file. Defaults to '{dirname}/{stem}.png', i.e.
+    an image next to each data file.
+
+    `reader` is the reader class to use, defaulting to DefaultReader. The
+    remaining keyword arguments are passed to the reader.
+
+    `processes` is the number of worker processes. Defaults to the number
+    of CPUs.
+
+    `figsize` (inches) and `dpi` set the size of the rendered images.
+    `format` is the image format, inferred from the output filename if
+    None.
+
+    `callback`, if not None, is called with each BatchResult as soon as
+    it is available, e.g. for progress reporting.
+
+    Returns a list of BatchResult objects in the same order as `files`.
+    Failures do not abort the batch; they are reported in the `error`
+    field of the corresponding result.
+    """
+    if output is None:
+        output = os.path.join('{dirname}', '{stem}.png')
+    if not isinstance(spec, PlotSpec):
+        spec = PlotSpec.from_dict(spec)
+    jobs = [(i, f, _output_name(f, output)) for i, f in enumerate(files)]
+    for dirname in set(os.path.dirname(job[2]) for job in jobs):
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(jobs)))
+
+    initargs = (spec, reader, figsize, dpi, format, kwargs)
+    pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                initargs=initargs)
+    try:
+        results = [None]*len(jobs)
+        # chunksize=1 balances load when file sizes vary a lot
+        for i, result in pool.imap_unordered(_render_one, jobs, chunksize=1):
+            results[i] = result
+            if callback is not None:
+                callback(result)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return results
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Render pyoscope plots of many data files in parallel.')
+    parser.add_argument('files', nargs='+', help='data files to render')
+    parser.add_argument('-o', '--output', default=None,
+                        help="output filename template, may use {dirname}, "
+                             "{basename} and {stem} (default: "
+                             "'{dirname}/{stem}.png')")
+    parser.add_argument('-s', '--spec', default=None,
+                        help='plot specification saved by PlotSpec.save')
+    parser.add_argument('-x', dest='xnames', action='append', default=None,
+                        help='x column name (may be repeated)')
+    parser.add_argument('-y', dest='ynames', action='append', default=None,
+                        help='y column name (may be repeated)')
+    parser.add_argument('--legend', action='store_true',
+                        help='show legends')
+    parser.add_argument('-r', '--reader', default=None,
+                        help='name of reader class in readers module')
+    parser.add_argument('--reader-kwargs', default='{}',
+                        help='JSON object of keyword arguments for reader')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes (default: #CPUs)')
+    parser.add_argument('--dpi', type=float, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    spec = {}
+    if args.spec is not None:
+        spec.update(PlotSpec.load(args.spec).to_dict())
+    if args.xnames is not None:
+        spec['xnames'] = args.xnames
+    if args.ynames is not None:
+        spec['ynames'] = args.ynames
+    if args.legend:
+        spec['legendflag'] = True
+
+    reader = None
+    if args.reader is not None:
+        import readers
+        reader = getattr(readers, args.reader)
+    reader_kwargs = json.loads(args.reader_kwargs)
+
+    def report(result):
+        status = 'ok' if result.error is None else 'FAILED'
+        sys.stdout.write('{0:8.3f} s  {1:6}  {2} -> {3}\n'.format(
+            result.elapsed, status, result.filename, result.output))
+        sys.stdout.flush()
+
+    t0 = time.time()
+    results = render_batch(args.files, spec, output=args.output,
+                           reader=reader, processes=args.processes,
+                           dpi=args.dpi, callback=report, **reader_kwargs)
+    elapsed = time.time() - t0
+
+    failures = [r for r in results if r.error is not None]
+    for r in failures:
+        sys.stderr.write('\n{0}:\n{1}'.format(r.filename, r.error))
+    cputime = sum(r.elapsed for r in results)
+    sys.stdout.write('{0} files, {1} failed, {2:.3f} s elapsed, '
+                     '{3:.3f} s total render time\n'.format(
+                         len(results), len(failures), elapsed, cputime))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/bin/env python
+
+"""
+import_time.py
+
+Import-time benchmark for pyoscope.
+
+Imports each module in a fresh interpreter several times and reports
+the best time. Fails (exit status 1) if a module takes longer than its
+budget to import, or if it drags in a heavy module that it should only
+load on demand.
+
+Example:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --scale 2   # slow machine
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+
+# module: (budget in ms, modules that must not be imported)
+_checks = {'readers': (150., ['matplotlib', 'pandas']),
+           'pyoscope': (250., ['matplotlib.pyplot', 'pandas']),
+           'pyoscope_cli': (50., ['numpy', 'matplotlib', 'pandas'])}
+
+_probe = """
+import sys, time, json
+t0 = time.time()
+import {module}
+dt = time.time() - t0
+json.dump({{'time': dt, 'modules': sorted(sys.modules)}}, sys.stdout)
+"""
+
+
+def time_import(module, repeat=5):
+    """
+    Import `module` in `repeat` fresh interpreters.
+
+    Returns the best import time in seconds and the list of modules that
+    were loaded after the import.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+    best = None
+    modules = []
+    for i in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c',
+                                       _probe.format(module=module)],
+                                      env=env)
+        result = json.loads(out.decode('utf-8'))
+        if (best is None) or (result['time'] < best):
+            best = result['time']
+        modules = result['modules']
+    return best, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.,
+                        help='multiply all time budgets by this factor')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in sorted(_checks):
+        budget, forbidden = _checks[module]
+        budget *= args.scale
+        dt, modules = time_import(module, args.repeat)
+        loaded = [mod for mod in forbidden if mod in modules]
+        ok = (dt*1000. <= budget) and not loaded
+        failed = failed or not ok
+        sys.stdout.write('{0:<14} {1:8.1f} ms (budget {2:6.1f} ms)  '
+                         '{3}\n'.format(module, dt*1000., budget,
+                                        'ok' if ok else 'REGRESSION'))
+        if loaded:
+            sys.stdout.write('    unexpectedly imported: {0}\n'.format(
+                ', '.join(loaded)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
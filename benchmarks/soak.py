@@ -0,0 +1,242 @@
+#!/bin/env python
+
+"""
+soak.py
+
+Soak test of realtime plotting.
+
+Replays a recorded data file into a temporary file (see replay.Replay) and
+plots it with a non-interactive PyOscopeRealtime, updating and rendering
+it with Agg at a fixed frame interval for a long time. Reports the
+percentiles of the frame latency (reading the new data and rendering),
+the number of dropped frames, i.e. frame times missed because a frame
+took too long, and the growth of the resident memory. Fails (exit status
+1) if any of them exceeds its limit, or, with a memory budget, if data
+moved to memory-mapped files are in memory again.
+
+Example:
+
+    python benchmarks/soak.py testdata.txt -x first -y second \\
+        --rate 2000 --loop 0 --duration 3600 --window 5000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from collections import namedtuple
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from pyoscope import PyOscopeRealtime
+from replay import Replay, _count_header
+
+
+class SoakResult(namedtuple('SoakResult', ['frames', 'dropped', 'latency',
+                                           'rows', 'rss', 'rssgrowth',
+                                           'elapsed', 'copied'])):
+    """
+    Result of a soak test.
+
+    `latency` is a dictionary of the 50th, 90th, 99th and 100th
+    percentiles of the frame latency in seconds. `rss` is the list of
+    (time, bytes) samples of the resident memory, and `rssgrowth` the
+    growth in bytes per hour of a linear fit to the samples after the
+    first tenth of the test, i.e. after warming up. `copied` is the number
+    of bytes of the data moved to memory-mapped files by the memory budget
+    that are in memory again at the end, i.e. copied from the files.
+    """
+    __slots__ = ()
+
+
+def rss():
+    """
+    Resident memory of this process in bytes.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):  # Not Linux; the peak instead
+        import resource
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if (sys.platform == 'darwin') else maxrss*1024
+
+
+def _growth(samples):
+    """
+    Slope in bytes per hour of the (time, bytes) `samples` after the first
+    tenth of them.
+    """
+    if len(samples) < 3:
+        return 0.
+    t0, t1 = samples[0][0], samples[-1][0]
+    later = [s for s in samples if s[0] >= t0 + 0.1*(t1 - t0)]
+    t, b = np.array(later, dtype=float).T
+    if np.ptp(t) <= 0:
+        return 0.
+    return np.polyfit(t, b, 1)[0]*3600.
+
+
+def soak(source, duration, interval=0.1, xnames=None, ynames=None,
+         window=None, rate=None, speed=1., burst=1, timecolumn=None,
+         header=None, loop=0, sample=10., budget=None):
+    """
+    Soak test plotting `source` replayed by replay.Replay (see there for
+    `rate`, `speed`, `burst`, `timecolumn`, `header` and `loop`) for
+    `duration` seconds, with a frame every `interval` seconds.
+
+    The plot shows `ynames` against `xnames` (see PyOscopeStatic.plot), in
+    a window of `window` samples. `budget`, if not None, is a memory
+    budget in bytes for the scope, see memory.MemoryBudget. The resident
+    memory is sampled every `sample` seconds.
+
+    Returns a SoakResult.
+    """
+    if header is None:
+        header = _count_header(source, ',')
+    tmpdir = tempfile.mkdtemp(prefix='pyoscope-soak-')
+    target = os.path.join(tmpdir, 'live.txt')
+    manager = None  # The MemoryBudget
+    rp = Replay(source, target, rate=rate, speed=speed, burst=burst,
+                timecolumn=timecolumn, header=header, loop=loop)
+    scope = None
+    try:
+        rp.start()
+        while rp.stats.rows < 2:  # Something to plot
+            if not rp.running():
+                raise ValueError("{0} has no data.".format(source))
+            time.sleep(0.01)
+        scope = PyOscopeRealtime(f=target, interactive=False,
+                                 header=(0 if header else None))
+        scope.plot(xnames, ynames)
+        scope.windowsize(window)
+        if budget is not None:
+            from memory import MemoryBudget
+
+            manager = MemoryBudget(budget)
+            manager.register(scope)
+
+        latencies = []
+        samples = [(0., rss())]
+        frames = dropped = 0
+        start = time.time()
+        due = start
+        nextsample = start + sample
+        while True:
+            now = time.time()
+            if now - start >= duration:
+                break
+            if due > now:
+                time.sleep(due - now)
+            t0 = time.time()
+            scope._update()
+            scope.render_rgba()
+            t1 = time.time()
+            latencies.append(t1 - t0)
+            frames += 1
+            # Frames whose time passed while rendering are dropped
+            due += interval
+            if t1 > due:
+                missed = int((t1 - due)/interval) + 1
+                dropped += missed
+                due += missed*interval
+            if t1 >= nextsample:
+                samples.append((t1 - start, rss()))
+                nextsample += sample
+        elapsed = time.time() - start
+        samples.append((elapsed, rss()))
+        rows = len(scope.data) + scope.dropped
+        copied = 0 if (manager is None) else \
+            sum(u.mapped - u.spilled for u in manager.usage())
+    finally:
+        rp.stop()
+        if scope is not None:
+            scope.stop()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    p = np.percentile(latencies, [50, 90, 99, 100]) if latencies else \
+        [float('nan')]*4
+    latency = dict(zip(('p50', 'p90', 'p99', 'max'), map(float, p)))
+    return SoakResult(frames, dropped, latency, rows, samples,
+                      _growth(samples), elapsed, copied)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('source', help='recorded data file')
+    parser.add_argument('-x', dest='xnames', action='append', default=None,
+                        help='x column name (may be repeated)')
+    parser.add_argument('-y', dest='ynames', action='append', default=None,
+                        help='y column name (may be repeated)')
+    parser.add_argument('-w', '--window', type=int, default=None,
+                        help='window size in samples')
+    parser.add_argument('-d', '--duration', type=float, default=60.,
+                        help='seconds to run (default: 60)')
+    parser.add_argument('-i', '--interval', type=float, default=0.1,
+                        help='seconds between frames (default: 0.1)')
+    parser.add_argument('-t', '--timecolumn', type=int, default=None)
+    parser.add_argument('-r', '--rate', type=float, default=None)
+    parser.add_argument('-s', '--speed', type=float, default=1.)
+    parser.add_argument('-b', '--burst', type=int, default=1)
+    parser.add_argument('-n', '--loop', type=int, default=0,
+                        help='passes over the recording, 0 to loop forever '
+                             '(default)')
+    parser.add_argument('--budget', type=float, default=None,
+                        help='memory budget of the scope in MB')
+    parser.add_argument('--sample', type=float, default=10.,
+                        help='seconds between memory samples')
+    parser.add_argument('--max-p99', type=float, default=None,
+                        help='limit of the 99th percentile latency in ms')
+    parser.add_argument('--max-dropped', type=float, default=None,
+                        help='limit of the fraction of frames dropped')
+    parser.add_argument('--max-growth', type=float, default=None,
+                        help='limit of the memory growth in MB per hour')
+    parser.add_argument('--json', default=None,
+                        help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    budget = None if (args.budget is None) else int(args.budget*2**20)
+    result = soak(args.source, args.duration, args.interval, args.xnames,
+                  args.ynames, args.window, args.rate, args.speed, args.burst,
+                  args.timecolumn, loop=args.loop, sample=args.sample,
+                  budget=budget)
+
+    total = result.frames + result.dropped
+    fraction = float(result.dropped)/total if total else 0.
+    growth = result.rssgrowth/2**20
+    checks = [('p99 latency', result.latency['p99']*1000., args.max_p99,
+               'ms'),
+              ('dropped frames', fraction, args.max_dropped, ''),
+              ('memory growth', growth, args.max_growth, 'MB/h'),
+              ('spill in memory', result.copied/2.**20,
+               None if (budget is None) else 0., 'MB')]
+    sys.stdout.write('{0} frames, {1} dropped, {2} rows in {3:.1f} s\n'
+                     .format(result.frames, result.dropped, result.rows,
+                             result.elapsed))
+    sys.stdout.write('latency  p50 {p50:.4f} s  p90 {p90:.4f} s  p99 '
+                     '{p99:.4f} s  max {max:.4f} s\n'.format(
+                         **result.latency))
+    sys.stdout.write('rss      {0:.1f} MB -> {1:.1f} MB\n'.format(
+        result.rss[0][1]/2.**20, result.rss[-1][1]/2.**20))
+    failed = False
+    for name, value, limit, unit in checks:
+        ok = (limit is None) or (value <= limit)
+        failed = failed or not ok
+        sys.stdout.write('{0:<16} {1:10.4g} {2:<5} (limit {3})  {4}\n'.format(
+            name, value, unit, 'none' if (limit is None) else limit,
+            'ok' if ok else 'REGRESSION'))
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(dict(result._asdict(), dropped_fraction=fraction),
+                      f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
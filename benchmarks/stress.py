@@ -0,0 +1,233 @@
+#!/bin/env python
+
+"""
+stress.py
+
+Concurrency stress test of realtime plotting.
+
+Plots a file that a writer thread appends to with a non-interactive
+PyOscopeRealtime whose reader is slowed down to take `--delay` seconds
+per update, like a slow parser. While an updater thread keeps updating the
+scope, control threads change its settings (window size, time window,
+autoscaling, measurements), render threads render it and reader threads
+check the settings and data they see. Reports the latency of the control
+calls. Fails (exit status 1) if a control call takes longer than its
+limit, i.e. waits for the reader, if a thread raises or hangs, or if the
+rows plotted at the end do not match the rows written.
+
+Example:
+
+    python benchmarks/stress.py --duration 20 --delay 0.5 --max-latency 200
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import traceback
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from pyoscope import PyOscopeRealtime
+from readers import DefaultReader
+
+
+class SlowReader(DefaultReader):
+    """
+    DefaultReader that takes `delay` more seconds for each update.
+    """
+    delay = 0.
+
+    def update_data(self):
+        time.sleep(self.delay)
+        return super(SlowReader, self).update_data()
+
+
+class _Worker(threading.Thread):
+    """
+    Thread that calls `func` until stopped, recording errors.
+    """
+    def __init__(self, name, func, stop, errors):
+        threading.Thread.__init__(self, name=name)
+        self.daemon = True
+        self.func = func
+        self.stop = stop
+        self.errors = errors
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                self.func()
+        except Exception:
+            self.errors.append((self.name, traceback.format_exc()))
+
+
+def stress(duration=10., delay=1., rate=500., controls=2, renders=1,
+           readers=1, seed=None):
+    """
+    Stress a scope for `duration` seconds, with a reader that takes
+    `delay` seconds per update, a writer appending `rate` rows per second,
+    and `controls`, `renders` and `readers` threads of each kind.
+
+    Returns a dictionary of the control call latencies in seconds by
+    call, the errors as (thread name, traceback) tuples, the names of the
+    threads that did not finish, the number of renders, and the numbers of
+    rows written and plotted.
+    """
+    rng = random.Random(seed)
+    tmpdir = tempfile.mkdtemp(prefix='pyoscope-stress-')
+    fname = os.path.join(tmpdir, 'live.txt')
+    stop = threading.Event()
+    errors = []
+    latencies = {}
+    counts = {'written': 0, 'renders': 0}
+
+    with open(fname, 'w') as f:
+        f.write('t,a,b\n')
+        for i in range(10):
+            f.write('{0},{1},{2}\n'.format(i, np.sin(i), np.cos(i)))
+    counts['written'] = 10
+
+    class Reader(SlowReader):
+        pass
+    Reader.delay = delay
+    scope = PyOscopeRealtime(f=fname, reader=Reader, interactive=False,
+                             header=0)
+    scope.plot('t', ['a', 'b'])
+
+    def write():
+        n = counts['written']
+        k = max(1, int(rate*0.01))
+        with open(fname, 'a') as f:
+            for i in range(n, n + k):
+                f.write('{0},{1},{2}\n'.format(i, np.sin(0.01*i),
+                                               np.cos(0.01*i)))
+        counts['written'] = n + k
+        time.sleep(0.01)
+
+    def update():
+        scope._update()
+
+    def timed(name, func, *args, **kwargs):
+        t0 = time.time()
+        func(*args, **kwargs)
+        latencies.setdefault(name, []).append(time.time() - t0)
+
+    def control():
+        choice = rng.randrange(5)
+        if choice == 0:
+            timed('windowsize', scope.windowsize, rng.choice([None, 100,
+                                                              1000]))
+        elif choice == 1:
+            timed('timewindow', scope.timewindow,
+                  rng.choice([None, 50., 500.]), 't')
+        elif choice == 2:
+            flag = rng.choice([True, False])
+            timed('autoscale', scope.autoscale, flag, flag)
+        elif choice == 3:
+            timed('measure', scope.measure, rng.choice([None, False]))
+        else:
+            timed('autoscale_axes', scope.autoscale_axes)
+        time.sleep(0.005)
+
+    def render():
+        scope.render_rgba()
+        counts['renders'] += 1
+
+    def check():
+        config = scope._plotdict
+        # autoscale sets both flags at once
+        if config['autoscalex'] != config['autoscaley']:
+            raise AssertionError('Inconsistent settings: {0}'.format(config))
+        data = scope.data
+        t = np.asarray(data['t'])
+        if np.any(np.diff(t) != 1):
+            raise AssertionError('Rows missing or out of order.')
+        time.sleep(0.001)
+
+    workers = [_Worker('writer', write, stop, errors),
+               _Worker('updater', update, stop, errors)]
+    workers += [_Worker('control{0}'.format(i), control, stop, errors)
+                for i in range(controls)]
+    workers += [_Worker('render{0}'.format(i), render, stop, errors)
+                for i in range(renders)]
+    workers += [_Worker('check{0}'.format(i), check, stop, errors)
+                for i in range(readers)]
+    try:
+        for w in workers:
+            w.start()
+        time.sleep(duration)
+        stop.set()
+        hung = []
+        for w in workers:
+            w.join(max(10., 10*delay))
+            if w.is_alive():
+                hung.append(w.name)
+        if not hung:
+            scope._update()
+        plotted = len(scope.data) + scope.dropped
+    finally:
+        stop.set()
+        scope.stop()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return {'latencies': latencies, 'errors': errors, 'hung': hung,
+            'renders': counts['renders'], 'written': counts['written'],
+            'plotted': plotted}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('-d', '--duration', type=float, default=10.,
+                        help='seconds to run (default: 10)')
+    parser.add_argument('--delay', type=float, default=1.,
+                        help='seconds the reader takes per update '
+                             '(default: 1)')
+    parser.add_argument('-r', '--rate', type=float, default=500.,
+                        help='rows written per second (default: 500)')
+    parser.add_argument('--controls', type=int, default=2)
+    parser.add_argument('--renders', type=int, default=1)
+    parser.add_argument('--readers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--max-latency', type=float, default=None,
+                        help='limit of the 99th percentile control call '
+                             'latency in ms (default: half the delay)')
+    args = parser.parse_args(argv)
+
+    limit = args.max_latency
+    if limit is None:
+        limit = 500.*args.delay
+    result = stress(args.duration, args.delay, args.rate, args.controls,
+                    args.renders, args.readers, args.seed)
+
+    failed = False
+    for name in sorted(result['latencies']):
+        times = np.array(result['latencies'][name])*1000.
+        p99 = np.percentile(times, 99)
+        ok = p99 <= limit
+        failed = failed or not ok
+        sys.stdout.write('{0:<16} {1:6d} calls  p50 {2:8.2f} ms  p99 '
+                         '{3:8.2f} ms  max {4:8.2f} ms  {5}\n'.format(
+                             name, len(times), np.median(times), p99,
+                             times.max(), 'ok' if ok else 'REGRESSION'))
+    sys.stdout.write('{0} renders, {1} rows written, {2} plotted\n'.format(
+        result['renders'], result['written'], result['plotted']))
+    for name, tb in result['errors']:
+        failed = True
+        sys.stdout.write('error in {0}:\n{1}'.format(name, tb))
+    if result['hung']:
+        failed = True
+        sys.stdout.write('hung: {0}\n'.format(', '.join(result['hung'])))
+    if not result['hung'] and (result['plotted'] != result['written']):
+        failed = True
+        sys.stdout.write('rows plotted do not match rows written\n')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
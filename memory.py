@@ -0,0 +1,570 @@
+#!/bin/env python
+
+"""
+memory.py
+
+Process-wide memory budget for realtime pyoscope plots.
+
+A PyOscopeRealtime keeps all of the data read from its file, so a process
+running many of them for a long time eventually runs out of memory.
+Scopes registered with a MemoryBudget report the size of their data after
+each update. When the registered scopes together use more than the
+budget, data are evicted from the least recently updated scopes first:
+
+    1. rows before the window shown (see PyOscopeStatic.windowsize and
+       timewindow) are dropped, then
+    2. the numeric columns are moved to memory-mapped temporary files, so
+       that the operating system can page out the rows that are not
+       shown.
+
+Example:
+
+    import memory
+
+    memory.set_budget(512*2**20)  # 512 MiB
+    for fname in files:
+        rt = PyOscopeRealtime(f=fname, header=0)
+        rt.plot('time', 'voltage')
+        rt.windowsize(10000)
+        memory.register(rt, name=fname)
+    ...
+    print memory.report()
+"""
+releasestatus = 'dev'
+
+import time
+import tempfile
+import threading
+from collections import namedtuple
+import numpy as np
+import readers
+
+
+__all__ = ['MemoryBudget', 'ScopeUsage', 'manager', 'set_budget',
+           'register', 'unregister', 'usage', 'report']
+
+
+class ScopeUsage(namedtuple('ScopeUsage', ['name', 'rows', 'resident',
+                                           'spilled', 'dropped', 'lastused',
+                                           'mapped'])):
+    """
+    Memory usage of a single scope registered with a MemoryBudget.
+
+    `rows` is the number of rows of its data, `resident` the bytes of them
+    in memory and `spilled` the bytes in memory-mapped files. `dropped` is
+    the number of rows dropped before its window so far, and `lastused`
+    the time.time() of its last update that changed the data. `mapped` is
+    the size of the rows held in memory-mapped files, which is more than
+    `spilled` if the data do not use the files but copies of them.
+    """
+    __slots__ = ()
+
+
+def _spillable(dtype):
+    return isinstance(dtype, np.dtype) and (dtype.kind in 'biufcmM')
+
+
+def _usage(data, mapped):
+    """
+    Bytes used by the DataFrame `data` as (resident, spilled), i.e. in
+    memory and in the memory-mapped arrays `mapped`, not counting the
+    contents of string columns, which would take a pass over all of them.
+    """
+    if data is None:
+        return 0, 0
+    resident = int(data.index.memory_usage())
+    spilled = 0
+    for j in range(data.shape[1]):
+        values = data.iloc[:, j].values
+        if isinstance(values, np.ndarray) and \
+                any(np.may_share_memory(values, a) for a in mapped):
+            spilled += values.nbytes
+        else:
+            resident += values.nbytes
+    return resident, spilled
+
+
+class _Spill(object):
+    """
+    Columns of a scope's data in buffers, the numeric ones in
+    memory-mapped temporary files.
+
+    The columns of each dtype share a Fortran-ordered (rows x columns)
+    buffer, which becomes a single block of the data that is not copied,
+    see readers._block_frame. Columns of extension dtypes (e.g. the strings
+    of pandas 3) are kept as a DataFrame.
+
+    Holds the rows `start` up to `stop` of the buffers, i.e. the rows of
+    the data. Rows appended to the data are written to the buffers, which
+    grow by doubling, and rows dropped from the data only advance `start`.
+    """
+    mincapacity = 4096
+
+    def __init__(self, data, spooldir=None):
+        self.spooldir = spooldir
+        self.lock = threading.Lock()
+        self.columns = list(data.columns)
+        self.coltypes = list(data.dtypes)
+        self.dtypes = []  # Of each buffer
+        self.positions = []  # Columns of each buffer
+        self.other = []  # Columns of extension dtypes
+        for j, dtype in enumerate(self.coltypes):
+            if not isinstance(dtype, np.dtype):
+                self.other.append(j)
+            elif dtype in self.dtypes:
+                self.positions[self.dtypes.index(dtype)].append(j)
+            else:
+                self.dtypes.append(dtype)
+                self.positions.append([j])
+        self.files = [None]*len(self.dtypes)
+        self.buffers = [None]*len(self.dtypes)
+        self.rest = data.iloc[:0, self.other]
+        self.capacity = 0
+        self.start = self.stop = 0
+        self.data = None  # The DataFrame made last, see frame
+        self._write(data)
+
+    @property
+    def mapped(self):
+        """
+        The buffers in files.
+        """
+        return [buf for f, buf in zip(self.files, self.buffers)
+                if f is not None]
+
+    @property
+    def nbytes(self):
+        """
+        Bytes of the rows held in files.
+        """
+        return (self.stop - self.start)*sum(buf.itemsize*buf.shape[1]
+                                            for buf in self.mapped)
+
+    def _map(self, capacity):
+        """
+        Make buffers of `capacity` rows, moving the rows held to the start.
+        """
+        for k, dtype in enumerate(self.dtypes):
+            shape = (capacity, len(self.positions[k]))
+            if _spillable(dtype):
+                f = tempfile.TemporaryFile(prefix='pyoscope-',
+                                           dir=self.spooldir)
+                f.truncate(capacity*shape[1]*dtype.itemsize)
+                new = np.memmap(f, dtype, 'r+', shape=shape, order='F')
+            else:  # Objects, i.e. strings, stay in memory
+                f = None
+                new = np.empty(shape, dtype, order='F')
+            if self.buffers[k] is not None:
+                new[:self.stop - self.start] = \
+                    self.buffers[k][self.start:self.stop]
+            # The data made so far keep their maps
+            if self.files[k] is not None:
+                self.files[k].close()
+            self.files[k] = f
+            self.buffers[k] = new
+        self.capacity = capacity
+        self.stop -= self.start
+        self.start = 0
+
+    def _write(self, new):
+        """
+        Append the rows of the DataFrame `new`.
+        """
+        n = len(new)
+        held = self.stop - self.start
+        if self.stop + n > self.capacity:
+            self._map(max(held + n, 2*held, self.mincapacity))
+        for buf, positions in zip(self.buffers, self.positions):
+            for k, j in enumerate(positions):
+                buf[self.stop:self.stop + n, k] = np.asarray(new.iloc[:, j])
+        if self.other:
+            rows = new.iloc[:, self.other]
+            self.rest = readers._append_rows(self.rest, rows) if held \
+                else rows.reset_index(drop=True)
+        self.stop += n
+
+    def fits(self, data):
+        """
+        Whether the rows of the DataFrame `data` fit the buffers.
+        """
+        return (list(data.columns) == self.columns) and \
+            (list(data.dtypes) == self.coltypes)
+
+    def matches(self, data):
+        """
+        Whether the DataFrame `data` is the data held with rows appended,
+        judging by its columns and the last row held.
+        """
+        held = self.stop - self.start
+        if (len(data) < held) or not self.fits(data):
+            return False
+        for dtype, positions, buf in zip(self.dtypes, self.positions,
+                                         self.buffers):
+            if not held or not _spillable(dtype):
+                continue
+            for k, j in enumerate(positions):
+                old = buf[self.stop - 1, k]
+                new = np.asarray(data.iloc[:, j])[held - 1]
+                if (old != new) and (old == old or new == new):  # NaN
+                    return False
+        return True
+
+    def append(self, data):
+        """
+        Append the rows of `data` beyond those held. Returns the DataFrame
+        of the rows held.
+        """
+        with self.lock:
+            self._write(data.iloc[self.stop - self.start:])
+            return self._frame()
+
+    def append_rows(self, data, new):
+        """
+        Append the rows of the DataFrame `new` to `data` for the reader
+        (see readers.ReaderInterface): to the buffers if `data` is the
+        DataFrame made last, otherwise by copying both.
+        """
+        with self.lock:
+            if (data is self.data) and self.fits(new):
+                self._write(new)
+                return self._frame()
+        return readers._append_rows(data, new)
+
+    def drop(self, n):
+        """
+        Drop the first `n` rows held. Returns the DataFrame of the rows
+        left.
+        """
+        with self.lock:
+            n = min(n, self.stop - self.start)
+            self.start += n
+            if self.other:  # A copy, so that the rows dropped are freed
+                self.rest = self.rest.iloc[n:].reset_index(drop=True)
+            return self._frame()
+
+    def frame(self):
+        """
+        The DataFrame of the rows held, sharing the buffers.
+        """
+        with self.lock:
+            return self._frame()
+
+    def _frame(self):
+        pieces = [(buf[self.start:], positions)
+                  for buf, positions in zip(self.buffers, self.positions)]
+        if self.other:
+            pieces.append((self.rest, self.other))
+        self.data = readers._block_frame(pieces, self.columns,
+                                         self.stop - self.start)
+        return self.data
+
+    def close(self):
+        with self.lock:
+            for f in self.files:
+                if f is not None:
+                    f.close()
+            self.files = []
+            self.buffers = []
+            self.data = None
+
+
+class _Entry(object):
+    """
+    State of a scope registered with a MemoryBudget.
+    """
+    def __init__(self, scope, name):
+        self.scope = scope
+        self.name = name
+        self.spill = None
+        self.data = None  # Data seen last, to tell whether they changed
+        self.resident = 0
+        self.spilled = 0
+        self.lastused = time.time()
+
+    def measure(self):
+        scope = self.scope
+        data = self.data = scope.data
+        mapped = self.spill.mapped if (self.spill is not None) else []
+        resident, spilled = _usage(data, mapped)
+        rdata = getattr(scope.reader, 'data', None)
+        if (rdata is not None) and (rdata is not data):
+            more = _usage(rdata, mapped)
+            resident += more[0]
+            spilled += more[1]
+        self.resident = resident
+        self.spilled = spilled
+
+    def evictable(self):
+        """
+        Whether rows dropped from the data stay dropped, i.e. the reader
+        appends to the data it returned last.
+        """
+        scope = self.scope
+        return (scope._initialized and (scope.data is not None)
+                and (getattr(scope.reader, 'data', None) is scope.data)
+                and getattr(scope.reader, 'appends', False))
+
+    def _set_spill(self, spill):
+        """
+        Keep the data in the _Spill `spill`, or in memory if None, closing
+        the one used so far. The reader appends to the spill.
+        """
+        if self.spill is not None:
+            self.spill.close()
+        self.spill = spill
+        reader = self.scope.reader
+        if spill is not None:
+            reader.append_rows = spill.append_rows
+        elif 'append_rows' in vars(reader):
+            del reader.append_rows
+
+    def sync(self):
+        """
+        Keep the rows of a spilled scope in the files after an update.
+        """
+        if self.spill is None:
+            return
+        data = self.scope.data
+        if data is self.spill.data:  # Appended by the reader
+            return
+        elif not self.evictable():
+            self._set_spill(None)
+        elif self.spill.matches(data):
+            self.scope._replace_rows(0, self.spill.append(data))
+        else:  # Read again, start over
+            self._set_spill(_Spill(data, self.spill.spooldir))
+            self.scope._replace_rows(0, self.spill.frame())
+
+    def trim(self):
+        """
+        Drop the rows before the window. Returns the bytes freed.
+        """
+        k = self.scope._history()
+        if (k <= 0) or not self.evictable():
+            return 0
+        data = self.scope.data
+        if self.spill is not None:
+            new = self.spill.drop(k)
+        else:
+            import pandas as pd
+
+            # A copy, so that the rows dropped are freed
+            new = data.iloc[k:].copy()
+            new.index = pd.RangeIndex(len(new))
+        self.scope._replace_rows(k, new)
+        return self._remeasure()
+
+    def spill_data(self, spooldir):
+        """
+        Move the numeric columns to files. Returns the bytes freed.
+        """
+        if (self.spill is not None) or not self.evictable():
+            return 0
+        spill = _Spill(self.scope.data, spooldir)
+        if not spill.mapped:
+            spill.close()
+            return 0
+        self._set_spill(spill)
+        self.scope._replace_rows(0, spill.frame())
+        return self._remeasure()
+
+    def _remeasure(self):
+        before = self.resident
+        self.measure()
+        return before - self.resident
+
+    def close(self):
+        self._set_spill(None)
+
+
+class MemoryBudget(object):
+    """
+    Memory budget shared by PyOscopeRealtime scopes.
+
+    `budget` is the number of bytes that the data of the registered scopes
+    may use together, or None for no limit, in which case the usage is
+    only reported. Once it is exceeded, data are evicted until no more than
+    `1 - headroom` of the budget is used, so that evictions are not
+    repeated on every update. Memory-mapped files are created in
+    `spooldir`, by default the system's temporary directory, and are
+    deleted when they are closed.
+
+    Eviction goes through the scopes in least recently used order, i.e.
+    those whose data changed least recently first. It first drops the rows
+    before the window of each scope (see PyOscopeRealtime._history), which
+    copies the rows kept, and then moves the numeric columns of scopes to
+    memory-mapped files. The reader of a scope whose data are in files
+    appends new rows to them, see readers.ReaderInterface. The size of
+    string columns is not counted.
+
+    Only the data of scopes whose reader appends to the data it returned
+    last (i.e. with `appends` True, see readers.ReaderInterface) can be
+    evicted, and only if the scope's callback does not replace them. The
+    usage of other scopes is reported and counts towards the budget.
+    Scopes that are busy, i.e. whose locks are held by another thread, are
+    skipped.
+
+    Use the default instance `manager` through the module functions, or
+    separate instances for separate budgets.
+    """
+    def __init__(self, budget=None, headroom=0.1, spooldir=None):
+        self.budget = budget
+        self.headroom = headroom
+        self.spooldir = spooldir
+        self.lock = threading.Lock()
+        self._entries = {}  # id(scope): _Entry
+
+    def register(self, scope, name=None):
+        """
+        Track the data of the PyOscopeRealtime `scope`, called `name` in
+        the usage report. Scopes unregister themselves when closed.
+        """
+        with self.lock:
+            old = scope._memory
+            if (old is not None) and (old is not self):
+                old.unregister(scope)
+            if name is None:
+                name = getattr(scope.reader, 'filename', None) or id(scope)
+            entry = _Entry(scope, name)
+            self._entries[id(scope)] = entry
+            scope._memory = self
+            entry.measure()
+        self.enforce()
+
+    def unregister(self, scope):
+        """
+        Stop tracking `scope`. Its data stay as they are.
+        """
+        with self.lock:
+            entry = self._entries.pop(id(scope), None)
+            if scope._memory is self:
+                scope._memory = None
+        if entry is not None:
+            # Data in files stay valid, as they stay mapped
+            entry.close()
+
+    def _updated(self, scope):
+        """
+        Called by `scope` after each update, holding its lock.
+        """
+        with self.lock:
+            entry = self._entries.get(id(scope))
+            if entry is None:
+                return
+            if scope.data is not entry.data:
+                entry.lastused = time.time()
+            entry.sync()
+            entry.measure()
+        self.enforce()
+
+    @property
+    def total(self):
+        """
+        Bytes used by the registered scopes in memory.
+        """
+        return sum(entry.resident for entry in self._entries.values())
+
+    def enforce(self):
+        """
+        Evict data if the registered scopes use more than the budget.
+        """
+        with self.lock:
+            if (self.budget is None) or (self.total <= self.budget):
+                return
+            excess = self.total - self.budget*(1. - self.headroom)
+            entries = sorted(self._entries.values(),
+                             key=lambda entry: entry.lastused)
+            for spill in (False, True):
+                for entry in entries:
+                    if excess <= 0:
+                        return
+                    # Both locks, as eviction replaces the reader's data
+                    readlock = entry.scope.readlock
+                    if not readlock.acquire(False):  # Busy, don't wait
+                        continue
+                    try:
+                        lock = entry.scope.lock
+                        if not lock.acquire(False):
+                            continue
+                        try:
+                            if spill:
+                                excess -= entry.spill_data(self.spooldir)
+                            else:
+                                excess -= entry.trim()
+                        finally:
+                            lock.release()
+                    finally:
+                        readlock.release()
+
+    def usage(self):
+        """
+        List of the ScopeUsage of each registered scope, least recently
+        used first.
+        """
+        with self.lock:
+            entries = sorted(self._entries.values(),
+                             key=lambda entry: entry.lastused)
+            return [ScopeUsage(entry.name, len(entry.scope.data)
+                               if entry.scope.data is not None else 0,
+                               entry.resident, entry.spilled,
+                               entry.scope.dropped, entry.lastused,
+                               entry.spill.nbytes if entry.spill else 0)
+                    for entry in entries]
+
+    def report(self):
+        """
+        The usage of each registered scope and the total, as a table.
+        """
+        lines = ['{0:>12} {1:>12} {2:>12} {3:>12}  {4}'.format(
+            'rows', 'resident', 'spilled', 'dropped', 'name')]
+        for u in self.usage():
+            lines.append('{0:12d} {1:12d} {2:12d} {3:12d}  {4}'.format(
+                u.rows, u.resident, u.spilled, u.dropped, u.name))
+        budget = 'none' if (self.budget is None) else self.budget
+        lines.append('{0:>12} {1:12d} {2:>12} {3:>12}  budget {4}'.format(
+            '', self.total, '', '', budget))
+        return '\n'.join(lines)
+
+
+manager = MemoryBudget()
+
+
+def set_budget(budget, headroom=None, spooldir=None):
+    """
+    Set the budget in bytes of the default MemoryBudget, or None for no
+    limit. See MemoryBudget.
+    """
+    manager.budget = budget
+    if headroom is not None:
+        manager.headroom = headroom
+    if spooldir is not None:
+        manager.spooldir = spooldir
+    manager.enforce()
+
+
+def register(scope, name=None):
+    """
+    Register `scope` with the default MemoryBudget.
+    """
+    manager.register(scope, name)
+
+
+def unregister(scope):
+    """
+    Unregister `scope` from the default MemoryBudget.
+    """
+    manager.unregister(scope)
+
+
+def usage():
+    """
+    Usage of the scopes registered with the default MemoryBudget.
+    """
+    return manager.usage()
+
+
+def report():
+    """
+    Usage report of the default MemoryBudget.
+    """
+    return manager.report()
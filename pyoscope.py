@@ -19,19 +19,33 @@ Example:
 version = 20130717
 releasestatus = 'dev'
 
+import os
+import time
+import json
+import importlib
 import numpy as np
-import matplotlib as mpl
+# matplotlib is imported on first use, see _create_fig and _pyplot, so that
+# e.g. worker processes that only need the readers do not pay for it.
 # mpl.use('wxagg')
-from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
-from collections import Iterable
-from types import StringTypes, MethodType, NoneType
+from collections import deque
+try:
+    from collections.abc import Iterable
+except ImportError:  # Python 2
+    from collections import Iterable
+from types import MethodType
+try:
+    from types import StringTypes, NoneType
+except ImportError:  # Python 3, for the asyncio front end, see aioscope
+    StringTypes = (str,)
+    NoneType = type(None)
 import threading
 from functools import wraps
-from readers import DefaultReader
+from readers import DefaultReader, _replace, _mkstemp
 
 
-__all__ = ['PyOscope', 'PyOscopeStatic', 'PyOscopeRealtime']
+__all__ = ['PyOscope', 'PyOscopeStatic', 'PyOscopeRealtime', 'PlotSpec',
+           'ChannelCollection', 'StripChart', 'Trigger', 'Measurement',
+           'DensityMap', 'save_catalog', 'load_catalog']
 
 
 def synchronized(lockname):
@@ -58,6 +72,815 @@ def synchronized(lockname):
     return _synched
 
 
+def _pyplot():
+    """
+    Import and return matplotlib.pyplot.
+
+    Importing pyplot selects and initialises a (possibly GUI) backend, which
+    is slow and unnecessary for non-interactive figures, so it is only
+    imported once an interactive figure is needed.
+    """
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _window_samples(windowsize):
+    """
+    The window size `windowsize` as a number of samples, or None for all.
+    """
+    try:
+        windowsize = int(windowsize)
+    except (TypeError, ValueError):
+        return None
+    if windowsize <= 1:  # A single point
+        return None
+    return windowsize
+
+
+def _compose(chain):
+    """
+    Compose the transformation chain `chain` into a single function.
+
+    `chain` may be None (identity), a single function, or a list of
+    functions that are applied in order. Returns None for the identity.
+    """
+    if chain is None:
+        return None
+    if callable(chain):
+        return chain
+    funcs = [f for f in chain if f is not None]
+    if not funcs:
+        return None
+    if len(funcs) == 1:
+        return funcs[0]
+
+    def composed(data):
+        for func in funcs:
+            data = func(data)
+        return data
+    return composed
+
+
+def _func_to_name(func):
+    """
+    Convert the module-level function `func` to a 'module:name' string.
+    """
+    if func is None or isinstance(func, StringTypes):
+        return func
+    name = getattr(func, '__name__', None)
+    if isinstance(func, np.ufunc):
+        module = 'numpy'
+    else:
+        module = getattr(func, '__module__', None)
+    if (module is None) or (name is None) or (name == '<lambda>'):
+        raise ValueError("Transformation {0} cannot be serialized. Use a "
+                         "module-level function.".format(repr(func)))
+    return '{0}:{1}'.format(module, name)
+
+
+def _name_to_func(name):
+    """
+    Import the function named by the 'module:name' string `name`.
+    """
+    if not isinstance(name, StringTypes):
+        return name
+    module, _, attr = name.partition(':')
+    obj = importlib.import_module(module)
+    for part in attr.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _jsonable_name(name):
+    # Column names from default-indexed DataFrames are numpy integers
+    if isinstance(name, np.integer):
+        return int(name)
+    return name
+
+
+class PlotSpec(object):
+    """
+    Serializable specification of a plot layout.
+
+    Holds everything needed to (re)create a plot, i.e. the arguments of
+    `PyOscopeStatic.plot` after they have been resolved to column names.
+    See `PyOscopeStatic.plot` for the meaning of the arguments.
+    `xnames`/`ynames` are column names (None for the data index),
+    `windowsize` is the number of samples shown and `collection` selects
+    drawing each axes' channels as a single ChannelCollection.
+    `timecolumn` names a column of monotonically increasing timestamps,
+    and `timespan`, if not None, is the width of the window in the units
+    of `timecolumn` (seconds for datetimes) instead of `windowsize`
+    samples. See `PyOscopeStatic.timewindow`.
+
+    Each entry of `xtrans` and `ytrans` may be None, a function, or a list
+    of functions (a transformation chain) that are applied in order. The
+    chains are composed once, when the spec is created. Functions may also
+    be given as 'module:name' strings, which is how they are saved.
+
+    Column names are validated against the data once, and again only when
+    the data columns change, so a spec can be reused for realtime updates
+    and file switches at no cost. Use `PyOscopeStatic.apply_spec` to apply
+    a spec to a plotter.
+
+    Specs are saved to and loaded from JSON with `save` and `load`. Only
+    specs made of column names and module-level transformation functions
+    can be saved; custom data arrays and lambdas cannot.
+
+    Example usage:
+
+        >>> spec = rt.spec
+        >>> spec.save('layout.json')
+        >>> rt2.apply_spec(PlotSpec.load('layout.json'), f='newrun.txt')
+    """
+    keys = ('xnames', 'ynames', 'xlabels', 'ylabels', 'labels', 'legendflag',
+            'legendloc', 'splitx', 'splity', 'sharex', 'sharey', 'xtrans',
+            'ytrans', 'windowsize', 'collection', 'timecolumn', 'timespan')
+
+    def __init__(self, xnames=None, ynames=None, xlabels=None, ylabels=None,
+                 labels=None, legendflag=False, legendloc=None, splitx=True,
+                 splity=True, sharex='col', sharey=False, xtrans=None,
+                 ytrans=None, windowsize=None, collection=False,
+                 timecolumn=None, timespan=None, arrays=None):
+        if ynames is None:
+            raise ValueError("ynames must be specified.")
+        if xnames is not None:
+            xnames = list(xnames)
+            xlabels = [None]*len(xnames) if xlabels is None else xlabels
+            xtrans = [None]*len(xnames) if xtrans is None else xtrans
+        ynames = list(ynames)
+        ylabels = [None]*len(ynames) if ylabels is None else ylabels
+        ytrans = [None]*len(ynames) if ytrans is None else ytrans
+
+        self.xnames = xnames
+        self.ynames = ynames
+        self.xlabels = xlabels
+        self.ylabels = ylabels
+        self.labels = labels
+        self.legendflag = legendflag
+        self.legendloc = legendloc
+        self.splitx = splitx
+        self.splity = splity
+        self.sharex = sharex
+        self.sharey = sharey
+        self.xtrans = xtrans
+        self.ytrans = ytrans
+        self.windowsize = windowsize
+        self.collection = collection
+        self.timecolumn = timecolumn
+        self.timespan = timespan
+
+        # Custom data arrays, keyed by ('x', i) or ('y', j)
+        self.arrays = {} if arrays is None else dict(arrays)
+
+        self._compile()
+
+    def _compile(self):
+        if self.xtrans is None:
+            self.xfuncs = None
+        else:
+            self.xfuncs = [_compose(_chain(t)) for t in self.xtrans]
+        self.yfuncs = [_compose(_chain(t)) for t in self.ytrans]
+        self._columns = None  # Columns the names were last validated against
+
+    @property
+    def oneD(self):
+        return self.xnames is None
+
+    def copy(self, **changes):
+        """
+        Returns a copy of the spec, with the attributes in `changes`
+        changed.
+        """
+        spec = object.__new__(type(self))
+        spec.__dict__.update(self.__dict__)
+        spec.__dict__.update(changes)
+        return spec
+
+    def __getstate__(self):
+        # Composed transformation chains are closures, which cannot be
+        # pickled, so rebuild them on unpickling
+        state = self.__dict__.copy()
+        del state['xfuncs']
+        del state['yfuncs']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
+    def resolve(self, columns):
+        """
+        Validate the column names against the data columns `columns`.
+
+        Does nothing if `columns` are the same as the last time the spec was
+        resolved. Raises ValueError if any names are not available.
+        """
+        key = tuple(columns)
+        if key == self._columns:
+            return
+        available = set(key)
+        missing = []
+        for axis, names in (('x', self.xnames or []), ('y', self.ynames)):
+            for i, name in enumerate(names):
+                if (name is None) or ((axis, i) in self.arrays):
+                    continue
+                if name not in available:
+                    missing.append(name)
+        if (self.timecolumn is not None) and (self.timecolumn not in
+                                              available):
+            missing.append(self.timecolumn)
+        if missing:
+            raise ValueError("One or more data names not available: "
+                             "{0}".format(missing))
+        self._columns = key
+
+    def column(self, data, axis, i):
+        """
+        Return the data for the `i`th identifier along `axis` ('x' or 'y').
+        """
+        try:
+            return self.arrays[(axis, i)]
+        except KeyError:
+            pass
+        names = self.xnames if (axis == 'x') else self.ynames
+        name = names[i]
+        if name is None:
+            return np.arange(len(data))
+        return data[name]
+
+    def to_dict(self):
+        """
+        Return the spec as a JSON-serializable dictionary.
+        """
+        if self.arrays:
+            raise ValueError("Plot specifications with custom data arrays "
+                             "cannot be serialized.")
+        d = {key: getattr(self, key) for key in self.keys}
+        for key in ('xnames', 'ynames'):
+            if d[key] is not None:
+                d[key] = [_jsonable_name(name) for name in d[key]]
+        for key in ('xtrans', 'ytrans'):
+            if d[key] is not None:
+                d[key] = [_chain_to_names(t) for t in d[key]]
+        return d
+
+    @classmethod
+    def from_dict(cls, pdict):
+        """
+        Create a spec from a dictionary, e.g. one made by `to_dict` or a
+        plotter's plot dictionary. Missing keys take their default values.
+        """
+        kwargs = {key: pdict[key] for key in cls.keys if key in pdict}
+        try:
+            return cls(**kwargs)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid plot dictionary specified:"
+                             " {0}".format(repr(pdict)))
+
+    def save(self, fname):
+        """
+        Save the spec to the JSON file `fname`.
+        """
+        with open(fname, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, fname):
+        """
+        Load a spec from the JSON file `fname`.
+        """
+        with open(fname, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def __repr__(self):
+        return '{0}(xnames={1}, ynames={2})'.format(
+            self.__class__.__name__, repr(self.xnames), repr(self.ynames))
+
+
+def _chain(trans):
+    """
+    Normalize a transformation chain to a list of functions.
+    """
+    if trans is None:
+        return None
+    if callable(trans) or isinstance(trans, StringTypes):
+        trans = [trans]
+    return [_name_to_func(t) for t in trans]
+
+
+def _chain_to_names(trans):
+    if trans is None:
+        return None
+    if callable(trans) or isinstance(trans, StringTypes):
+        return _func_to_name(trans)
+    return [_func_to_name(t) for t in trans]
+
+
+def save_catalog(catalog, fname):
+    """
+    Save a catalog of plot layouts to the JSON file `fname`.
+
+    `catalog` is a dictionary mapping layout names to PlotSpec objects.
+    """
+    d = {name: spec.to_dict() for name, spec in catalog.items()}
+    with open(fname, 'w') as f:
+        json.dump(d, f, indent=2, sort_keys=True)
+
+
+def load_catalog(fname):
+    """
+    Load a catalog of plot layouts saved by `save_catalog`.
+
+    Returns a dictionary mapping layout names to PlotSpec objects.
+    """
+    with open(fname, 'r') as f:
+        d = json.load(f)
+    return {name: PlotSpec.from_dict(pdict) for name, pdict in d.items()}
+
+
+class ChannelCollection(object):
+    """
+    Many channels drawn in a single axes as one LineCollection.
+
+    Drawing one LineCollection is much cheaper than drawing one Line2D per
+    channel, and its data are updated in bulk from a single stacked
+    (channels x samples) array. Made by `PyOscopeStatic.plot` with
+    `collection=True`.
+
+    `labels` are the channel labels used for legends. Style keyword
+    arguments are given as for `ax.plot`, e.g. `linewidth` or `color`.
+    Channels are colored by the matplotlib color cycle unless a color is
+    given.
+    """
+    # Line2D keyword arguments that have a different name for collections
+    _kwmap = {'color': 'colors', 'c': 'colors', 'linewidth': 'linewidths',
+              'lw': 'linewidths', 'linestyle': 'linestyles',
+              'ls': 'linestyles'}
+
+    def __init__(self, ax, labels, **kwargs):
+        import matplotlib as mpl
+        from matplotlib.collections import LineCollection
+
+        self.ax = ax
+        self.labels = list(labels)
+        kwargs = {self._kwmap.get(k, k): v for k, v in kwargs.items()}
+        if 'colors' not in kwargs:
+            cycle = mpl.rcParams['axes.prop_cycle'].by_key().get('color',
+                                                                 ['b'])
+            kwargs['colors'] = [cycle[k % len(cycle)]
+                                for k in range(len(self.labels))]
+        self.collection = LineCollection([], **kwargs)
+        ax.add_collection(self.collection, autolim=False)
+        self._segs = np.empty((len(self.labels), 0, 2))
+
+    def set_data(self, x, ys):
+        """
+        Set the data of all channels.
+
+        `ys` is a (channels x samples) array. `x` is either a 1D array of
+        samples shared by all channels or a (channels x samples) array.
+        """
+        ys = np.asarray(ys)
+        shape = ys.shape + (2,)
+        if self._segs.shape != shape:
+            self._segs = np.empty(shape)
+        self._segs[:, :, 0] = x
+        self._segs[:, :, 1] = ys
+        self.collection.set_segments(self._segs)
+
+    def get_xdata(self):
+        return self._segs[:, :, 0].ravel()
+
+    def get_ydata(self):
+        return self._segs[:, :, 1].ravel()
+
+    def update_datalim(self):
+        """
+        Include the current data in the data limits of the axes.
+        """
+        if self._segs.size:
+            x = self._segs[:, :, 0]
+            y = self._segs[:, :, 1]
+            corners = [(np.nanmin(x), np.nanmin(y)),
+                       (np.nanmax(x), np.nanmax(y))]
+            self.ax.update_datalim(corners)
+
+    def legend_handles(self):
+        """
+        Proxy artists for the channels, for use in legends.
+        """
+        from matplotlib.lines import Line2D
+
+        colors = self.collection.get_colors()
+        return [Line2D([], [], color=colors[k % len(colors)], label=label)
+                for k, label in enumerate(self.labels)]
+
+    def remove(self):
+        self.collection.remove()
+
+
+class StripChart(object):
+    """
+    Fixed-length sample buffer for one line of a strip chart.
+
+    In scrolling mode (default), new samples are shifted in at the right
+    and the oldest samples fall off the left. The buffer is circular and
+    every sample is written twice, at its position and one span further
+    on, so that the last `span` samples are always available as a
+    contiguous view. Appending therefore costs time proportional to the
+    number of new samples only, and nothing is ever copied or shifted.
+
+    In sweep mode, new samples overwrite the oldest ones in place, from
+    left to right, like a hardware oscilloscope. The `gap` samples
+    following the write position are blanked to mark it.
+
+    Made by `PyOscopeRealtime.stripchart`.
+    """
+    def __init__(self, span, sweep=False, gap=None):
+        self.span = int(span)
+        if self.span < 2:
+            raise ValueError("span must be at least 2 samples.")
+        self.sweep = sweep
+        if gap is None:
+            gap = max(1, self.span//50)
+        self.gap = min(int(gap), self.span - 1)
+        size = self.span if sweep else 2*self.span
+        self._x = np.empty(size)
+        self._y = np.empty(size)
+        self._x.fill(np.nan)
+        self._y.fill(np.nan)
+        if sweep:
+            self._x[:] = np.arange(self.span)
+        self.count = 0  # Total number of samples appended
+        self.xfirst = None  # First x value ever appended
+
+    def append(self, x, y):
+        """
+        Append the new samples `x` and `y`. `x` is ignored in sweep mode.
+        """
+        y = np.asarray(y, dtype=float)
+        n = len(y)
+        if n == 0:
+            return
+        if not self.sweep:
+            x = np.asarray(x, dtype=float)
+            if self.xfirst is None:
+                self.xfirst = x[0]
+        # Samples beyond the last span would be overwritten immediately
+        skip = max(0, n - self.span)
+        pos = (self.count + np.arange(skip, n)) % self.span
+        self._y[pos] = y[skip:]
+        if self.sweep:
+            blank = (self.count + n + np.arange(self.gap)) % self.span
+            self._y[blank] = np.nan
+        else:
+            self._y[pos + self.span] = y[skip:]
+            self._x[pos] = x[skip:]
+            self._x[pos + self.span] = x[skip:]
+        self.count += n
+
+    def xdata(self):
+        if self.sweep:
+            return self._x
+        start = self.count % self.span
+        return self._x[start:start + self.span]
+
+    def ydata(self):
+        if self.sweep:
+            return self._y
+        start = self.count % self.span
+        return self._y[start:start + self.span]
+
+    def xlim(self):
+        """
+        The x limits that show the current span.
+        """
+        if self.sweep:
+            return (0, self.span - 1)
+        x = self.xdata()
+        left = x[0] if (x[0] == x[0]) else self.xfirst  # NaN until full
+        return (left, x[-1])
+
+
+class Trigger(object):
+    """
+    Edge trigger with hysteresis, like an oscilloscope trigger.
+
+    A rising edge trigger fires when the signal rises to at least `level`
+    after having been below `level - hysteresis`. A falling edge trigger
+    fires when the signal falls to at most `level` after having been above
+    `level + hysteresis`. Hysteresis keeps noise around the level from
+    firing the trigger repeatedly. After firing, the trigger ignores edges
+    for `holdoff` samples.
+
+    `scan` only looks at the samples that arrived since the last scan, and
+    does so with vectorized numpy operations. The trigger state is carried
+    over between scans, so edges that straddle two scans are found.
+
+    Used by `PyOscopeRealtime.trigger`.
+    """
+    def __init__(self, level, slope='rising', hysteresis=0., holdoff=0):
+        if slope not in ('rising', 'falling'):
+            raise ValueError("slope must be 'rising' or 'falling'.")
+        self.level = float(level)
+        self.slope = slope
+        self.hysteresis = abs(float(hysteresis))
+        self.holdoff = int(holdoff)
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all samples scanned so far.
+        """
+        self.scanned = 0  # Number of samples scanned
+        self.last = None  # Index of last trigger
+        self._state = 0  # -1 if armed, 1 if above level, 0 if unknown
+
+    def drop(self, n):
+        """
+        Account for the first `n` samples of the signal being dropped.
+        """
+        self.scanned = max(self.scanned - n, 0)
+        if self.last is not None:
+            self.last -= n
+
+    def scan(self, y, offset=0):
+        """
+        Scan the samples of `y` that arrived since the last scan.
+
+        `y` is the signal from sample `offset` on, by default the full
+        signal, i.e. previously scanned samples are included but skipped.
+        Returns an array of the indices into the signal at which the
+        trigger fired.
+        """
+        new = np.asarray(y[self.scanned - offset:], dtype=float)
+        start = self.scanned
+        self.scanned = offset + len(y)
+        if not len(new):
+            return np.empty(0, dtype=int)
+
+        level = self.level
+        if self.slope == 'falling':
+            new = -new
+            level = -level
+        state = np.zeros(len(new), dtype=np.int8)
+        with np.errstate(invalid='ignore'):  # NaNs are neither
+            state[new < level - self.hysteresis] = -1
+            state[new >= level] = 1
+
+        # The trigger fires at each -1 -> 1 transition of the state, ignoring
+        # the samples inside the hysteresis band
+        idx = np.flatnonzero(state)
+        if not len(idx):
+            return np.empty(0, dtype=int)
+        vals = state[idx]
+        prev = np.empty_like(vals)
+        prev[0] = self._state
+        prev[1:] = vals[:-1]
+        self._state = vals[-1]
+        fires = idx[(vals == 1) & (prev == -1)] + start
+
+        if self.holdoff and len(fires):
+            keep = []
+            last = self.last
+            for t in fires:
+                if (last is None) or (t - last >= self.holdoff):
+                    keep.append(t)
+                    last = t
+            fires = np.array(keep, dtype=int)
+        if len(fires):
+            self.last = fires[-1]
+        return fires
+
+
+class Measurement(object):
+    """
+    Oscilloscope-style measurements of a signal over a sliding window.
+
+    `update` moves the window, adding the samples that entered it and
+    subtracting those that left it, so its cost does not depend on the
+    size of the window. The mean, RMS and standard deviation come from
+    running sums, which are recomputed from scratch once many samples have
+    been subtracted, so that rounding errors do not accumulate. The minimum
+    and maximum are kept per block of `blocksize` samples. The frequency
+    is found from the rising crossings of `level` (with `hysteresis`, see
+    Trigger), in cycles per unit of x. Non-finite samples are ignored.
+
+    Used by `PyOscopeStatic.measure`.
+    """
+    blocksize = 1024
+    names = ('mean', 'rms', 'std', 'min', 'max', 'vpp', 'freq')
+
+    def __init__(self, level=0., hysteresis=0.):
+        self.trigger = Trigger(level, 'rising', hysteresis)
+        self.reset()
+
+    def reset(self, start=0):
+        """
+        Forget all samples, and start an empty window at sample `start`.
+        """
+        self.start = self.stop = start  # Window of samples [start, stop)
+        self.count = 0
+        self.sum = 0.
+        self.sumsq = 0.
+        self._removed = 0  # Samples subtracted from the sums
+        self._blocks = deque()  # [start, stop, min, max] of sample blocks
+        self._crossings = deque()  # (samples, xs) arrays of crossings
+        self._ncrossings = 0
+        self.trigger.reset()
+        self.trigger.scanned = start
+
+    def drop(self, n):
+        """
+        Account for the first `n` samples of the signal being dropped.
+        """
+        self.start -= n
+        self.stop -= n
+        for block in self._blocks:
+            block[0] -= n
+            block[1] -= n
+        self._crossings = deque((rows - n, xs)
+                                for rows, xs in self._crossings)
+        self.trigger.drop(n)
+
+    def update(self, ys, start, stop, xs=None):
+        """
+        Move the window to the samples `start` up to `stop`.
+
+        `ys(i, j)` and `xs(i, j)` return the samples i up to j of the
+        signal and of its x coordinate. `xs` of None uses the sample
+        numbers.
+        """
+        if (start < self.start) or (stop < self.stop) or \
+                (start >= self.stop):  # Not moved forward, start over
+            self.reset(start)
+        elif start > self.start:
+            self._remove(ys, start)
+        if self._removed > 8*max(stop - start, self.blocksize):
+            self.reset(start)
+        if stop > self.stop:
+            self._add(ys, stop, xs)
+
+    def _add(self, ys, stop, xs):
+        offset = self.stop
+        y = np.asarray(ys(offset, stop), dtype=float)
+        finite = y[np.isfinite(y)]
+        self.count += len(finite)
+        self.sum += finite.sum()
+        self.sumsq += np.dot(finite, finite)
+        self.stop = stop
+
+        # Fill up the last block, then add whole blocks
+        blocks = self._blocks
+        i = 0
+        if blocks and (blocks[-1][1] - blocks[-1][0] < self.blocksize):
+            last = blocks[-1]
+            i = min(self.blocksize - (last[1] - last[0]), len(y))
+            last[1] += i
+            last[2] = np.fmin(last[2], np.fmin.reduce(y[:i]))
+            last[3] = np.fmax(last[3], np.fmax.reduce(y[:i]))
+        if i < len(y):
+            starts = np.arange(i, len(y), self.blocksize)
+            mins = np.fmin.reduceat(y, starts)
+            maxs = np.fmax.reduceat(y, starts)
+            ends = np.append(starts[1:], len(y))
+            for b in range(len(starts)):
+                blocks.append([offset + starts[b], offset + ends[b],
+                               mins[b], maxs[b]])
+
+        fires = self.trigger.scan(y, offset)
+        if len(fires):
+            if xs is None:
+                x = fires.astype(float)
+            else:
+                x = np.asarray(xs(offset, stop), dtype=float)[fires - offset]
+            self._crossings.append((fires, x))
+            self._ncrossings += len(fires)
+
+    def _remove(self, ys, start):
+        y = np.asarray(ys(self.start, start), dtype=float)
+        finite = y[np.isfinite(y)]
+        self.count -= len(finite)
+        self.sum -= finite.sum()
+        self.sumsq -= np.dot(finite, finite)
+        self._removed += len(y)
+        self.start = start
+
+        blocks = self._blocks
+        while blocks and (blocks[0][1] <= start):
+            blocks.popleft()
+        if blocks and (blocks[0][0] < start):  # Partly left the window
+            block = blocks[0]
+            y = np.asarray(ys(start, block[1]), dtype=float)
+            block[0] = start
+            block[2] = np.fmin.reduce(y)
+            block[3] = np.fmax.reduce(y)
+
+        crossings = self._crossings
+        while crossings and (crossings[0][0][-1] < start):
+            self._ncrossings -= len(crossings.popleft()[0])
+        if crossings and (crossings[0][0][0] < start):
+            rows, x = crossings[0]
+            keep = rows >= start
+            self._ncrossings -= len(rows) - keep.sum()
+            crossings[0] = (rows[keep], x[keep])
+
+    def values(self):
+        """
+        Dictionary of the measurements, NaN where undefined.
+        """
+        nan = float('nan')
+        if self.count:
+            mean = self.sum/self.count
+            meansq = self.sumsq/self.count
+            rms = np.sqrt(max(meansq, 0.))
+            std = np.sqrt(max(meansq - mean*mean, 0.))
+        else:
+            mean = rms = std = nan
+        mins = [b[2] for b in self._blocks if b[2] == b[2]]
+        maxs = [b[3] for b in self._blocks if b[3] == b[3]]
+        ymin = min(mins) if mins else nan
+        ymax = max(maxs) if maxs else nan
+        freq = nan
+        if self._ncrossings >= 2:
+            dx = self._crossings[-1][1][-1] - self._crossings[0][1][0]
+            if dx > 0:
+                freq = (self._ncrossings - 1)/dx
+        return {'mean': mean, 'rms': rms, 'std': std, 'min': ymin,
+                'max': ymax, 'vpp': ymax - ymin, 'freq': freq}
+
+
+class DensityMap(object):
+    """
+    Persistence display: a 2D histogram of samples shown as one image.
+
+    Samples are binned into a (rows x columns) grid of counts covering the
+    fixed data ranges `xlim` and `ylim`, and the counts are shown with a
+    single `imshow` image that is updated in place. Adding samples costs
+    time proportional to the number of new samples and drawing costs time
+    proportional to the number of bins, independent of how many samples
+    have been accumulated. Samples outside of the ranges are dropped.
+
+    If `decay` is not None, the counts are multiplied by `decay` (between 0
+    and 1) every time samples are added, so that old samples fade away
+    like on a digital phosphor oscilloscope. If `log` is True, the image
+    shows log(1 + counts), which brings out rarely visited regions.
+
+    Made by `PyOscopeStatic.persistence`.
+    """
+    def __init__(self, ax, xlim, ylim, shape, decay=None, log=False,
+                 cmap='inferno'):
+        self.ax = ax
+        self.xlim = (float(xlim[0]), float(xlim[1]))
+        self.ylim = (float(ylim[0]), float(ylim[1]))
+        if (self.xlim[1] <= self.xlim[0]) or (self.ylim[1] <= self.ylim[0]):
+            raise ValueError("Empty data range for density map.")
+        self.shape = (max(1, int(shape[0])), max(1, int(shape[1])))
+        if (decay is not None) and not (0. < decay <= 1.):
+            raise ValueError("decay must be in (0, 1].")
+        self.decay = decay
+        self.log = log
+        self.counts = np.zeros(self.shape)
+        extent = self.xlim + self.ylim
+        self.image = ax.imshow(self.counts, origin='lower', extent=extent,
+                               aspect='auto', interpolation='nearest',
+                               cmap=cmap)
+
+    def add(self, x, y):
+        """
+        Add the samples `x` and `y` to the histogram.
+        """
+        if self.decay is not None:
+            self.counts *= self.decay
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        nrows, ncols = self.shape
+        x0, x1 = self.xlim
+        y0, y1 = self.ylim
+        # NaNs fail both comparisons, so are dropped along with the samples
+        # outside of the ranges
+        keep = (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+        # Values just below the upper limits may round up to the next bin
+        ix = np.minimum(((x[keep] - x0)*(ncols/(x1 - x0))).astype(int),
+                        ncols - 1)
+        iy = np.minimum(((y[keep] - y0)*(nrows/(y1 - y0))).astype(int),
+                        nrows - 1)
+        counts = np.bincount(iy*ncols + ix, minlength=nrows*ncols)
+        self.counts += counts.reshape(self.shape)
+
+    def update_image(self):
+        """
+        Show the current counts.
+        """
+        counts = np.log1p(self.counts) if self.log else self.counts
+        self.image.set_data(counts)
+        self.image.set_clim(0., max(counts.max(), 1e-12))
+
+    def remove(self):
+        self.image.remove()
+
+
 class PyOscopeStatic(object):
     """
     Object for plotting static data sets.
@@ -105,12 +928,22 @@ class PyOscopeStatic(object):
         self.interactive = interactive
 
         # Static version is not threaded, but want to make sure any subclasses
-        # are thread-safe
+        # are thread-safe. `lock` guards the figure and the data shown,
+        # `readlock` the reader, so that reading and parsing new data does
+        # not hold up plotting. Take `readlock` first when taking both. The
+        # plot configuration `_plotdict` is never changed in place but
+        # replaced (see `_configure`), so reading it needs no lock.
         self.lock = threading.RLock()
+        self.readlock = threading.RLock()
+        self._configlock = threading.Lock()
 
         # Need to keep track of the backend, since not all backends support
-        # all update schemes
-        self._backend = plt.get_backend().lower()
+        # all update schemes. Non-interactive figures always render through
+        # their own Agg canvas.
+        if self.interactive:
+            self._backend = _pyplot().get_backend().lower()
+        else:
+            self._backend = 'agg'
 
         self.fig = self._create_fig(toolbar=toolbar)
         self.axes = None
@@ -118,9 +951,22 @@ class PyOscopeStatic(object):
         self.mode = 'none'
         self._plotdict = {'autoscalex': True,  # Autoscale is meaningless in
                           'autoscaley': True,  # Static, but useful in RT
-                          'windowsize': None}
+                          'windowsize': None,
+                          'timecolumn': None,
+                          'timespan': None}
+        self._timestart = None  # See jump_to_time
+        self.spec = None  # PlotSpec of the current plot
+        self._grid = None  # (nrows, ncols, sharex, sharey) of self.axes
+        self._linekeys = {}  # Reusable lines, see _plot_spec
+        self._collections = {}  # (row, col): (ChannelCollection, members)
+        self._densitymaps = {}  # id(ax): DensityMap, see persistence
+        self._measures = {}  # (i, j): Measurement of line, see measure
+        self._measuretexts = []  # (Text, [(i, j), ...]) of each axes
+
+        # Headless frame export state, see `export_frames`
+        self._export_thread = None
+        self._export_stop = threading.Event()
 
-    @synchronized('lock')
     def switch_file(self, newfile, reader=None, *args, **kwargs):
         """
         Switch the file that is used for plotting.
@@ -130,24 +976,69 @@ class PyOscopeStatic(object):
         If there is no pre-existing reader, creates a DefaultReader and uses
         that.
         """
-        self.clear()
+        self._switch_reader(newfile, reader, *args, **kwargs)
+        with self.lock:
+            try:
+                return self._plot_from_dict()
+            except ValueError:
+                self.clear()
+                self.redraw()
+                return
+
+    @synchronized('readlock')
+    def _switch_reader(self, newfile, reader=None, *args, **kwargs):
+        """
+        Load `newfile`, without replotting.
+
+        The plot is not cleared, so that replotting with the same layout can
+        reuse it. The file is read without holding `lock`.
+        """
+        new = self.reader
         if reader is not None:
             try:
-                self.reader.close()
+                new.close()
             except AttributeError:
                 pass
-            self.reader = reader(newfile, *args, **kwargs)
+            new = reader(newfile, *args, **kwargs)
 
-        if not self.reader:
-            self.reader = DefaultReader(newfile, *args, **kwargs)
+        if not new:
+            new = DefaultReader(newfile, *args, **kwargs)
 
-        self.data = self.reader.switch_file(newfile, *args, **kwargs)
-        self._initialized = True
-        try:
-            return self._plot_from_dict()
-        except ValueError:
-            self.redraw()
-            return
+        data = new.switch_file(newfile, *args, **kwargs)
+        with self.lock:
+            self.reader = new
+            self._set_data(data)
+            self._initialized = True
+
+    def apply_spec(self, spec, f=None, reader=None, *args, **kwargs):
+        """
+        Make the plot described by the plot specification `spec`.
+
+        `spec` may be a PlotSpec, a plot dictionary (see
+        `PlotSpec.from_dict`) or the filename of a saved PlotSpec.
+
+        If `f` is specified, first switches to the file `f`, i.e. applies a
+        saved layout to a new run in a single call. `reader` and the
+        remaining arguments are then used as in `switch_file`.
+
+        Unlike `switch_file`, raises ValueError if the spec does not match
+        the data.
+        """
+        if isinstance(spec, StringTypes):
+            spec = PlotSpec.load(spec)
+        elif not isinstance(spec, PlotSpec):
+            spec = PlotSpec.from_dict(spec)
+        if f is not None:
+            self._switch_reader(f, reader, *args, **kwargs)
+        with self.lock:
+            try:
+                return self._plot_spec(spec)
+            except ValueError:
+                if f is not None:
+                    # Do not leave the old file's plot up
+                    self.clear()
+                    self.redraw()
+                raise
 
     @synchronized('lock')
     def _create_fig(self, plotsize=(6., 4.), dpi=100, tight=True,
@@ -155,6 +1046,10 @@ class PyOscopeStatic(object):
         # autolayout: Automatically call tight_layout() on newly created figure
         # toolbar: Whether or not to create toolbar attached to plot
         # Use context manager to prevent global settings from changing
+        import matplotlib as mpl
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
         tb = 'toolbar2' if toolbar else 'None'
         rcdict = {'figure.autolayout': bool(tight), 'toolbar': tb}
         with mpl.rc_context(rc=rcdict):
@@ -162,10 +1057,14 @@ class PyOscopeStatic(object):
                 # pyplot's figure() function creates Figure object and hooks it
                 # into MPL event loop
                 figname = self.__class__.__name__ + '-' + hex(id(self))
-                fig = plt.figure(figname, figsize=plotsize, dpi=dpi)
+                fig = _pyplot().figure(figname, figsize=plotsize, dpi=dpi)
             else:
-                # mpl.figure.Figure is a raw Figure object
+                # mpl.figure.Figure is a raw Figure object. Attach an Agg
+                # canvas so that it can be rendered without any GUI toolkit.
+                # The canvas (and its cached renderer) is reused for every
+                # frame.
                 fig = Figure(plotsize, dpi=dpi)
+                FigureCanvasAgg(fig)
 
             # Both cases return the raw Figure object
             return fig
@@ -272,6 +1171,156 @@ class PyOscopeStatic(object):
         if self.interactive:
             self.canvas.draw_idle()
 
+    @synchronized('lock')
+    def render_rgba(self, copy=False):
+        """
+        Render the current plot and return it as an RGBA image.
+
+        The returned array has shape (height, width, 4) and dtype uint8. If
+        `copy` is False (default), the array is a view of the Agg renderer's
+        buffer, which is reused and overwritten by the next render. Set
+        `copy` to True to get an independent array.
+
+        Only available for figures that render through Agg, i.e. always
+        for non-interactive figures.
+        """
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        canvas = self.fig.canvas
+        if not isinstance(canvas, FigureCanvasAgg):
+            raise TypeError("render_rgba requires an Agg-based canvas, "
+                            "not {0}".format(type(canvas).__name__))
+        canvas.draw()
+        w, h = canvas.get_width_height()
+        buf = np.frombuffer(canvas.get_renderer().buffer_rgba(),
+                            dtype=np.uint8)
+        buf = buf.reshape((int(h), int(w), 4))
+        if copy:
+            buf = buf.copy()
+        return buf
+
+    @synchronized('lock')
+    def render_to_file(self, fname, format=None, dpi=None, atomic=True,
+                       **kwargs):
+        """
+        Render the current plot to the file `fname`.
+
+        `format` is any format supported by `Figure.savefig`, e.g. 'png' or
+        'svg'. If None, the format is inferred from the extension of
+        `fname`.
+
+        If `atomic` is True (default), the image is written to a temporary
+        file in the same directory and then renamed over `fname`, so that
+        readers of `fname` (e.g. a dashboard web server) never see a
+        partially written image.
+
+        The remaining arguments are passed to `Figure.savefig`.
+
+        Returns `fname`.
+        """
+        if format is None:
+            format = os.path.splitext(fname)[1].lstrip('.').lower() or 'png'
+        if dpi is None:
+            dpi = self.fig.dpi
+        if not atomic:
+            self.fig.savefig(fname, format=format, dpi=dpi, **kwargs)
+            return fname
+
+        dirname = os.path.dirname(os.path.abspath(fname))
+        fd, tmpname = _mkstemp(dirname, '.pyoscope-', '.' + format)
+        try:
+            with os.fdopen(fd, 'wb') as tmpf:
+                self.fig.savefig(tmpf, format=format, dpi=dpi, **kwargs)
+            _replace(tmpname, fname)
+        except Exception:
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+            raise
+        return fname
+
+    def export_frames(self, fname, interval=1000, rolling=False,
+                      maxframes=None, format=None, dpi=None, **kwargs):
+        """
+        Periodically render the current plot to file(s) in the background.
+
+        Intended for headless use, i.e. `interactive=False`, where no
+        matplotlib event loop is available to drive updates. Frames are
+        rendered every `interval` milliseconds on a fixed cadence by a
+        background thread, reusing the same figure and Agg canvas for every
+        frame. If a frame takes longer than `interval` to render, the
+        missed frames are skipped rather than queued.
+
+        If `rolling` is False (default), every frame atomically overwrites
+        `fname`. If `rolling` is True, `fname` must be a format string with
+        a frame number field, e.g. 'frame_{0:05d}.png', and each frame is
+        written to a new file.
+
+        `maxframes` is the number of frames to write before stopping. None
+        (default) writes frames until `stop_export` is called.
+
+        The remaining arguments are passed to `render_to_file`.
+        """
+        if rolling and (fname.format(0) == fname):
+            raise ValueError("rolling export requires a frame number field "
+                             "in fname, e.g. 'frame_{0:05d}.png'")
+        self.stop_export()
+        interval = max(interval, 10)/1000.
+        self._export_stop.clear()
+        args = (fname, interval, rolling, maxframes, format, dpi, kwargs)
+        self._export_thread = threading.Thread(target=self._export_loop,
+                                               args=args)
+        self._export_thread.daemon = True
+        self._export_thread.start()
+
+    def stop_export(self):
+        """
+        Stop a background export started by `export_frames`.
+        """
+        thread = self._export_thread
+        if thread is None:
+            return
+        self._export_stop.set()
+        if thread is not threading.current_thread():
+            thread.join()
+        self._export_thread = None
+
+    def wait_export(self, timeout=None):
+        """
+        Wait for a background export started by `export_frames` to finish,
+        e.g. after `maxframes` frames, for at most `timeout` seconds.
+
+        Returns True if no export is running anymore.
+        """
+        thread = self._export_thread
+        if thread is None:
+            return True
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def _export_loop(self, fname, interval, rolling, maxframes, format, dpi,
+                     kwargs):
+        nframes = 0
+        t0 = time.time()
+        while not self._export_stop.is_set():
+            frame_fname = fname.format(nframes) if rolling else fname
+            self._export_frame(frame_fname, format=format, dpi=dpi, **kwargs)
+            nframes += 1
+            if (maxframes is not None) and (nframes >= maxframes):
+                break
+            # Sleep until the next tick on the fixed cadence, skipping any
+            # ticks that were missed while rendering
+            elapsed = time.time() - t0
+            delay = interval - (elapsed % interval)
+            self._export_stop.wait(delay)
+
+    def _export_frame(self, fname, **kwargs):
+        """
+        Render a single frame during a background export.
+        """
+        return self.render_to_file(fname, **kwargs)
+
     @synchronized('lock')
     def plot(self, xs=None, ys=None, splitx=True, splity=True, sharex='col',
              sharey=False, xtrans=None, ytrans=None, legend=False,
@@ -321,7 +1370,8 @@ class PyOscopeStatic(object):
 
         `xtrans` and `ytrans` are transformation functions for the x and y
         data, respectively. Their structure must match the structure of
-        `xs` and `ys`.
+        `xs` and `ys`. Each transformation may also be a list of functions,
+        which are applied in order.
 
         `legend` indicates whether to show the legend and where it should be
         shown, if not False. If False, no legends are made. If True, the
@@ -343,7 +1393,19 @@ class PyOscopeStatic(object):
         length. For 2D arrays of plots (i.e. both `xs` and `ys` are
         specified), then `labels` must be a 2D array of matching length, where
         `labels[i, j]` corresponds to (`xs[i]`, `ys[j]`).
+
+        If the keyword argument `collection` is True, then all of the lines
+        in each axes are drawn as a single ChannelCollection instead of one
+        line each, which is much faster for many overlaid channels, e.g.
+        with `splity=False`. Style keyword arguments are still supported,
+        but format strings are not.
+
+        The keyword argument `windowsize` sets the window of the new plot,
+        see `windowsize`, so that it is not drawn with all of the data
+        first.
         """
+        collection = kwargs.pop('collection', False)
+        windowsize = _window_samples(kwargs.pop('windowsize', None))
         if not self._initialized:
             return
 
@@ -394,66 +1456,80 @@ class PyOscopeStatic(object):
             else:
                 legendloc = None
 
-        # Find data series to be plotted
+        # Resolve identifiers to column names once. Custom data arrays are
+        # carried along in the spec.
+        arrays = {}
         if not oneD:
-            newxs = []
             xnames = []
             for i, x in enumerate(xs):
                 if isinstance(x, StringTypes):
-                    newx = self.data[x]
                     xname = x
-                elif isinstance(x, int):
+                elif isinstance(x, (int, np.integer)):
                     xname = self.data.columns[x]
-                    newx = self.data[xname]
                 elif isinstance(x, Iterable):
-                    newx = x
                     xname = 'x_{i}'.format(i=i)
+                    arrays[('x', i)] = x
                 elif isinstance(x, NoneType):
                     xname = None
-                    temp = self.data.columns[0]
-                    newx = range(len(self.data[temp]))
                 xnames.append(xname)
-                newxs.append(newx)
         else:
-            newxs = None
             xnames = None
+            xlabels = None
+            xtrans = None
 
-        newys = []
         ynames = []
         for j, y in enumerate(ys):
             if isinstance(y, StringTypes):
-                newy = self.data[y]
                 yname = y
             elif isinstance(y, (int, np.integer)):
                 yname = self.data.columns[y]
-                newy = self.data[yname]
             elif isinstance(y, Iterable):
-                newy = y
                 yname = 'y_{j}'.format(j=j)
+                arrays[('y', j)] = y
             elif isinstance(y, NoneType):
                 yname = None
-                temp = self.data.columns[0]
-                newy = range(len(self.data[temp]))
             ynames.append(yname)
-            newys.append(newy)
+
+        # The time column describes the data, so it is kept for new plots
+        timecolumn = self._plotdict['timecolumn']
+        if timecolumn not in self.data.columns:
+            timecolumn = None
+
+        spec = PlotSpec(xnames, ynames, xlabels=xlabels, ylabels=ylabels,
+                        labels=labels, legendflag=legendflag,
+                        legendloc=legendloc, splitx=splitx, splity=splity,
+                        sharex=sharex, sharey=sharey, xtrans=xtrans,
+                        ytrans=ytrans, collection=collection,
+                        windowsize=windowsize, timecolumn=timecolumn,
+                        arrays=arrays)
+        return self._plot_spec(spec, *args, **kwargs)
+
+    @synchronized('lock')
+    def _plot_spec(self, spec, *args, **kwargs):
+        """
+        Make the plot described by the PlotSpec `spec`.
+
+        The remaining arguments are passed to `ax.plot`.
+        """
+        if not self._initialized:
+            return
+
+        spec.resolve(self.data.columns)
+        self.spec = spec
 
         # Store these so we don't have to look them up again
-        self._plotdict['xs'] = newxs
-        self._plotdict['ys'] = newys
-        self._plotdict['xnames'] = xnames
-        self._plotdict['ynames'] = ynames
-        self._plotdict['xlabels'] = xlabels
-        self._plotdict['ylabels'] = ylabels
-        self._plotdict['xtrans'] = xtrans
-        self._plotdict['ytrans'] = ytrans
-        self._plotdict['label'] = labels
-        self._plotdict['splitx'] = splitx
-        self._plotdict['splity'] = splity
-        self._plotdict['sharex'] = sharex
-        self._plotdict['sharey'] = sharey
-        self._plotdict['oneD'] = oneD
-        self._plotdict['legendflag'] = legendflag
-        self._plotdict['legendloc'] = legendloc
+        config = dict((key, getattr(spec, key)) for key in PlotSpec.keys)
+        self._configure(oneD=spec.oneD, **config)
+
+        oneD = spec.oneD
+        xnames = spec.xnames
+        ynames = spec.ynames
+        labels = spec.labels
+        splitx = spec.splitx
+        splity = spec.splity
+        legendflag = spec.legendflag
+        legendloc = spec.legendloc
+        windowsize = spec.windowsize
 
         # Abort if nothing to plot along either axis
         ly = len(ynames)
@@ -468,54 +1544,120 @@ class PyOscopeStatic(object):
 
         # Create axes for plotting
         if not oneD:
-            numxs = len(xs)
+            numxs = len(xnames)
             lenx = numxs if splitx else 1
         else:
             numxs = 1
             lenx = 1
-        numys = len(ys)
+        numys = len(ynames)
         leny = numys if splity else 1
-        self.axes = self._create_axes(leny, lenx, sharex=sharex,
-                                      sharey=sharey)
+        # Reuse the axes grid if it is unchanged, e.g. when switching files
+        # or changing columns, since rebuilding it is slow
+        grid = (leny, lenx, spec.sharex, spec.sharey)
+        reuse = (grid == self._grid) and (self.axes is not None)
+        if not reuse:
+            self.axes = self._create_axes(leny, lenx, sharex=spec.sharex,
+                                          sharey=spec.sharey)
+            self._grid = grid
+            self._linekeys = {}
+        else:
+            for lc, _ in self._collections.values():
+                lc.remove()
+            for dm in self._densitymaps.values():
+                dm.remove()
+            self._remove_measurements()
+        self._collections = {}
+        self._densitymaps = {}
+        self._measures = {}
+        self._measuretexts = []
+
+        # Lines in a reused grid are reused if they are in the same place,
+        # plot the same columns and are styled the same. Their data are
+        # updated in place instead of making a new line.
+        oldlines = self._linekeys
+        self._linekeys = {}
+        stylekey = (repr(args), repr(sorted(kwargs.items())))
 
         # Make plots in appropriate axes
         self.mode = 'plot'
         self.lines = np.empty([numxs, numys], dtype='object')
-        if oneD:
-            for j, y in enumerate(newys):
-                yname = ynames[j]
-                ylbl = ylabels[j]
+        if spec.collection:
+            self._make_collections(spec, *args, **kwargs)
+        elif oneD:
+            for j, yname in enumerate(ynames):
+                y = spec.column(self.data, 'y', j)
+                ylbl = spec.ylabels[j]
                 ylbl = yname if (ylbl is None) else ylbl
-                ytran = ytrans[j]
+                ytran = spec.yfuncs[j]
                 label = None if (labels is None) else labels[j]
                 rownum = j if splity else 0
                 ax = self.axes[rownum, 0]
-                line = self._plotyt(ax, y, ylbl, transform=ytran,
-                                    label=label, *args, **kwargs)
+                key = (0, j, rownum, 0, None, yname) + stylekey
+                line = oldlines.pop(key, None)
+                if line is None:
+                    line = self._plotyt(ax, y, ylbl, windowsize=windowsize,
+                                        transform=ytran, label=label,
+                                        *args, **kwargs)
+                else:
+                    self._update_line_slow(line, y=y, ytrans=ytran)
+                    line.set_label(self._line_label(spec, 0, j))
                 self.lines[0, j] = line
-                if legendflag:
-                    ax.legend(loc=legendloc)
+                self._linekeys[key] = line
         else:
-            for i, x in enumerate(newxs):
-                for j, y in enumerate(newys):
-                    xname = xnames[i]
-                    xlbl = xlabels[i]
+            for i, xname in enumerate(xnames):
+                x = spec.column(self.data, 'x', i)
+                for j, yname in enumerate(ynames):
+                    y = spec.column(self.data, 'y', j)
+                    xlbl = spec.xlabels[i]
                     xlbl = xname if (xlbl is None) else xlbl
-                    yname = ynames[j]
-                    ylbl = ylabels[j]
+                    ylbl = spec.ylabels[j]
                     ylbl = yname if (ylbl is None) else ylbl
-                    xtran = xtrans[i]
-                    ytran = ytrans[j]
+                    xtran = spec.xfuncs[i]
+                    ytran = spec.yfuncs[j]
                     label = None if (labels is None) else labels[i][j]
                     rownum = j if splity else 0
                     colnum = i if splitx else 0
                     ax = self.axes[rownum, colnum]
-                    line = self._plotxy(ax, x, y, xlbl, ylbl, xtrans=xtran,
-                                        ytrans=ytran, label=label,
-                                        *args, **kwargs)
+                    key = (i, j, rownum, colnum, xname, yname) + stylekey
+                    line = oldlines.pop(key, None)
+                    if line is None:
+                        line = self._plotxy(ax, x, y, xlbl, ylbl,
+                                            windowsize=windowsize,
+                                            xtrans=xtran, ytrans=ytran,
+                                            label=label, *args, **kwargs)
+                    else:
+                        self._update_line_slow(line, x, y, xtran, ytran)
+                        line.set_label(self._line_label(spec, i, j))
                     self.lines[i, j] = line
-                    if legendflag:
-                        ax.legend(loc=legendloc)
+                    self._linekeys[key] = line
+
+        # Remove lines that were not reused, and show reused ones that a
+        # persistence display hid
+        for line in oldlines.values():
+            line.remove()
+        if reuse:
+            for line in self._linekeys.values():
+                line.set_visible(True)
+
+        for pos, ax in np.ndenumerate(self.axes):
+            lc = self._collections.get(pos, (None,))[0]
+            if reuse:
+                # Limits set before, e.g. by zooming or by a strip chart,
+                # turn autoscaling off
+                ax.set_autoscale_on(True)
+                ax.relim()
+            if lc is not None:
+                # relim ignores collections
+                lc.update_datalim()
+            if reuse or (lc is not None):
+                ax.autoscale_view()
+            if legendflag:
+                if lc is None:
+                    ax.legend(loc=legendloc)
+                else:
+                    ax.legend(handles=lc.legend_handles(), loc=legendloc)
+            elif ax.legend_ is not None:
+                ax.legend_.remove()
 
         if self.interactive:
             self.fig.show()
@@ -523,48 +1665,429 @@ class PyOscopeStatic(object):
 
         return self.lines
 
+    @staticmethod
+    def _line_label(spec, i, j):
+        """
+        Label of the line of the `i`th x and `j`th y identifiers of `spec`.
+        """
+        ylbl = spec.ylabels[j]
+        ylbl = spec.ynames[j] if (ylbl is None) else ylbl
+        ylbl = 'index' if (ylbl is None) else ylbl
+        if spec.oneD:
+            label = None if (spec.labels is None) else spec.labels[j]
+            return ylbl if (label is None) else label
+        xlbl = spec.xlabels[i]
+        xlbl = spec.xnames[i] if (xlbl is None) else xlbl
+        xlbl = 'index' if (xlbl is None) else xlbl
+        label = None if (spec.labels is None) else spec.labels[i][j]
+        plabel = "{x} (x) vs {y} (y)".format(x=xlbl, y=ylbl)
+        return plabel if (label is None) else label
+
     @synchronized('lock')
-    def _plot_from_dict(self, pdict=None):
-        if not self._initialized:
-            return
+    def _make_collections(self, spec, *args, **kwargs):
+        """
+        Plot the lines of each axes as a single ChannelCollection.
+        """
+        if args:
+            raise ValueError("Format strings are not supported for "
+                             "collections, use keyword arguments.")
+        numxs = 1 if spec.oneD else len(spec.xnames)
+        members = {}
+        for i in range(numxs):
+            for j in range(len(spec.ynames)):
+                rownum = j if spec.splity else 0
+                colnum = i if (spec.splitx and not spec.oneD) else 0
+                members.setdefault((rownum, colnum), []).append((i, j))
+
+        for pos, chans in members.items():
+            labels = [self._line_label(spec, i, j) for i, j in chans]
+            lc = ChannelCollection(self.axes[pos], labels, **kwargs)
+            self._collections[pos] = (lc, chans)
+            for i, j in chans:
+                self.lines[i, j] = lc
+        self._update_collections()
+
+    def _update_collections(self):
+        """
+        Update the data of all collections in bulk.
+        """
+        spec = self.spec
+        window = self._window(len(self.data))
+        for lc, chans in self._collections.values():
+            ys = self._stack_columns(spec, 'y', [j for _, j in chans], window)
+            if spec.oneD:
+                x = np.arange(window.start, window.stop)
+            else:
+                xis = [i for i, _ in chans]
+                if len(set(xis)) == 1:
+                    x = self._stack_columns(spec, 'x', xis[:1], window)[0]
+                else:
+                    x = self._stack_columns(spec, 'x', xis, window)
+            lc.set_data(x, ys)
 
-        if pdict is None:
-            pdict = self._plotdict
+    def _stack_columns(self, spec, axis, indices, window):
+        """
+        Stack the samples in the slice `window` of the transformed data of
+        the identifiers `indices` along `axis` of `spec` into a 2D
+        (channels x samples) array.
+        """
+        names = spec.xnames if (axis == 'x') else spec.ynames
+        funcs = spec.xfuncs if (axis == 'x') else spec.yfuncs
+        plain = all((names[k] is not None) and (funcs[k] is None) and
+                    ((axis, k) not in spec.arrays) for k in indices)
+        if plain and hasattr(self.data, 'iloc'):
+            # Plain DataFrame columns are extracted in one go
+            cols = [names[k] for k in indices]
+            return self.data.iloc[window][cols].values.T
+        rows = []
+        for k in indices:
+            data = np.asarray(spec.column(self.data, axis, k))[window]
+            if funcs[k] is not None:
+                data = funcs[k](data)
+            rows.append(data)
+        return np.vstack(rows)
+
+    def _column_rows(self, spec, axis, k, start, stop=None):
+        """
+        Samples of the `k`th identifier along `axis` of `spec` from row
+        `start` up to row `stop`.
+        """
+        if (axis, k) in spec.arrays:
+            return np.asarray(spec.arrays[(axis, k)])[start:stop]
+        names = spec.xnames if (axis == 'x') else spec.ynames
+        if names[k] is None:
+            stop = len(self.data) if (stop is None) else stop
+            return np.arange(start, stop)
+        return np.asarray(self.data[names[k]])[start:stop]
+
+    def _window(self, n):
+        """
+        Slice of the samples shown of a data set of length `n`.
 
-        try:
-            xnames = pdict['xnames']
-            ynames = pdict['ynames']
-            xlabels = pdict['xlabels']
-            ylabels = pdict['ylabels']
-            labels = pdict['labels']
-            legendflag = pdict['legendflag']
-            legendloc = pdict['legendloc']
-            splitx = pdict['splitx']
-            splity = pdict['splity']
-            sharex = pdict['sharex']
-            sharey = pdict['sharey']
-            xtrans = pdict['xtrans']
-            ytrans = pdict['ytrans']
-        except KeyError:
-            raise ValueError("Invalid plot dictionary specified:"
-                             " {0}".format(repr(pdict)))
+        See `windowsize`, `timewindow` and `jump_to_time`. Time windows are
+        found by binary search in the time column, so they cost the same
+        however long the data are.
+        """
+        config = self._plotdict
+        span = config['timespan']
+        start = self._timestart
+        if (span is None) and (start is None):
+            ws = config['windowsize']
+            if ws is None:
+                return slice(0, n)
+            return slice(max(n - ws, 0), n)
+
+        t = self._timestamps()[:n]
+        if start is None:
+            if not len(t):
+                return slice(0, n)
+            lo = np.searchsorted(t, t[-1] - self._timedelta(t, span))
+            return slice(int(lo), n)
+        start = self._time(t, start)
+        lo = np.searchsorted(t, start)
+        if span is None:
+            return slice(int(lo), n)
+        hi = np.searchsorted(t, start + self._timedelta(t, span),
+                             side='right')
+        return slice(int(lo), int(hi))
+
+    def _timestamps(self):
+        """
+        The data of the time column, see `timewindow`.
+        """
+        column = self._plotdict['timecolumn']
+        if column is None:
+            raise ValueError("No time column designated.")
+        return np.asarray(self.data[column])
+
+    @staticmethod
+    def _time(t, value):
+        """
+        Convert the time `value` to the type of the timestamps `t`.
+        """
+        if t.dtype.kind == 'M':
+            return np.datetime64(value)
+        return value
 
-        nameflag = True
-        names = xnames + ynames if xnames else ynames
-        for name in names:
-            flag = (name in self.data.columns)
-            nameflag = (nameflag and flag)
+    @staticmethod
+    def _timedelta(t, span):
+        """
+        Convert the time span `span` to the type of the timestamps `t`, i.e.
+        from seconds to a timedelta for datetimes.
+        """
+        if (t.dtype.kind == 'M') and not isinstance(span, np.timedelta64):
+            return np.timedelta64(int(round(span*1e9)), 'ns')
+        return span
 
-        if not nameflag:
-            raise ValueError("One or more data names not available!")
+    @synchronized('lock')
+    def persistence(self, bins=None, xlim=None, ylim=None, decay=None,
+                    log=False, span=None, cmap='inferno'):
+        """
+        Show the current plot as a persistence (density) display.
 
-        if legendloc:
-            legend = legendloc if legendflag else None
+        Instead of drawing lines, the samples of all of the lines in each
+        axes are accumulated in a 2D histogram that is shown as an image,
+        see DensityMap. This shows the structure of dense, noisy data much
+        better than overlaid lines, and its drawing cost does not depend on
+        the number of samples. Realtime plotters only add the newly
+        arrived samples on each update.
+
+        `bins` is the (columns, rows) shape of the histogram. Defaults to
+        the size of each axes in pixels.
+
+        `xlim` and `ylim` are the fixed data ranges covered by the
+        histogram. Each defaults to the range of the current data plus a
+        margin.
+
+        `decay` and `log` are as in DensityMap.
+
+        In 1D plots, the x axis shows the sample index modulo `span`, i.e.
+        the samples are folded into sweeps of `span` samples. Defaults to
+        the window size, or the number of samples if there is no window.
+
+        `bins` of False returns to the normal plot mode, as does making a
+        new plot.
+        """
+        if self.mode not in ('plot', 'persistence'):
+            raise ValueError("Nothing is plotted.")
+        for dm in self._densitymaps.values():
+            dm.remove()
+        self._densitymaps = {}
+        if bins is False:
+            for line in self.lines.flat:
+                line.set_visible(True)
+            self.mode = 'plot'
+            self.redraw()
+            return
+        if self._collections:
+            raise ValueError("Persistence displays do not support "
+                             "collections.")
+
+        spec = self.spec
+        spec.resolve(self.data.columns)
+        if span is None:
+            span = self._plotdict['windowsize'] or max(len(self.data), 2)
+        self._persist_span = int(span)
+        self._persist_seen = 0
+
+        # Group lines by axes and find their data ranges
+        members = {}
+        for (i, j), line in np.ndenumerate(self.lines):
+            line.set_visible(False)
+            members.setdefault(id(line.axes), (line.axes, []))[1].append(
+                (i, j))
+        self._persist_members = []
+        for ax, chans in members.values():
+            x, y = self._persist_rows(spec, chans, 0)
+            axxlim = xlim
+            axylim = ylim
+            if axxlim is None:
+                axxlim = (0, self._persist_span) if spec.oneD else \
+                    self._margins(x)
+            if axylim is None:
+                axylim = self._margins(y)
+            if bins is None:
+                bbox = ax.get_window_extent()
+                axbins = (bbox.width, bbox.height)
+            else:
+                axbins = bins
+            dm = DensityMap(ax, axxlim, axylim, (axbins[1], axbins[0]),
+                            decay=decay, log=log, cmap=cmap)
+            ax.set_xlim(*axxlim)
+            ax.set_ylim(*axylim)
+            self._densitymaps[id(ax)] = dm
+            self._persist_members.append((dm, chans))
+        self.mode = 'persistence'
+        self._update_persistence()
+
+    @staticmethod
+    def _margins(data):
+        """
+        Range of `data` plus a 10% margin on either side.
+        """
+        data = np.asarray(data, dtype=float)
+        finite = data[np.isfinite(data)]
+        if not finite.size:
+            return (0., 1.)
+        lo, hi = finite.min(), finite.max()
+        margin = 0.1*(hi - lo) if (hi > lo) else 0.5
+        return (lo - margin, hi + margin)
+
+    def _persist_rows(self, spec, chans, start):
+        """
+        Concatenated x and y samples from row `start` on of the lines
+        `chans` ((i, j) pairs) of a persistence display.
+        """
+        xs = []
+        ys = []
+        for i, j in chans:
+            y = self._column_rows(spec, 'y', j, start)
+            if spec.yfuncs[j] is not None:
+                y = spec.yfuncs[j](y)
+            if spec.oneD:
+                x = (np.arange(start, start + len(y))
+                     + getattr(self, 'dropped', 0)) % self._persist_span
+            else:
+                x = self._column_rows(spec, 'x', i, start)
+                if spec.xfuncs[i] is not None:
+                    x = spec.xfuncs[i](x)
+            xs.append(np.asarray(x, dtype=float))
+            ys.append(np.asarray(y, dtype=float))
+        return np.concatenate(xs), np.concatenate(ys)
+
+    def _update_persistence(self):
+        """
+        Add the rows that arrived since the last update to the persistence
+        display.
+        """
+        spec = self.spec
+        spec.resolve(self.data.columns)
+        start = self._persist_seen
+        if len(self.data) < start:
+            # The file was truncated or replaced, so start over
+            start = 0
+            for dm in self._densitymaps.values():
+                dm.counts[:] = 0.
+        elif (len(self.data) == start) and (start > 0):
+            return
+        self._persist_seen = len(self.data)
+        for dm, chans in self._persist_members:
+            x, y = self._persist_rows(spec, chans, start)
+            dm.add(x, y)
+            dm.update_image()
+        self.redraw()
+
+    _measureloc = {'upper left': (0.02, 0.98, 'left', 'top'),
+                   'upper right': (0.98, 0.98, 'right', 'top'),
+                   'lower left': (0.02, 0.02, 'left', 'bottom'),
+                   'lower right': (0.98, 0.02, 'right', 'bottom')}
+
+    @synchronized('lock')
+    def measure(self, ys=None, stats=('mean', 'rms', 'vpp', 'freq'),
+                level=0., hysteresis=0., loc='upper left', fmt='{0:.4g}'):
+        """
+        Show measurements of the lines of the y identifiers `ys` (names or
+        indices into the y identifiers of the plot, default all) as text in
+        a corner `loc` of their axes, like the measurements of an
+        oscilloscope.
+
+        `stats` are the measurements shown, out of 'mean', 'rms', 'std'
+        (standard deviation), 'min', 'max', 'vpp' (peak-to-peak) and
+        'freq'. The frequency is found from the rising crossings of `level`
+        with `hysteresis` (see Trigger), in cycles per unit of x, or per
+        sample in 1D plots. Each value is formatted with `fmt`.
+
+        The measurements cover the samples in the window (see `windowsize`
+        and `timewindow`). Realtime plotters update them with only the
+        samples that entered and left the window, see Measurement, and
+        only change the text, which is drawn with the rest of the plot.
+
+        `ys` of False removes the measurements, as does making a new plot.
+        """
+        if self.mode not in ('plot', 'strip', 'trigger', 'persistence'):
+            raise ValueError("Nothing is plotted.")
+        self._remove_measurements()
+        if ys is False:
+            self.redraw()
+            return
+        if self._collections:
+            raise ValueError("Measurements do not support collections.")
+        for stat in stats:
+            if stat not in Measurement.names:
+                raise ValueError("Unknown measurement: {0}".format(
+                    repr(stat)))
+        if loc not in self._measureloc:
+            raise ValueError("loc must be one of {0}.".format(
+                ', '.join(sorted(self._measureloc))))
+
+        spec = self.spec
+        if ys is None:
+            js = list(range(len(spec.ynames)))
         else:
-            legend = legendflag
+            if isinstance(ys, (StringTypes, int, np.integer)):
+                ys = [ys]
+            js = [y if isinstance(y, (int, np.integer))
+                  else list(spec.ynames).index(y) for y in ys]
+        self._measurestats = tuple(stats)
+        self._measurefmt = fmt
+        texts = {}  # id(ax): (Text, keys)
+        x, y, ha, va = self._measureloc[loc]
+        for (i, j), line in np.ndenumerate(self.lines):
+            if j not in js:
+                continue
+            self._measures[i, j] = Measurement(level, hysteresis)
+            ax = line.axes
+            if id(ax) not in texts:
+                text = ax.text(x, y, '', transform=ax.transAxes, ha=ha,
+                               va=va, family='monospace', fontsize='small',
+                               bbox={'boxstyle': 'round', 'alpha': 0.7,
+                                     'facecolor': 'white'})
+                texts[id(ax)] = (text, [])
+            texts[id(ax)][1].append((i, j))
+        self._measuretexts = list(texts.values())
+        self._update_measurements()
+        self.redraw()
+
+    def _remove_measurements(self):
+        for text, keys in self._measuretexts:
+            text.remove()
+        self._measures = {}
+        self._measuretexts = []
+
+    def _update_measurements(self):
+        """
+        Update the measurements to the current window, see `measure`.
+        """
+        if not self._measures:
+            return
+        spec = self.spec
+        window = self._window(len(self.data))
+
+        def rows(axis, k):
+            funcs = spec.xfuncs if (axis == 'x') else spec.yfuncs
+
+            def get(start, stop):
+                data = self._column_rows(spec, axis, k, start, stop)
+                if funcs[k] is not None:
+                    data = funcs[k](data)
+                return data
+            return get
+
+        for (i, j), m in self._measures.items():
+            xs = None if spec.oneD else rows('x', i)
+            m.update(rows('y', j), window.start, window.stop, xs)
+
+        fmt = self._measurefmt
+        for text, keys in self._measuretexts:
+            lines = []
+            for i, j in keys:
+                values = self._measures[i, j].values()
+                if spec.oneD or (len(spec.xnames) == 1):
+                    label = spec.ylabels[j] or spec.ynames[j] or 'index'
+                else:
+                    label = self._line_label(spec, i, j)
+                lines.append('{0}: {1}'.format(label, '  '.join(
+                    '{0} {1}'.format(stat, fmt.format(values[stat]))
+                    for stat in self._measurestats)))
+            text.set_text('\n'.join(lines))
 
-        return self.plot(xnames, ynames, splitx, splity, sharex, sharey,
-                         xtrans, ytrans, legend, xlabels, ylabels, labels)
+    @synchronized('lock')
+    def _plot_from_dict(self, pdict=None):
+        """
+        Replot from a plot dictionary or PlotSpec `pdict`. Defaults to the
+        spec of the current plot.
+        """
+        if not self._initialized:
+            return
+
+        if pdict is None:
+            pdict = self._plotdict if (self.spec is None) else self.spec
+        if isinstance(pdict, PlotSpec):
+            spec = pdict
+        else:
+            spec = PlotSpec.from_dict(pdict)
+
+        return self._plot_spec(spec)
 
     @synchronized('lock')
     def _plotyt(self, ax, y, yname, windowsize=None, transform=None,
@@ -592,11 +2115,8 @@ class PyOscopeStatic(object):
 
         Returns the line object that is created.
         """
-        if windowsize is None:
-            ws = len(y)
-        else:
-            ws = min(len(y), windowsize)
-        self._plotdict['windowsize'] = windowsize
+        self._configure(windowsize=windowsize)
+        window = self._window(len(y))
 
         if transform is None:
             transform = lambda x: x  # Identity function
@@ -606,9 +2126,10 @@ class PyOscopeStatic(object):
 
         plabel = yname if (label is None) else label
 
-        y = y[-ws:]
+        x = np.arange(window.start, window.stop)
+        y = y[window]
         y = transform(y)
-        line, = ax.plot(y, label=plabel, *args, **kwargs)
+        line, = ax.plot(x, y, label=plabel, *args, **kwargs)
         return line
 
     @synchronized('lock')
@@ -640,11 +2161,8 @@ class PyOscopeStatic(object):
         if len(x) != len(y):
             raise ValueError("x and y values must have same length!")
 
-        if windowsize is None:
-            ws = len(y)
-        else:
-            ws = min(len(y), windowsize)
-        self._plotdict['windowsize'] = windowsize
+        self._configure(windowsize=windowsize)
+        window = self._window(len(y))
 
         if xtrans is None:
             xtrans = lambda x: x  # Identity function
@@ -656,9 +2174,9 @@ class PyOscopeStatic(object):
         if yname is None:
             yname = 'index'
 
-        x = x[-ws:]
+        x = x[window]
         x = xtrans(x)
-        y = y[-ws:]
+        y = y[window]
         y = ytrans(y)
 
         plabel = "{x} (x) vs {y} (y)".format(x=xname, y=yname)
@@ -667,6 +2185,28 @@ class PyOscopeStatic(object):
         line, = ax.plot(x, y, label=plabel, *args, **kwargs)
         return line
 
+    def _update_line_slow(self, line, x=None, y=None,
+                          xtrans=None, ytrans=None):
+        """
+        Updates specified line with new data.
+        """
+        oneD = self._plotdict['oneD']
+        window = self._window(len(y))
+
+        if xtrans is None:
+            xtrans = lambda x: x
+        if ytrans is None:
+            ytrans = lambda x: x
+
+        if oneD:
+            newx = np.arange(window.start, window.stop)
+        else:
+            newx = xtrans(x)[window]
+        newy = ytrans(y)[window]
+
+        line.set_xdata(newx)
+        line.set_ydata(newy)
+
     @synchronized('lock')
     def clear(self):
         """
@@ -674,16 +2214,29 @@ class PyOscopeStatic(object):
         """
         self.fig.clear()
         self.mode = 'none'
+        self._grid = None
+        self._linekeys = {}
+        self._collections = {}
+        self._densitymaps = {}
+        self._measures = {}
+        self._measuretexts = []
 
     @synchronized('lock')
-    def autoscale_axes(self):
-        xflag = self._plotdict['autoscalex']
-        yflag = self._plotdict['autoscaley']
+    def autoscale_axes(self, xflag=None, yflag=None):
+        """
+        Autoscale the axes to the data shown. `xflag` and `yflag` of None
+        use the settings of `autoscale`.
+        """
+        config = self._plotdict
+        if xflag is None:
+            xflag = config['autoscalex']
+        if yflag is None:
+            yflag = config['autoscaley']
 
         if (not xflag) and (not yflag):
             return
 
-        for ax in self.axes.flatten():
+        for pos, ax in np.ndenumerate(self.axes):
             xminax, xmaxax, yminax, ymaxax = ax.axis()
             dxax = xmaxax - xminax
             dyax = ymaxax - yminax
@@ -695,7 +2248,10 @@ class PyOscopeStatic(object):
             ymins = []
             ymaxs = []
 
-            for line in ax.lines:
+            artists = list(ax.lines)
+            if pos in self._collections:
+                artists.append(self._collections[pos][0])
+            for line in artists:
                 try:
                     xmin, xmax, ymin, ymax = self._get_minmax(line)
                 except ValueError:
@@ -742,16 +2298,20 @@ class PyOscopeStatic(object):
 
     @staticmethod
     def _get_minmax(line):
-        xdata = line.get_xdata()
-        ydata = line.get_ydata()
-        try:
-            xmin = min(xdata)
-            xmax = max(xdata)
-            ymin = min(ydata)
-            ymax = max(ydata)
-        except ValueError:
+        xdata = np.asarray(line.get_xdata())
+        ydata = np.asarray(line.get_ydata())
+        if (xdata.size == 0) or (ydata.size == 0):
             errmsg = "Line {0} has no data.".format(repr(line))
             raise ValueError(errmsg)
+        # Compare e.g. datetimes in the units of the axes
+        if xdata.dtype.kind not in 'biuf':
+            xdata = np.asarray(line.convert_xunits(xdata), dtype=float)
+        if ydata.dtype.kind not in 'biuf':
+            ydata = np.asarray(line.convert_yunits(ydata), dtype=float)
+        xmin = np.nanmin(xdata)
+        xmax = np.nanmax(xdata)
+        ymin = np.nanmin(ydata)
+        ymax = np.nanmax(ydata)
         return xmin, xmax, ymin, ymax
 
     def autoscale(self, xflag=True, yflag=None):
@@ -765,8 +2325,32 @@ class PyOscopeStatic(object):
         """
         if yflag is None:
             yflag = xflag
-        self._plotdict['autoscalex'] = bool(xflag)
-        self._plotdict['autoscaley'] = bool(yflag)
+        self._configure(autoscalex=bool(xflag), autoscaley=bool(yflag))
+
+    def _configure(self, **changes):
+        """
+        Change the plot configuration `_plotdict`.
+
+        The configuration is replaced by an updated copy rather than
+        changed in place, so that the configuration may be read without a
+        lock, and its settings always belong together. Callers that read
+        more than one setting should read `_plotdict` once.
+
+        Changes to the settings of the PlotSpec of the current plot `spec`
+        replace it by a changed copy the same way.
+        """
+        with self._configlock:
+            config = dict(self._plotdict)
+            config.update(changes)
+            self._plotdict = config
+            spec = self.spec
+            if spec is None:
+                return
+            respec = dict((key, value) for key, value in changes.items()
+                          if (key in PlotSpec.keys)
+                          and (getattr(spec, key) is not value))
+            if respec:
+                self.spec = spec.copy(**respec)
 
     def windowsize(self, windowsize=None):
         """
@@ -778,14 +2362,156 @@ class PyOscopeStatic(object):
 
         A `windowsize` of `None` indicates that the full set of data should be
         shown. This is the default setting.
+
+        Replaces a time window set with `timewindow`.
         """
-        try:
-            windowsize = int(windowsize)
-        except ValueError:
-            windowsize = None
-        if windowsize <= 1:  # Would plot a single point
-            windowsize = None
-        self._plotdict['windowsize'] = windowsize
+        windowsize = _window_samples(windowsize)
+        self._configure(windowsize=windowsize, timespan=None)
+
+    def timewindow(self, span=None, column=None):
+        """
+        Set the window size in time units.
+
+        `column` designates a column of monotonically increasing
+        timestamps, e.g. a time column of the data file. It defaults to the
+        previously designated column. The window then shows the samples
+        within `span` of the last timestamp, however many samples that
+        is, so the window keeps its width when the sample rate changes.
+        `span` is in the units of the timestamps, or in seconds if they are
+        datetimes.
+
+        A `span` of None shows all of the data. Use `windowsize` to return
+        to a window of a number of samples.
+
+        Example usage:
+
+            >>> rt.plot('time', 'voltage')
+            >>> rt.timewindow(30., 'time')  # The last 30 s
+        """
+        if column is None:
+            column = self._plotdict['timecolumn']
+        if column is None:
+            raise ValueError("No time column designated.")
+        data = self.data
+        if self._initialized:
+            if column not in data.columns:
+                raise ValueError("Time column not available: "
+                                 "{0}".format(column))
+            t = np.asarray(data[column])
+            if np.any(t[1:] < t[:-1]):
+                raise ValueError("Time column {0} is not monotonically "
+                                 "increasing.".format(column))
+        self._configure(timecolumn=column, timespan=span)
+
+    @synchronized('lock')
+    def jump_to_time(self, t, span=None):
+        """
+        Show the samples from time `t` of the time column on, e.g. to look
+        at a region of a long data file.
+
+        The window starts at the first sample at or after `t` and is
+        `span` wide, which defaults to the span set by `timewindow`, or
+        else the rest of the data. The start is found by binary search in
+        the time column, see `timewindow`. For datetime columns, `t` may be
+        anything accepted by numpy.datetime64, e.g. '2013-07-17T12:00'.
+
+        A `t` of None returns to showing the end of the data.
+
+        Searches the data that are loaded. See `load_times` for files that
+        are too large to load in full.
+        """
+        if t is not None:
+            self._timestamps()  # Check that there is a time column
+        self._timestart = t
+        if span is not None:
+            self._configure(timespan=span)
+        self._update_measurements()
+        if self.mode == 'plot':
+            self._update_lines()
+            self.autoscale_axes()
+            self.redraw()
+
+    @synchronized('readlock')
+    def load_rows(self, start=None, stop=None):
+        """
+        Load and show only the rows `start` up to `stop` of the file.
+
+        Meant for files too large to read in full: the reader seeks close
+        to `start` with a sparse index of the file and parses only the
+        requested rows (see readers.DefaultReader.read_rows). Read just the
+        start of such a file when creating the plotter, e.g. by passing
+        `nrows=1000`.
+
+        Example usage:
+
+            >>> pos = PyOscopeStatic(f='huge.csv', header=0, nrows=1000)
+            >>> pos.plot('time', 'voltage')
+            >>> pos.load_rows(50000000, 50100000)
+        """
+        data = self.reader.read_rows(start, stop)
+        self._show_loaded(data)
+
+    @synchronized('readlock')
+    def load_times(self, t0=None, t1=None, column=None):
+        """
+        Load and show only the rows of the file with times from `t0` to
+        `t1` in the time column.
+
+        Like `load_rows`, but the rows are found by binary search in the
+        times of the sparse index of the file (see
+        readers.DefaultReader.read_times). `column` defaults to the time
+        column designated with `timewindow`.
+        """
+        if column is None:
+            column = self._plotdict['timecolumn']
+        data = self.reader.read_times(t0, t1, timecolumn=column)
+        self._show_loaded(data)
+
+    @synchronized('lock')
+    def _show_loaded(self, data):
+        """
+        Show newly loaded `data` in the current plot.
+        """
+        self._set_data(data)
+        self._timestart = None
+        self._update_measurements()
+        if self.mode == 'plot':
+            self._update_lines()
+            self.autoscale_axes()
+            self.redraw()
+
+    def _set_data(self, data, reset=True):
+        """
+        Replace the data by `data`, read by the reader. `reset` is False if
+        `data` are the previous data with rows appended.
+        """
+        self.data = data
+
+    def _update_lines(self):
+        """
+        Update the data of the lines (or collections) of the current plot,
+        e.g. after the data or the window changed.
+        """
+        spec = self.spec
+        spec.resolve(self.data.columns)
+
+        if self._collections:
+            self._update_collections()
+        elif spec.oneD:
+            for j in range(len(spec.ynames)):
+                y = spec.column(self.data, 'y', j)
+                line = self.lines[0, j]
+                self._update_line_slow(line, y=y, ytrans=spec.yfuncs[j])
+        else:
+            ys = [spec.column(self.data, 'y', j)
+                  for j in range(len(spec.ynames))]
+            for i in range(len(spec.xnames)):
+                x = spec.column(self.data, 'x', i)
+                xtran = spec.xfuncs[i]
+                for j, y in enumerate(ys):
+                    ytran = spec.yfuncs[j]
+                    line = self.lines[i, j]
+                    self._update_line_slow(line, x, y, xtran, ytran)
 
 
 class PyOscopeRealtime(PyOscopeStatic):
@@ -826,7 +2552,16 @@ class PyOscopeRealtime(PyOscopeStatic):
                                 *args, **kwargs)
 
         self._update_dict = {'none': self._pass,
-                             'plot': self._update_plot}
+                             'plot': self._update_plot,
+                             'strip': self._update_plot_strip,
+                             'trigger': self._update_plot_trigger,
+                             'persistence': self._update_persistence}
+        self._strips = None  # StripChart of each line in strip-chart mode
+        self._server = None  # remote.FrameServer, see serve
+        self._memory = None  # memory.MemoryBudget, see memory.register
+        self.dropped = 0  # Rows dropped from the data, see _replace_rows
+        self._batch = None  # (function, state), see set_batch_callback
+        self._raw = None  # Reader's data before the batch callback
 
         if self.interactive:
             # Bind update to MPL Idle event
@@ -839,6 +2574,8 @@ class PyOscopeRealtime(PyOscopeStatic):
         self.stop()
 
     def stop(self):
+        self.stop_export()
+        self.stop_serving()
         if self.interactive:
             # Unbind update function from timer and attempt to stop timer
             # NOTE: timer.stop() does nothing with macosx backend. This is an
@@ -849,19 +2586,91 @@ class PyOscopeRealtime(PyOscopeStatic):
         self.close()
 
     def close(self):
-        plt.close(self.fig)
+        if self.interactive:
+            _pyplot().close(self.fig)
+        if getattr(self, '_memory', None) is not None:
+            self._memory.unregister(self)
         try:
             self.reader.close()
         except AttributeError:
             pass
 
-    @synchronized('lock')
+    @synchronized('readlock')
     def _update(self):
+        """
+        Read the changes to the data file and show them.
+
+        The reader runs holding only `readlock`, so that plotting and
+        rendering are not held up by reading and parsing. Taking `lock`
+        then only waits for the plot update.
+        """
         if not self._initialized:
             return
-        self.data = self.reader.update_data()
+        self._apply_update(self.reader.update_data())
+
+    @synchronized('lock')
+    def _apply_update(self, data):
+        """
+        Show `data`, the result of a reader update.
+
+        Separate from `_update` so that the reader may be run elsewhere, e.g.
+        in an executor by aioscope.AsyncScope.
+        """
+        self._set_data(data, reset=False)
         self.callback()
+        # Before the plot, which draws the text of the measurements
+        self._update_measurements()
         self._update_dict[self.mode]()
+        if self._memory is not None:
+            self._memory._updated(self)
+
+    def _history(self):
+        """
+        Number of rows at the start of the data that are neither shown nor
+        needed by later updates, and may be dropped, see memory.MemoryBudget.
+        """
+        if not self._initialized or (self.data is None):
+            return 0
+        n = len(self.data)
+        try:
+            start = self._window(n).start
+        except (ValueError, KeyError):  # Time column gone
+            return 0
+        if self.mode == 'strip':
+            start = min(start, self._strip_seen)
+        elif self.mode == 'persistence':
+            start = min(start, self._persist_seen)
+        elif self.mode == 'trigger':
+            # Keep the samples before pending triggers, and those before
+            # the next one for averaging
+            pending = [t - self._trig_pre for t in self._trig_pending]
+            start = min([start, self._trig.scanned - self._trig_pre]
+                        + pending)
+        return max(start, 0)
+
+    @synchronized('lock')
+    def _replace_rows(self, k, data):
+        """
+        Replace the data by `data`, the same data without their first `k`
+        rows, and tell the reader.
+
+        Used by memory.MemoryBudget to drop rows and to move data to files.
+        """
+        if self.reader.data is self.data:
+            self.reader.data = data
+        self.data = data
+        if not k:
+            return
+        self.dropped += k
+        if self.mode == 'strip':
+            self._strip_seen -= k
+        elif self.mode == 'persistence':
+            self._persist_seen -= k
+        elif self.mode == 'trigger':
+            self._trig.drop(k)
+            self._trig_pending = [t - k for t in self._trig_pending]
+        for m in self._measures.values():
+            m.drop(k)
 
     def callback(self):
         """
@@ -896,95 +2705,343 @@ class PyOscopeRealtime(PyOscopeStatic):
             rt.set_callback(timestwo)
 
         would multiply all of the data by 2.
+
+        The callback sees all of the data at every update, so its work grows
+        with the data. See `set_batch_callback` to process only the rows
+        that are new.
         """
         self.callback = MethodType(newfunc, self)
 
+    @synchronized('lock')
+    def set_batch_callback(self, func, state=None):
+        """
+        Transform the data a batch of new rows at a time with `func`.
+
+        At each update, the rows the reader appended since the last update
+        are passed to
+
+            func(rows, state)
+
+        as a DataFrame indexed by row number, with `state`, an object kept
+        from call to call (by default an empty dictionary), e.g. to carry
+        filter state across batches. `func` returns the transformed rows as
+        a DataFrame, or anything a DataFrame can be made from, e.g. a
+        dictionary of arrays, or None for no rows. They are appended to the
+        data shown, so that the work of an update grows with the new rows
+        only. For example,
+
+            def scaled(rows, state):
+                return rows*2
+            rt.set_batch_callback(scaled)
+
+        shows all of the data multiplied by 2, multiplying each row once.
+
+        The rows read so far are transformed at once as the first batch.
+        When the file is replaced or truncated, or the reader otherwise
+        returns data that are not the previous data with rows appended,
+        the transformed data are dropped and all of the rows are passed
+        again, with the same `state`. `callback` runs after `func`, with
+        the transformed data. Pass None to show the reader's data again.
+        """
+        raw = self.data if (self._batch is None) else self._raw
+        if func is None:
+            self._batch = None
+        else:
+            self._batch = (func, {} if (state is None) else state)
+        if raw is not None:
+            self._set_data(raw)
+
+    @synchronized('lock')
+    def _show_loaded(self, data):
+        PyOscopeStatic._show_loaded(self, data)
+        # The next update does not append to the rows loaded
+        self._raw = None
+
+    def _set_data(self, data, reset=True):
+        if self._batch is None:
+            self.data = data
+            self._raw = None
+            return
+        import pandas as pd
+
+        old = self._raw
+        if (reset or (old is None) or (len(data) < len(old))
+                or (list(data.columns) != list(old.columns))):
+            rows = data
+            previous = None
+        elif len(data) == len(old):  # No new rows
+            self._raw = data
+            return
+        else:
+            rows = data.iloc[len(old):]
+            previous = self.data
+        func, state = self._batch
+        new = func(rows, state)
+        new = pd.DataFrame() if (new is None) else pd.DataFrame(new)
+        self._raw = data
+        if (previous is None) or not len(previous.columns):
+            self.data = new.reset_index(drop=True)
+        elif len(new):
+            self.data = pd.concat([previous, new], ignore_index=True)
+
     @staticmethod
     def _pass():
         pass
 
+    def _export_frame(self, fname, **kwargs):
+        """
+        Render a single frame during a background export.
+
+        Non-interactive plotters have no timer driving `_update`, so the data
+        and plot are updated here before rendering.
+        """
+        if not self.interactive:
+            self._update()
+        return self.render_to_file(fname, **kwargs)
+
+    def serve(self, port=0, host='127.0.0.1', interval=500, maxpoints=2000,
+              maxqueue=8):
+        """
+        Stream the plot to remote viewers in the background.
+
+        Listens for TCP connections on `host` and `port`, by default on a
+        free port of the loopback interface only; pass host='' to accept
+        connections from other machines. Every `interval` milliseconds the
+        window of each line is decimated to at most about `maxpoints` points
+        and only the points that changed are sent to the clients, together
+        with the axis limits. Clients that fall more than `maxqueue` frames
+        behind skip frames. See remote.FrameServer and remote.ScopeClient.
+
+        Returns the (host, port) address that the server listens on.
+        """
+        from remote import FrameServer
+
+        self.stop_serving()
+        self._server = FrameServer(self, host, port, interval, maxpoints,
+                                   maxqueue)
+        self._server.start()
+        return self._server.address
+
+    def stop_serving(self):
+        """
+        Stop streaming started by `serve` and disconnect all viewers.
+        """
+        server = getattr(self, '_server', None)
+        if server is not None:
+            server.stop()
+            self._server = None
+
     @synchronized('lock')
     def _update_plot(self):
         update_backend = {'macosx': self._update_plot_slow,
                           'wxagg': self._update_plot_wxagg}
 
-        update_backend[self._backend]()
+        update_backend.get(self._backend, self._update_plot_slow)()
 
     def _update_plot_slow(self):
         """
         Slowest and most platform-independent update step. Don't expect more
         than a few fps out of this method!
         """
-        oneD = self._plotdict['oneD']
-        xnames = self._plotdict['xnames']
-        ynames = self._plotdict['ynames']
-        xtrans = self._plotdict['xtrans']
-        ytrans = self._plotdict['ytrans']
+        self._update_lines()
+        self.autoscale_axes()
+        self.redraw()
 
-        if not oneD:
-            # xs = [self.data[xname] for xname in xnames]
-            xs = []
-            for xname in xnames:
-                if xname is None:
-                    temp = self.data.columns[0]
-                    toadd = np.array(range(len(self.data[temp])))
-                    xs.append(toadd)
-                else:
-                    xs.append(self.data[xname])
-        else:
-            xs = None
-        # ys = [self.data[yname] for yname in ynames]
-        ys = []
-        for yname in ynames:
-            if yname is None:
-                temp = self.data.columns[0]
-                toadd = np.array(range(len(self.data[temp])))
-                ys.append(toadd)
-            else:
-                ys.append(self.data[yname])
+    @synchronized('lock')
+    def stripchart(self, span=None, sweep=False, gap=None):
+        """
+        Show the current plot as a strip chart.
 
-        if oneD:
-            for j, y in enumerate(ys):
-                ytran = ytrans[j]
-                line = self.lines[0, j]
-                self._update_line_slow(line, y=y, ytrans=ytran)
-        else:
-            for i, x in enumerate(xs):
-                for j, y in enumerate(ys):
-                    xtran = xtrans[i]
-                    ytran = ytrans[j]
-                    line = self.lines[i, j]
-                    self._update_line_slow(line, x, y, xtran, ytran)
+        A strip chart shows a fixed span of the last `span` samples. New
+        samples are shifted in at the right and the x limits move along by
+        the number of new samples, so each update only has to handle the
+        new samples instead of re-slicing the whole window. See StripChart.
 
-        self.autoscale_axes()
-        self.canvas.draw_idle()
+        If `sweep` is True, then new samples instead overwrite the oldest
+        ones from left to right, like a hardware oscilloscope, and the x
+        axis shows the position in the sweep. `gap` is the number of
+        samples blanked ahead of the sweep position.
 
-    def _update_line_slow(self, line, x=None, y=None,
-                          xtrans=None, ytrans=None):
+        The y axis is still autoscaled if enabled, but the x axis is not.
+        `span` of None returns to the normal plot mode, as does making a
+        new plot.
         """
-        Updates specified line with new data.
+        if self.mode not in ('plot', 'strip'):
+            raise ValueError("Nothing is plotted.")
+        if span is None:
+            self._strips = None
+            self.mode = 'plot'
+            return
+        if self._collections:
+            raise ValueError("Strip charts do not support collections.")
+
+        self._strips = {}
+        self._strip_seen = 0
+        for key in np.ndindex(*self.lines.shape):
+            self._strips[key] = StripChart(span, sweep=sweep, gap=gap)
+        self.mode = 'strip'
+        self._update_plot_strip()
+
+    def _update_plot_strip(self):
         """
-        oneD = self._plotdict['oneD']
-        windowsize = self._plotdict['windowsize']
-        if windowsize is None:
-            ws = len(y)
+        Update step for strip-chart mode, see `stripchart`.
+        """
+        spec = self.spec
+        spec.resolve(self.data.columns)
+        start = self._strip_seen
+        if len(self.data) < start:
+            # The file was truncated or replaced, so start over
+            start = 0
+            for sc in self._strips.values():
+                sc.__init__(sc.span, sc.sweep, sc.gap)
+        elif len(self.data) == start:
+            return
+        self._strip_seen = len(self.data)
+
+        ys = [self._column_rows(spec, 'y', j, start)
+              for j in range(len(spec.ynames))]
+        ys = [y if (f is None) else f(y) for y, f in zip(ys, spec.yfuncs)]
+        if spec.oneD:  # Sample numbers, counting dropped rows
+            xs = [np.arange(start, len(self.data)) + self.dropped]
         else:
-            ws = min(len(y), windowsize)
+            xs = [self._column_rows(spec, 'x', i, start)
+                  for i in range(len(spec.xnames))]
+            xs = [x if (f is None) else f(x)
+                  for x, f in zip(xs, spec.xfuncs)]
+
+        xlims = {}
+        for (i, j), sc in self._strips.items():
+            sc.append(xs[i], ys[j])
+            line = self.lines[i, j]
+            line.set_data(sc.xdata(), sc.ydata())
+            ax = line.axes
+            left, right = sc.xlim()
+            if id(ax) in xlims:
+                oldleft, oldright, _ = xlims[id(ax)]
+                left, right = min(left, oldleft), max(right, oldright)
+            xlims[id(ax)] = (left, right, ax)
+        for left, right, ax in xlims.values():
+            if right > left:
+                ax.set_xlim(left, right)
+
+        if self._plotdict['autoscaley']:
+            self.autoscale_axes(xflag=False)
+        self.redraw()
 
-        if xtrans is None:
-            xtrans = lambda x: x
-        if ytrans is None:
-            ytrans = lambda x: x
+    @synchronized('lock')
+    def trigger(self, column=None, level=0., slope='rising', hysteresis=0.,
+                length=500, pretrigger=None, holdoff=0, average=1):
+        """
+        Show the current plot as a triggered display.
 
-        if oneD:
-            newx = range(len(y))
-        else:
-            newx = xtrans(x)
-        newx = newx[-ws:]
-        newy = ytrans(y)[-ws:]
+        Instead of the last samples, each line shows a segment of `length`
+        samples around the latest trigger event, like an oscilloscope,
+        which gives a stable display of periodic signals. The display is
+        only updated when the trigger fires.
 
-        line.set_xdata(newx)
-        line.set_ydata(newy)
+        The trigger watches `column` (a column name or index) for an edge
+        through `level` in the direction `slope` ('rising' or 'falling'),
+        with `hysteresis` and `holdoff` as described in Trigger. Only the
+        newly arrived samples are scanned for trigger events.
+
+        `pretrigger` is the number of samples shown before the trigger
+        event, defaulting to half of `length`. In 1D plots, the x axis
+        shows the sample offset from the trigger event.
+
+        If `average` is greater than 1, then each line shows the average of
+        the last `average` triggered segments, which suppresses noise that
+        is not synchronous with the trigger.
+
+        `column` of None returns to the normal plot mode, as does making a
+        new plot.
+        """
+        if self.mode not in ('plot', 'trigger'):
+            raise ValueError("Nothing is plotted.")
+        if column is None:
+            self._trig = None
+            self.mode = 'plot'
+            return
+        if self._collections:
+            raise ValueError("Triggered displays do not support "
+                             "collections.")
+        if isinstance(column, (int, np.integer)):
+            column = self.data.columns[column]
+        elif column not in self.data.columns:
+            raise ValueError("Trigger column {0} not available.".format(
+                repr(column)))
+        length = int(length)
+        if pretrigger is None:
+            pretrigger = length//2
+        if not (0 <= pretrigger < length):
+            raise ValueError("pretrigger must be in [0, length).")
+
+        self._trig = Trigger(level, slope=slope, hysteresis=hysteresis,
+                             holdoff=holdoff)
+        self._trig_column = column
+        self._trig_pre = pretrigger
+        self._trig_post = length - pretrigger
+        self._trig_average = max(1, int(average))
+        self._trig_pending = []
+        self._trig_sums = {}  # line: (deque of segments, running sum)
+        self.mode = 'trigger'
+        for line in self.lines.flat:
+            line.set_data([], [])
+        if self.spec.oneD:
+            for ax in self.axes.flat:
+                ax.set_xlim(-pretrigger, length - pretrigger - 1)
+        self._update_plot_trigger()
+
+    def _update_plot_trigger(self):
+        """
+        Update step for triggered mode, see `trigger`.
+        """
+        spec = self.spec
+        spec.resolve(self.data.columns)
+        signal = np.asarray(self.data[self._trig_column])
+        if len(signal) < self._trig.scanned:
+            # The file was truncated or replaced, so start over
+            self._trig.reset()
+            self._trig_pending = []
+        self._trig_pending.extend(self._trig.scan(signal))
+
+        # Segments can only be shown once all of their samples have arrived
+        n = len(signal)
+        pre = self._trig_pre
+        post = self._trig_post
+        ready = [t for t in self._trig_pending if t + post <= n]
+        self._trig_pending = [t for t in self._trig_pending if t + post > n]
+        ready = [t for t in ready if t >= pre][-self._trig_average:]
+        if not ready:
+            return
+
+        for t in ready:
+            for (i, j), line in np.ndenumerate(self.lines):
+                y = self._column_rows(spec, 'y', j, t - pre, t + post)
+                if spec.yfuncs[j] is not None:
+                    y = spec.yfuncs[j](y)
+                y = np.asarray(y, dtype=float)
+                segs, total = self._trig_sums.get(line, (deque(), 0.))
+                segs.append(y)
+                total = total + y
+                if len(segs) > self._trig_average:
+                    total = total - segs.popleft()
+                self._trig_sums[line] = (segs, total)
+
+        t = ready[-1]
+        for (i, j), line in np.ndenumerate(self.lines):
+            segs, total = self._trig_sums[line]
+            if spec.oneD:
+                x = np.arange(-pre, post)
+            else:
+                x = self._column_rows(spec, 'x', i, t - pre, t + post)
+                if spec.xfuncs[i] is not None:
+                    x = spec.xfuncs[i](x)
+            line.set_data(x, total/len(segs))
+
+        config = self._plotdict
+        if config['autoscaley']:
+            self.autoscale_axes(xflag=config['autoscalex'] and not spec.oneD)
+        self.redraw()
 
     def _update_plot_wxagg(self):
         self._update_plot_slow() #DELME #FIXME
@@ -0,0 +1,161 @@
+#!/bin/env python
+
+"""
+pyoscope_cli.py
+
+Command-line entry point for pyoscope.
+
+Starts a realtime scope on a data file, either in an interactive
+matplotlib window or headless, periodically rendering frames to an
+image file. Heavy modules are imported only once it is known that they
+are needed, so that the time to the first frame is as short as possible.
+
+Example:
+
+    pyoscope testdata.txt -x second -y first -y third --legend -w 200
+    pyoscope testdata.txt -y first -o scope.png -i 1000
+    pyoscope testdata.txt -y first --profile-startup
+"""
+releasestatus = 'dev'
+
+import sys
+import time
+import json
+import argparse
+
+
+__all__ = ['main']
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='pyoscope',
+        description='Realtime oscilloscope-like plotter of data files.')
+    parser.add_argument('file', help='data file to plot')
+    parser.add_argument('-r', '--reader', default='DefaultReader',
+                        help='name of reader class in readers module '
+                             '(default: DefaultReader)')
+    parser.add_argument('--reader-kwargs', default='{}',
+                        help='JSON object of keyword arguments for reader')
+    parser.add_argument('-x', dest='xs', action='append', default=None,
+                        help='x column name or index (may be repeated)')
+    parser.add_argument('-y', dest='ys', action='append', default=None,
+                        help='y column name or index (may be repeated)')
+    parser.add_argument('--legend', action='store_true',
+                        help='show legends')
+    parser.add_argument('-w', '--windowsize', type=int, default=None,
+                        help='number of samples to show (default: all)')
+    parser.add_argument('-i', '--interval', type=int, default=500,
+                        help='update interval in ms (default: 500)')
+    parser.add_argument('-o', '--output', default=None,
+                        help='run headless, rendering frames to this file '
+                             'instead of opening a window')
+    parser.add_argument('-n', '--frames', type=int, default=None,
+                        help='number of frames to render when headless '
+                             '(default: run until interrupted)')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='report import and first-render timings')
+    return parser.parse_args(argv)
+
+
+def _identifier(ident):
+    """
+    Column identifiers that look like integers are column indices.
+    """
+    try:
+        return int(ident)
+    except ValueError:
+        return ident
+
+
+class _StartupProfile(object):
+    """
+    Records the wall-clock time of each startup stage.
+    """
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.t0 = time.time()
+        self.last = self.t0
+        self.stages = []
+
+    def mark(self, stage):
+        now = time.time()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def report(self, stream=None):
+        if not self.enabled:
+            return
+        if stream is None:
+            stream = sys.stderr
+        stream.write('pyoscope startup profile:\n')
+        for stage, dt in self.stages:
+            stream.write('  {0:<24} {1:8.1f} ms\n'.format(stage, dt*1000.))
+        stream.write('  {0:<24} {1:8.1f} ms\n'.format(
+            'total', (self.last - self.t0)*1000.))
+        loaded = [mod for mod in ('pandas', 'matplotlib.pyplot')
+                  if mod in sys.modules]
+        stream.write('  heavy modules loaded: {0}\n'.format(
+            ', '.join(loaded) or 'none'))
+        stream.flush()
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    profile = _StartupProfile(args.profile_startup)
+    headless = args.output is not None
+
+    if headless:
+        # Never initialise a GUI backend when there is no window to show
+        import matplotlib
+        matplotlib.use('agg')
+    import readers
+    from pyoscope import PyOscopeRealtime
+    profile.mark('import pyoscope')
+
+    reader = getattr(readers, args.reader)
+    reader_kwargs = json.loads(args.reader_kwargs)
+    scope = PyOscopeRealtime(f=args.file, reader=reader,
+                             interactive=not headless,
+                             interval=args.interval, **reader_kwargs)
+    profile.mark('read data')
+
+    xs = None if args.xs is None else [_identifier(x) for x in args.xs]
+    ys = None if args.ys is None else [_identifier(y) for y in args.ys]
+    scope.plot(xs, ys, legend=args.legend, windowsize=args.windowsize)
+    profile.mark('plot')
+
+    if headless:
+        scope.render_to_file(args.output)
+        profile.mark('first frame')
+        profile.report()
+        if args.frames == 1:
+            scope.stop()
+            return 0
+        maxframes = None if args.frames is None else args.frames - 1
+        scope.export_frames(args.output, interval=args.interval,
+                            maxframes=maxframes)
+        try:
+            # Wait in short steps so that Ctrl-C is handled promptly
+            while not scope.wait_export(0.2):
+                pass
+        except KeyboardInterrupt:
+            pass
+        scope.stop()
+        return 0
+
+    import matplotlib.pyplot as plt
+
+    def on_first_draw(event):
+        scope.canvas.mpl_disconnect(cid[0])
+        profile.mark('first frame')
+        profile.report()
+
+    cid = [scope.canvas.mpl_connect('draw_event', on_first_draw)]
+    plt.show()
+    scope.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
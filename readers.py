@@ -16,10 +16,31 @@ Example:
 version = 20130702
 releasestatus = 'beta'
 
+import os
+import io
+import datetime
+import tempfile
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import numpy as np
-import pandas as pd
-from types import StringTypes
+# pandas is slow to import, so it is only imported by the readers that
+# produce DataFrames, when they first produce one.
 from tempfile import _TemporaryFileWrapper
+try:
+    from types import StringTypes
+except ImportError:  # Python 3, for the asyncio front end, see aioscope
+    StringTypes = (str,)
+    file = io.IOBase
+
+
+def _append_rows(data, new):
+    """
+    The DataFrame `data` with the rows of the DataFrame `new` appended.
+    """
+    import pandas as pd
+
+    return pd.concat([data, new], ignore_index=True)
 
 
 class ReaderInterface(object):
@@ -45,6 +66,11 @@ class ReaderInterface(object):
               reader owns, then update_data could update the same
               array, and update_data could return a reference to the
               same array.
+            - Is called from the plot's timer, so it must cope with a file
+              that is being written to: a partially written last record
+              should be left for a later update, and a file that is
+              truncated or replaced should be read again from the start,
+              rather than raising.
         reader.switch_file(f, *args, **kwargs)
             - Switches which file is being read.
         reader.close()
@@ -54,7 +80,26 @@ class ReaderInterface(object):
 
         reader.filename
             - Filename of read file
+
+    Readers that keep the data they returned last as `reader.data` may set
+    the attribute
+
+        reader.appends
+            - True if `update_data` appends the new rows to `reader.data`,
+              so that rows dropped from `reader.data` stay dropped, see
+              memory.MemoryBudget. Defaults to False.
+
+    and those that append should append with the method
+
+        reader.append_rows(data, new)
+            - Returns the DataFrame `data` with the rows of the DataFrame
+              `new` appended, by default a copy of both. May be replaced
+              on the instance, e.g. by memory.MemoryBudget to append to
+              memory-mapped files instead.
     """
+    appends = False
+    append_rows = staticmethod(_append_rows)
+
     def __init__(self, f, *args, **kwargs):
         # Load file
         if isinstance(f, file):
@@ -109,7 +154,816 @@ class ReaderInterface(object):
         return self.init_data(*args, **kwargs)
 
 
-class DefaultReader(object):
+def _replace(src, dst):
+    """
+    Atomically rename `src` to `dst`, overwriting `dst` if it exists.
+    """
+    try:
+        os.replace(src, dst)
+    except AttributeError:
+        # Python 2 has no os.replace. os.rename is atomic on POSIX, but
+        # refuses to overwrite on Windows.
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+_umask = None  # See _get_umask
+_umask_lock = threading.Lock()
+
+
+def _get_umask():
+    """
+    The umask of the process, read once.
+    """
+    global _umask
+    with _umask_lock:
+        if _umask is None:
+            try:
+                with open('/proc/self/status') as f:  # Linux 4.7 and later
+                    for line in f:
+                        if line.startswith('Umask:'):
+                            _umask = int(line.split()[1], 8)
+            except (IOError, OSError, ValueError):
+                pass
+        if _umask is None:
+            # Elsewhere it can only be read by setting it
+            _umask = os.umask(0o022)
+            os.umask(_umask)
+    return _umask
+
+
+def _mkstemp(dirname, prefix, suffix):
+    """
+    Create a new temporary file in `dirname` with tempfile.mkstemp, with
+    the permissions of a file made by `open` (i.e. as set by the umask)
+    rather than readable only by its owner.
+
+    Returns the file descriptor and the name of the file.
+    """
+    fd, name = tempfile.mkstemp(dir=dirname, prefix=prefix, suffix=suffix)
+    try:
+        os.chmod(name, 0o666 & ~_get_umask())
+    except OSError:
+        os.close(fd)
+        os.remove(name)
+        raise
+    return fd, name
+
+
+def _open(f):
+    """
+    Returns a readable file handle for `f`, a file handle or a filename.
+
+    Compressed files are opened as a _DecompressedStream, see _decompressor
+    for the supported formats.
+    """
+    if isinstance(f, file) or isinstance(f, _TemporaryFileWrapper):
+        factory = _decompressor(f.name)
+        if factory is not None:
+            return _DecompressedStream(f.name, factory)
+        mode = f.mode
+        if ('r' in mode) or ('+' in mode):
+            return f
+        return open(f.name, 'rb')
+    elif isinstance(f, StringTypes):
+        factory = _decompressor(f)
+        if factory is not None:
+            return _DecompressedStream(f, factory)
+        return open(f, 'rb')
+    raise TypeError('f must be a file handle or filename.')
+
+
+def _line_end(f, start, end, blocksize=2**16):
+    """
+    Returns the offset just past the last line break in the byte range
+    [`start`, `end`) of `f`, or `start` if there is none.
+
+    Everything up to the returned offset consists of complete lines; the
+    rest is a line that the writer has not finished yet. The range is
+    searched backwards, so normally only the last block is read.
+    """
+    pos = end
+    while pos > start:
+        n = min(blocksize, pos - start)
+        f.seek(pos - n)
+        i = f.read(n).rfind(b'\n')
+        if i >= 0:
+            return pos - n + i + 1
+        pos -= n
+    return start
+
+
+class _BoundedFile(object):
+    """
+    Read-only view of `f` that ends at the offset `end`, so that a parser
+    never sees a partially written last line.
+    """
+    def __init__(self, f, end):
+        self.f = f
+        self.remaining = end - f.tell()
+
+    def read(self, size=-1):
+        if (size is None) or (size < 0) or (size > self.remaining):
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if (size is None) or (size < 0) or (size > self.remaining):
+            size = self.remaining
+        data = self.f.readline(size)
+        self.remaining -= len(data)
+        return data
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+def _pread(f, offset, n):
+    """
+    Read `n` bytes at `offset` of the file open as `f`, without moving its
+    file position.
+
+    Bypasses the buffer of `f`, which may still hold data that has since
+    been overwritten: seeking within the buffer does not refill it.
+    """
+    fd = f.fileno()
+    try:
+        return os.pread(fd, n, offset)
+    except AttributeError:  # Python 2
+        pos = os.lseek(fd, 0, os.SEEK_CUR)
+        try:
+            os.lseek(fd, offset, os.SEEK_SET)
+            return os.read(fd, n)
+        finally:
+            os.lseek(fd, pos, os.SEEK_SET)
+
+
+class _FileState(object):
+    """
+    Tracks how much of a growing file has been read, to tell appended data
+    from a file that was truncated or replaced since it was last read.
+
+    `offset` is the end of the data read so far. A short `tail` of the
+    bytes before it is remembered, so that a file that was truncated and
+    rewritten past `offset` between two updates is caught as well.
+    """
+    tailsize = 64
+
+    def __init__(self, f, offset=0):
+        self.mark(f, offset)
+
+    def mark(self, f, offset):
+        """
+        Record that `f` has been read up to `offset`.
+        """
+        self.offset = offset
+        start = max(offset - self.tailsize, 0)
+        self.tail = _pread(f, start, offset - start)
+        st = os.fstat(f.fileno())
+        self.ident = (st.st_dev, st.st_ino)
+
+    def check(self, f, filename):
+        """
+        Compare the file `filename` with the state of its open handle `f`.
+
+        Returns 'missing' if `filename` does not exist (e.g. while it is
+        being replaced), 'replaced' if it is no longer the file open as
+        `f`, 'truncated' if the data read so far has been truncated or
+        rewritten, or else the current size of the file.
+        """
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return 'missing'
+        if (st.st_dev, st.st_ino) != self.ident:
+            return 'replaced'
+        size = os.fstat(f.fileno()).st_size
+        if size < self.offset:
+            return 'truncated'
+        if _pread(f, self.offset - len(self.tail),
+                  len(self.tail)) != self.tail:
+            return 'truncated'
+        return size
+
+
+def _decompressor(filename):
+    """
+    Returns a function that makes decompressor objects for the compressed
+    file `filename`, chosen by its extension, or None if the file is not
+    compressed.
+
+    The decompressors for .xz and .zst files need the lzma module
+    (backports.lzma on Python 2) and the zstandard package.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.gz':
+        import zlib
+        return lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif ext == '.bz2':
+        import bz2
+        return bz2.BZ2Decompressor
+    elif ext in ('.xz', '.lzma'):
+        try:
+            import lzma
+        except ImportError:
+            try:
+                from backports import lzma
+            except ImportError:
+                raise ImportError('Reading {0} files requires the lzma '
+                                  'module.'.format(ext))
+        return lzma.LZMADecompressor
+    elif ext in ('.zst', '.zstd'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('Reading {0} files requires the zstandard '
+                              'package.'.format(ext))
+        return lambda: zstandard.ZstdDecompressor().decompressobj()
+    return None
+
+
+class _DecompressedStream(object):
+    """
+    Read-only file-like object of the decompressed contents of the
+    compressed file `filename`. `factory` makes decompressor objects, see
+    _decompressor.
+
+    The file is decompressed incrementally, `blocksize` compressed bytes at
+    a time, so it is never decompressed in full, neither in memory nor on
+    disk. Only complete lines are returned: reading stops at the last line
+    break decompressed so far, and the rest is returned by a later read,
+    once more has been written. Concatenated compressed streams (e.g. gzip
+    members appended by a writer) are read one after another, so a file
+    that is appended to is read from where the previous read stopped.
+    Anything else, e.g. a file that is rewritten as a whole, is detected by
+    `check` and must be read again from the start.
+    """
+    blocksize = 2**20
+
+    def __init__(self, filename, factory):
+        self.name = filename
+        self.mode = 'rb'
+        self._factory = factory
+        self.raw = io.open(filename, 'rb')
+        self.rewind()
+
+    @property
+    def closed(self):
+        return self.raw.closed
+
+    def close(self):
+        self.raw.close()
+
+    def rewind(self):
+        """
+        Start decompressing from the beginning of the file.
+        """
+        self.raw.seek(0)
+        self.state = _FileState(self.raw, 0)
+        self._decompressor = self._factory()
+        self._nstreams = 0  # Streams completed so far
+        self._buf = b''
+        self._pos = 0  # Read position in _buf
+        self._end = 0  # End of the complete lines in _buf
+
+    def seek(self, offset, whence=0):
+        if (offset, whence) != (0, 0):
+            raise IOError('Compressed files can only be rewound.')
+        self.rewind()
+
+    def check(self):
+        """
+        Returns the state of the compressed file, see _FileState.check.
+        """
+        return self.state.check(self.raw, self.name)
+
+    def _decompress(self, data):
+        out = []
+        fresh = False  # Whether the decompressor was just replaced
+        while data:
+            d = self._decompressor
+            try:
+                out.append(d.decompress(data))
+                rest = getattr(d, 'unused_data', b'')
+            except EOFError:  # Data after the end of a bz2 stream
+                rest = data
+            except Exception:
+                if not self._nstreams:
+                    raise IOError('{0} is not a valid compressed '
+                                  'file.'.format(self.name))
+                # Trailing garbage after complete streams is ignored, like
+                # gzip does
+                break
+            if fresh and (len(rest) == len(data)):
+                break  # Nothing consumed by a new stream
+            fresh = False
+            if rest or getattr(d, 'eof', False):
+                # End of a stream; the rest starts the next one
+                self._decompressor = self._factory()
+                self._nstreams += 1
+                fresh = True
+            data = rest
+        return b''.join(out)
+
+    def _more(self):
+        """
+        Decompress another block. Returns False at the end of the file.
+        """
+        block = self.raw.read(self.blocksize)
+        if not block:
+            return False
+        self._buf = self._buf[self._pos:] + self._decompress(block)
+        self._pos = 0
+        self._end = self._buf.rfind(b'\n') + 1
+        self.state.mark(self.raw, self.raw.tell())
+        return True
+
+    def read(self, size=-1):
+        if (size is None) or (size < 0):
+            size = float('inf')
+        chunks = []
+        n = 0
+        while n < size:
+            take = min(self._end - self._pos, size - n)
+            if take > 0:
+                chunks.append(self._buf[self._pos:self._pos + take])
+                self._pos += take
+                n += take
+            elif not self._more():
+                break
+        return b''.join(chunks)
+
+    def readline(self, size=-1):
+        while True:
+            i = self._buf.find(b'\n', self._pos, self._end)
+            if i >= 0:
+                line = self._buf[self._pos:i + 1]
+                self._pos = i + 1
+                return line
+            if not self._more():
+                return b''
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+class _GrowingFile(object):
+    """
+    Mixin for readers of files that are being written to. Keeps track of
+    how far the file `self.f` has been read: in `self.state` for plain
+    files, while a _DecompressedStream tracks itself.
+    """
+    def _check(self):
+        """
+        Returns the state of the file, see _FileState.check.
+        """
+        if isinstance(self.f, _DecompressedStream):
+            return self.f.check()
+        return self.state.check(self.f, self.filename)
+
+    def _rewind(self):
+        """
+        Start reading from the beginning of the file.
+        """
+        if isinstance(self.f, _DecompressedStream):
+            self.f.rewind()
+        else:
+            self.state = _FileState(self.f, 0)
+
+    def _reopen(self):
+        """
+        Reopen the file, e.g. after it was replaced. Also drops stale
+        buffered data.
+        """
+        self.f.close()
+        self.f = _open(self.filename)
+
+    def _read_new(self, size=None):
+        """
+        Returns the complete lines written since the last read, and marks
+        them as read. `size` is the current size of a plain file.
+        """
+        if isinstance(self.f, _DecompressedStream):
+            return self.f.read()
+        if size is None:
+            size = os.fstat(self.f.fileno()).st_size
+        start = self.state.offset
+        end = _line_end(self.f, start, size)
+        self.f.seek(start)
+        block = self.f.read(end - start)
+        self.state.mark(self.f, end)
+        return block
+
+
+# read_csv arguments that prevent splitting a file into independently parsed
+# blocks of lines
+_unsplittable = ('nrows', 'skipfooter', 'skip_footer', 'chunksize',
+                 'iterator', 'index_col', 'usecols')
+
+
+def _split_offsets(f, start, end, nblocks):
+    """
+    Split the byte range [`start`, `end`) of the binary file `f` into about
+    `nblocks` blocks that begin at the start of a line.
+
+    Returns the list of block boundary offsets, including `start` and
+    `end`.
+    """
+    offsets = [start]
+    for k in range(1, nblocks):
+        pos = start + (end - start)*k//nblocks
+        if pos <= offsets[-1]:
+            continue
+        f.seek(pos - 1)
+        f.readline()  # Move to the start of the next line
+        pos = f.tell()
+        if pos >= end:
+            break
+        if pos > offsets[-1]:
+            offsets.append(pos)
+    offsets.append(end)
+    return offsets
+
+
+def _read_block(args):
+    filename, start, end, kwargs = args
+    import pandas as pd
+
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        block = f.read(end - start)
+    return pd.read_csv(io.BytesIO(block), **kwargs)
+
+
+def read_csv_parallel(filename, workers=None, minblocksize=4*2**20,
+                      nbytes=None, **kwargs):
+    """
+    Read the CSV file `filename` with pandas.read_csv, in parallel.
+
+    The file is split on line boundaries into byte ranges that are parsed
+    concurrently by a pool of `workers` threads (defaulting to the number
+    of CPUs) and then concatenated. pandas's C parser releases the GIL
+    while parsing, so threads parse in parallel without having to copy
+    the results between processes. Blocks are at least `minblocksize`
+    bytes, so small files are read by a single thread.
+
+    The remaining arguments are passed to read_csv. The header and any
+    initial rows skipped with an integer `skiprows` are handled by the
+    first block; the other blocks reuse its column names. Arguments that
+    need the whole file at once (e.g. `nrows`, `skipfooter`, `index_col`
+    or `usecols`) cause the file to be read serially. Quoted fields must
+    not contain line breaks.
+
+    Note that read_csv's default of inferring the header is used here; set
+    `header` explicitly if the file has none.
+
+    If `nbytes` is not None, only the first `nbytes` bytes of the file are
+    read, e.g. to leave out a partially written last line.
+    """
+    import pandas as pd
+
+    header = kwargs.get('header', 'infer')
+    skiprows = kwargs.get('skiprows', None)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    size = os.path.getsize(filename)
+    if nbytes is not None:
+        size = min(size, nbytes)
+    nblocks = min(workers, size//max(minblocksize, 1))
+    splittable = (not any(kwargs.get(k) for k in _unsplittable)
+                  and ((skiprows is None) or isinstance(skiprows, int))
+                  and ((header is None) or (header == 'infer')
+                       or isinstance(header, int)))
+    if (nblocks < 2) or not splittable:
+        with open(filename, 'rb') as f:
+            return pd.read_csv(_BoundedFile(f, size), **kwargs)
+
+    # The first block must contain the header and the skipped rows
+    if header is None:
+        nheader = 0
+    elif header == 'infer':
+        nheader = 0 if ('names' in kwargs) else 1
+    else:
+        nheader = header + 1
+    nheader += skiprows or 0
+    with open(filename, 'rb') as f:
+        for i in range(nheader):
+            f.readline()
+        offsets = _split_offsets(f, f.tell(), size, nblocks)
+    offsets[0] = 0
+
+    first = pd.read_csv(filename, nrows=0, **kwargs)
+    blockkwargs = dict(kwargs)
+    blockkwargs.update(header=None, names=list(first.columns),
+                       skiprows=None)
+    jobs = [(filename, offsets[0], offsets[1], kwargs)]
+    jobs += [(filename, start, end, blockkwargs)
+             for start, end in zip(offsets[1:-1], offsets[2:])]
+
+    pool = ThreadPool(min(workers, len(jobs)))
+    try:
+        blocks = pool.map(_read_block, jobs)
+    finally:
+        pool.close()
+        pool.join()
+    # A block may infer other types than the whole file would, e.g. where
+    # the first block has a text line (read as data with header=None) and
+    # the others only numbers. Integers that are floats in another block
+    # are upcast by concat, like read_csv does; anything else is read again
+    # serially.
+    for name in first.columns:
+        kinds = set(block[name].dtype.kind for block in blocks)
+        if (len(kinds) > 1) and not kinds <= set('iuf'):
+            with open(filename, 'rb') as f:
+                return pd.read_csv(_BoundedFile(f, size), **kwargs)
+    return pd.concat(blocks, ignore_index=True)
+
+
+def _time_key(value):
+    """
+    Convert a time to a float for LineIndex: numbers are used as they
+    are, anything else is parsed as a datetime and converted to seconds
+    since the epoch.
+    """
+    if isinstance(value, StringTypes):
+        try:
+            return float(value)
+        except ValueError:
+            value = value.strip().strip('"\'')
+    elif not isinstance(value, (np.datetime64, datetime.datetime)):
+        return float(value)
+    return np.datetime64(value, 'ns').astype(np.int64)/1e9
+
+
+def _time_keys(values):
+    """
+    Vectorized `_time_key` for an array or Series of times.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[ns]').astype(np.int64)/1e9
+    if values.dtype.kind in 'iuf':
+        return values.astype(float)
+    return np.array([_time_key(v) for v in values], dtype=float)
+
+
+class LineIndex(object):
+    """
+    Sparse index of the byte offsets of the rows of a text data file.
+
+    Records the offset of every `step`th row, so that a range of rows of a
+    huge file can be read by seeking to just before it and parsing only
+    that part, instead of everything before it. Rows are the lines after
+    the first `skip` (header) lines.
+
+    If `timefield` is not None, the index also records the time of the
+    indexed rows, i.e. field `timefield` of the line split by `sep` (None
+    splits on whitespace), so that a range of times can be found by binary
+    search. Times must be increasing. They are numbers, or datetimes that
+    are stored as seconds since the epoch. Quoted fields that contain
+    `sep` are not supported.
+
+    The index is built by scanning the file in large blocks, is extended
+    by `update` as the file grows and is saved next to the file (at
+    `filename` + LineIndex.suffix), so that it is only built once. A saved
+    index that does not match the file, e.g. because it was rewritten, is
+    rebuilt. `path` overrides where the index is saved; if it cannot be
+    written the index is kept in memory only.
+
+    See DefaultReader.read_rows and DefaultReader.read_times.
+    """
+    suffix = '.pyoscope-index.npz'
+    blocksize = 2**24
+    tailsize = 64
+
+    def __init__(self, filename, step=1000, skip=0, timefield=None,
+                 sep=',', path=None):
+        self.filename = filename
+        self.step = int(step)
+        self.skip = int(skip)
+        self.timefield = timefield
+        if (sep is not None) and not isinstance(sep, bytes):
+            sep = sep.encode('ascii')  # Lines are split as bytes
+        self.sep = sep
+        self.path = (filename + self.suffix) if (path is None) else path
+        self._dirty = False
+        if not self.load():
+            self.reset()
+        self.update()
+
+    @property
+    def _params(self):
+        return np.array([self.step, self.skip,
+                         -1 if self.timefield is None else self.timefield])
+
+    def reset(self):
+        """
+        Forget the indexed rows, so that the file is indexed from the start.
+        """
+        self.size = None  # Bytes indexed so far; None until past the header
+        self.nrows = 0  # Rows in the indexed bytes
+        self.offsets = np.empty(0, dtype=np.int64)
+        self.times = np.empty(0)
+        self.tail = b''
+        self._dirty = True
+
+    def load(self):
+        """
+        Load the saved index. Returns False if there is none, or if it does
+        not match the file or the indexing parameters.
+        """
+        try:
+            with np.load(self.path) as saved:
+                params = saved['params']
+                size, nrows = (int(v) for v in saved['state'])
+                offsets = saved['offsets']
+                times = saved['times']
+                tail = saved['tail'].tobytes()
+                sep = saved['sep'].tobytes() or None
+        except (IOError, OSError, KeyError, ValueError):
+            return False
+        if (not np.array_equal(params, self._params)) or (sep != self.sep):
+            return False
+        with open(self.filename, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < size:
+                return False
+            f.seek(size - len(tail))
+            if f.read(len(tail)) != tail:
+                return False
+        self.size = size
+        self.nrows = nrows
+        self.offsets = offsets
+        self.times = times
+        self.tail = tail
+        self._dirty = False
+        return True
+
+    def save(self):
+        """
+        Save the index next to the file. Does nothing if it is up to date
+        or cannot be written.
+        """
+        if (not self._dirty) or (self.size is None):
+            return
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmpname = _mkstemp(dirname, 'tmp', '.npz')
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, params=self._params,
+                         state=np.array([self.size, self.nrows]),
+                         offsets=self.offsets, times=self.times,
+                         tail=np.array(bytearray(self.tail), np.uint8),
+                         sep=np.array(bytearray(self.sep or b''), np.uint8))
+            _replace(tmpname, self.path)
+        except (IOError, OSError):
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+            return
+        self._dirty = False
+
+    def update(self):
+        """
+        Index the complete rows appended to the file since the last update,
+        and save the index if it changed. Starts over if the file was
+        truncated or rewritten.
+        """
+        with open(self.filename, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if self.size is not None:
+                f.seek(max(self.size - len(self.tail), 0))
+                if (size < self.size) or (f.read(len(self.tail)) !=
+                                          self.tail):
+                    self.reset()
+            if self.size is None:
+                f.seek(0)
+                for i in range(self.skip):
+                    line = f.readline()
+                    if not line.endswith(b'\n'):  # Header not complete yet
+                        return
+                self.size = f.tell()
+            end = _line_end(f, self.size, size)
+            if end > self.size:
+                self._scan(f, end)
+        self.save()
+
+    def _scan(self, f, end):
+        """
+        Index the rows of `f` between the end of the index and `end`, which
+        must be at the end of a line.
+        """
+        offsets = [self.offsets]
+        times = [self.times]
+        pos = self.size
+        f.seek(pos)
+        while pos < end:
+            block = f.read(min(self.blocksize, end - pos))
+            ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) ==
+                                  ord('\n'))
+            while not len(ends):  # Line longer than a block
+                block += f.readline()
+                ends = np.array([len(block) - 1])
+            block = block[:ends[-1] + 1]
+            f.seek(pos + len(block))
+
+            # Start of each line in the block, and the rows to index
+            starts = np.empty(len(ends), dtype=np.int64)
+            starts[0] = 0
+            starts[1:] = ends[:-1] + 1
+            first = (-self.nrows) % self.step
+            keep = starts[first::self.step]
+            offsets.append(keep + pos)
+            if self.timefield is not None:
+                times.append(np.array(
+                    [_time_key(self._field(block[s:block.index(b'\n', s)]))
+                     for s in keep]))
+            self.nrows += len(ends)
+            pos += len(block)
+        self.offsets = np.concatenate(offsets).astype(np.int64)
+        self.times = np.concatenate(times)
+        self.size = pos
+        start = max(pos - self.tailsize, 0)
+        f.seek(start)
+        self.tail = f.read(pos - start)
+        self._dirty = True
+
+    def _field(self, line):
+        """
+        The time field of the bytes `line`, as a string.
+        """
+        field = line.split(self.sep)[self.timefield]
+        if not isinstance(field, StringTypes):  # Python 3
+            field = field.decode('utf-8', 'replace')
+        return field
+
+    def row_range(self, start, stop):
+        """
+        Byte range that contains the rows `start` up to `stop`.
+
+        Returns (offset, row, end), where `offset` is the start of the
+        indexed row `row` <= `start`, and `end` is the end of row `stop` or
+        later.
+        """
+        start = min(max(start, 0), self.nrows)
+        k = start//self.step
+        if k >= len(self.offsets):
+            return self.size, self.nrows, self.size
+        kstop = -(-stop//self.step)  # Indexed row at or after `stop`
+        end = self.offsets[kstop] if (kstop < len(self.offsets)) \
+            else self.size
+        return int(self.offsets[k]), k*self.step, int(end)
+
+    def time_range(self, t0, t1):
+        """
+        Byte range that contains the rows with times from `t0` to `t1`.
+
+        Returns (offset, row, end) as `row_range`.
+        """
+        if self.timefield is None:
+            raise ValueError("The index has no times.")
+        k0 = max(np.searchsorted(self.times, _time_key(t0), 'right') - 1, 0)
+        k1 = np.searchsorted(self.times, _time_key(t1), 'right')
+        return self.row_range(k0*self.step, k1*self.step)
+
+
+def _conform(new, dtypes):
+    """
+    Cast the columns of the DataFrame `new`, rows appended to a file, to
+    `dtypes`, the dtypes of the rows read before them.
+
+    Numeric columns stay numeric: values that do not parse become NaN
+    rather than turning the whole column into strings.
+    """
+    import pandas as pd
+
+    for name, dtype in dtypes.items():
+        col = new[name]
+        if col.dtype == dtype:
+            continue
+        try:
+            if dtype.kind in 'iuf':
+                col = pd.to_numeric(col, errors='coerce')
+                # Integer columns that gained NaNs or fractions are upcast
+                # to float when appended, rather than truncated here
+                if (dtype.kind == 'f') or (col.dtype.kind in 'iu'):
+                    col = col.astype(dtype)
+            else:
+                col = col.astype(dtype)
+        except (TypeError, ValueError):
+            continue
+        new[name] = col
+
+
+class DefaultReader(_GrowingFile):
     """
     Default reader for pyoscope. Essentially a wrapper around pandas's
     read_csv. Note that read_csv is a little funky. Check its documentation
@@ -117,26 +971,49 @@ class DefaultReader(object):
 
     Note: Sets header=None by default, unless overridden.
 
+    The initial read of large files may be parsed in parallel by passing
+    `workers` (the number of threads, or 0 for the number of CPUs), see
+    read_csv_parallel.
+
+    Files that are being written to are read incrementally: `update_data`
+    parses only the lines appended since the previous read and keeps the
+    dtypes of the columns read so far. A partially written last line is
+    left for a later update, once it is complete. If the file is truncated
+    or replaced (e.g. by log rotation), it is read again from the start.
+    Positional arguments, and the read_csv arguments that need the whole
+    file at once (see read_csv_parallel), make each update re-read the
+    whole file instead.
+
+    Compressed files (.gz, .bz2, .xz and .zst) are decompressed on the fly
+    while they are parsed, see _decompressor. Appended gzip members and
+    other concatenated streams are read incrementally too.
+
+    Ranges of rows or times of files too large to read in full are read
+    with `read_rows` and `read_times`, which seek close to the range with
+    a sparse index of the file (see `index` and LineIndex). Read just the
+    start of such a file initially, e.g. by passing `nrows`.
+
     See ReaderInterface for info on readers.
     """
     def __init__(self, f, *args, **kwargs):
         # Load file
-        if isinstance(f, file) or isinstance(f, _TemporaryFileWrapper):
-            mode = self.f.mode
-            if ('r' in mode) or ('+' in mode):
-                self.f = f
-            else:
-                self.f = open(f.name, 'r')
-        elif isinstance(f, StringTypes):
-            self.f = open(f, 'r')
-        else:
-            raise TypeError('f must be a file handle or filename.')
+        self.f = _open(f)
         self.f.seek(0)
         self.filename = self.f.name
+        self.data = None
+        self._index = None
 
     def close(self):
         self.f.close()
 
+    @property
+    def appends(self):
+        # Otherwise each update reads the whole file again
+        return not (self.args
+                    or any(self.kwargs.get(k) for k in _unsplittable))
+
+    append_rows = staticmethod(_append_rows)  # See ReaderInterface
+
     def init_data(self, *args, **kwargs):
         if self.f.closed:
             raise ValueError('I/O operation on closed file.')
@@ -144,43 +1021,240 @@ class DefaultReader(object):
         self.kwargs = kwargs
         if 'header' not in kwargs:
             kwargs.update(header=None)
-        self.f.seek(0)
-        data = pd.read_csv(self.f, *args, **kwargs)
-        # data = np.loadtxt(self.f, *args, **kwargs)
+        import pandas as pd
+
+        kwargs = dict(kwargs)
+        workers = kwargs.pop('workers', None)
+
+        # Leave out a partially written last line, which would be parsed as
+        # a row of NaNs or turn its columns into strings
+        compressed = isinstance(self.f, _DecompressedStream)
+        if compressed:
+            self.f.rewind()  # Only returns complete lines
+        else:
+            size = os.fstat(self.f.fileno()).st_size
+            end = _line_end(self.f, 0, size)
+            self.state = _FileState(self.f, end)
+        try:
+            if compressed:
+                data = pd.read_csv(self.f, *args, **kwargs)
+            elif end == 0:
+                data = pd.DataFrame()
+            elif (workers is not None) and (workers != 1) and not args:
+                data = read_csv_parallel(self.filename,
+                                         workers=workers or None,
+                                         nbytes=end, **kwargs)
+            else:
+                self.f.seek(0)
+                data = pd.read_csv(_BoundedFile(self.f, end), *args,
+                                   **kwargs)
+                # data = np.loadtxt(self.f, *args, **kwargs)
+        except pd.errors.EmptyDataError:  # Only blank lines so far
+            data = pd.DataFrame()
+        self.data = data
         return data
 
     def update_data(self):
         args = self.args
         kwargs = self.kwargs
-        return self.init_data(*args, **kwargs)
+        state = self._check()
+        if state == 'missing':  # Being replaced; keep the old data for now
+            return self.data
+        elif state in ('replaced', 'truncated'):
+            # Reopen, so that no stale buffered data is read
+            self._reopen()
+            return self.init_data(*args, **kwargs)
+
+        block = self._read_new(state)
+        if not block:
+            return self.data
+        if (args or any(kwargs.get(k) for k in _unsplittable)
+                or not len(self.data.columns)):
+            return self.init_data(*args, **kwargs)
+
+        import pandas as pd
+
+        kwargs = dict(kwargs)
+        kwargs.pop('workers', None)
+        # Fields beyond the known columns (e.g. from a garbled line) are
+        # dropped rather than inferred to be an index
+        columns = list(self.data.columns)
+        kwargs.update(header=None, names=columns, skiprows=None,
+                      usecols=list(range(len(columns))))
+        if len(self.data) and ('dtype' not in kwargs):
+            # Keep string columns strings even if the new values look like
+            # numbers
+            kwargs['dtype'] = {name: object for name, dtype
+                               in self.data.dtypes.items()
+                               if dtype.kind == 'O'}
+        try:
+            new = pd.read_csv(io.BytesIO(block), **kwargs)
+        except ValueError:  # Unparsable lines; skip them, not the file
+            new = None
+        if (new is None) or not len(new):
+            return self.data
+
+        if len(self.data):
+            _conform(new, self.data.dtypes)
+            new = self.append_rows(self.data, new)
+        self.data = new
+        return self.data
 
     def switch_file(self, f, *args, **kwargs):
+        if f is not self.f:
+            self.close()
         self.__init__(f)
         return self.init_data(*args, **kwargs)
 
+    def index(self, step=None, timecolumn=None, path=None):
+        """
+        Returns the sparse LineIndex of the file, which is built, or
+        loaded from next to the file, when first used.
+
+        Every `step`th row is indexed (default 1000, or as before).
+        `timecolumn`, if not None, is the name of a column of increasing
+        times that is indexed too, for `read_times`. `path` is where the
+        index is saved, see LineIndex. Changing any of these rebuilds the
+        index.
+
+        The index is extended to any rows appended since it was last used.
+        Compressed files cannot be indexed.
+        """
+        if isinstance(self.f, _DecompressedStream):
+            raise ValueError("Compressed files cannot be indexed.")
+        old = self._index
+        if step is None:
+            step = 1000 if (old is None) else old.step
+        timefield = None
+        if timecolumn is not None:
+            timefield = list(self.data.columns).index(timecolumn)
+        elif old is not None:
+            timefield = old.timefield
+
+        kwargs = self.kwargs
+        header = kwargs.get('header', 'infer')
+        if header is None:
+            skip = 0
+        elif header == 'infer':
+            skip = 0 if ('names' in kwargs) else 1
+        else:
+            skip = header + 1
+        skiprows = kwargs.get('skiprows', None)
+        if skiprows is not None:
+            if not isinstance(skiprows, int):
+                raise ValueError("Files with rows skipped by skiprows {0} "
+                                 "cannot be indexed.".format(skiprows))
+            skip += skiprows
+        sep = kwargs.get('sep', kwargs.get('delimiter', ','))
+        if kwargs.get('delim_whitespace') or (sep in (r'\s+', ' ')):
+            sep = None
+        elif not isinstance(sep, bytes):
+            sep = sep.encode('ascii')  # As stored by LineIndex
 
-class HexReader(object):
+        if ((old is None) or (old.step != step) or (old.skip != skip) or
+                (old.timefield != timefield) or (old.sep != sep) or
+                ((path is not None) and (old.path != path))):
+            self._index = LineIndex(self.filename, step, skip, timefield,
+                                    sep, path)
+        else:
+            self._index.update()
+        return self._index
+
+    def _read_range(self, offset, end):
+        """
+        Parse the rows in the byte range [`offset`, `end`) of the file, with
+        the columns of the data read so far.
+        """
+        import pandas as pd
+
+        columns = list(self.data.columns)
+        kwargs = dict(self.kwargs)
+        for key in ('workers', 'nrows', 'index_col'):
+            kwargs.pop(key, None)
+        kwargs.update(header=None, names=columns, skiprows=None,
+                      usecols=list(range(len(columns))))
+        if end <= offset:
+            return self.data.iloc[:0]
+        self.f.seek(offset)
+        return pd.read_csv(_BoundedFile(self.f, end), **kwargs)
+
+    def read_rows(self, start=None, stop=None):
+        """
+        Read the rows `start` up to `stop` of the file, without parsing the
+        rows before them, using the sparse index of the file (see `index`).
+
+        Rows count from 0 after the header. Returns a DataFrame with the
+        same columns as the data read by `init_data`. Does not change the
+        data returned by `update_data`.
+        """
+        index = self.index()
+        start = 0 if (start is None) else start
+        stop = index.nrows if (stop is None) else stop
+        offset, row, end = index.row_range(start, stop)
+        data = self._read_range(offset, end)
+        data = data.iloc[max(start - row, 0):max(stop - row, 0)]
+        return data.reset_index(drop=True)
+
+    def read_times(self, t0=None, t1=None, timecolumn=None):
+        """
+        Read the rows of the file with times from `t0` to `t1` (inclusive)
+        in the column `timecolumn`, without parsing the rows before them,
+        using the sparse index of the file (see `index`).
+
+        `timecolumn` defaults to the column indexed before. Times are
+        numbers or datetimes, e.g. '2013-07-17T12:00'. None reads from the
+        start or up to the end. Returns a DataFrame with the same columns
+        as the data read by `init_data`.
+        """
+        index = self.index(timecolumn=timecolumn)
+        if index.timefield is None:
+            raise ValueError("No time column specified.")
+        column = self.data.columns[index.timefield]
+        lo = index.times[0] if (t0 is None) and len(index.times) else t0
+        hi = index.times[-1] if (t1 is None) and len(index.times) else t1
+        if (lo is None) or (hi is None):  # Nothing indexed yet
+            return self.data.iloc[:0]
+        offset, row, end = index.time_range(lo, hi)
+        if t1 is None:
+            end = index.size
+        data = self._read_range(offset, end)
+
+        keys = _time_keys(data[column])
+        first = 0 if (t0 is None) else np.searchsorted(keys, _time_key(t0))
+        last = len(keys) if (t1 is None) else \
+            np.searchsorted(keys, _time_key(t1), 'right')
+        return data.iloc[first:last].reset_index(drop=True)
+
+
+class HexReader(_GrowingFile):
     """
     Reader for ASCII-Hex encoded data files.
 
+    Like DefaultReader, reads compressed files, reads files that are being
+    written to incrementally, leaves a partially written last line for a
+    later update, and starts over if the file is truncated or replaced.
+    Lines that cannot be parsed, or that have the wrong number of values,
+    are skipped.
+
     See ReaderInterface for info on readers.
     """
+    appends = True
+    append_rows = staticmethod(_append_rows)  # See ReaderInterface
+
     def __init__(self, f, header=True, *args, **kwargs):
         # Load file
-        if isinstance(f, file) or isinstance(f, _TemporaryFileWrapper):
-            mode = f.mode
-            if ('r' in mode) or ('+' in mode):
-                self.f = f
-            else:
-                self.f = open(f.name, 'r')
-        elif isinstance(f, StringTypes):
-            self.f = open(f, 'r')
-        else:
-            raise TypeError('f must be a file handle or filename.')
+        self.f = _open(f)
         self.f.seek(0)
         self.filename = self.f.name
+        self.useheader = header
+        self.data = None
+        self._init_header()
 
-        if header:
+    def _init_header(self):
+        """
+        Read the header and find the number of columns.
+        """
+        if self.useheader:
             self.header = self._read_header()
             if 'columns' in self.header:
                 cols = self.header['columns']
@@ -193,16 +1267,19 @@ class HexReader(object):
         else:
             self.header = {}
 
-        # Read first non-comment line
-        line = '#'
-        while line.startswith('#'):
-            line = self.f.readline()
-
+        # Count the values in the first complete non-comment line. If there
+        # is none yet, the first line read by `update_data` is used.
+        self.numcols = 0
         if 'columns' in self.header:
             self.numcols = len(self.header['columns'])
         else:
-            self.numcols = len(line.split())
-        self._cdict = {i: self._cfunc for i in range(self.numcols)}
+            for line in iter(self.f.readline, ''):
+                if line.startswith('#') or not line.strip():
+                    continue
+                if line.endswith('\n'):
+                    self.numcols = len(line.split())
+                break
+        self.f.seek(0)
 
     @staticmethod
     def _cfunc(val):
@@ -290,27 +1367,42 @@ class HexReader(object):
             raise ValueError('I/O operation on closed file.')
         self.args = args
         self.kwargs = kwargs
+        self._rewind()
+        self.data = self._frame(self._parse(self._read_new()))
+        return self.data
+
+    def _parse(self, block):
+        """
+        Parse the lines in `block`.
+
+        Returns a list of rows, each a list of floats.
+        """
+        rows = []
+        for line in block.splitlines():
+            if line.startswith('#'):
+                continue
+            vals = line.split()
+            if not vals:
+                continue
+            if not self.numcols:
+                self.numcols = len(vals)
+            if len(vals) != self.numcols:
+                continue
+            try:
+                rows.append([self._cfunc(val) for val in vals])
+            except ValueError:
+                continue
+        return rows
+
+    def _frame(self, rows):
+        """
+        Make a DataFrame of the rows returned by `_read_rows`.
+        """
         if 'columns' in self.header:
             names = self.header['columns']
         else:
             names = ['col' + str(i) for i in range(self.numcols)]
-        formats = [np.float]*len(names)
-        dtdict = {'names': names, 'formats': formats}
-        dt = np.dtype(dtdict)
-
-        data = []
-        self.f.seek(0)
-        for line in self.f:
-            if not line.startswith('#'):
-                lsplit = line.split(' ')
-                templist = []
-                for i, val in enumerate(lsplit):
-                    conv = self._cdict[i]
-                    val = conv(val)
-                    templist.append(val)
-                templist = tuple(templist)
-                data.append(templist)
-        data = np.array(data, dtype=dt)
+        data = np.array(rows, dtype=np.float).reshape(len(rows), len(names))
 
         if 'navg' in self.header:
             navg = self.header['navg']
@@ -320,17 +1412,818 @@ class HexReader(object):
             navg = [1.]*self.numcols
 
         for i, n in enumerate(navg):
-            col = names[i]
-            data[col] = data[col]/n
+            data[:, i] /= n
+
+        import pandas as pd
 
-        data = pd.DataFrame(data)
+        data = pd.DataFrame(data, columns=names)
         return data
 
     def update_data(self):
-        args = self.args
-        kwargs = self.kwargs
+        state = self._check()
+        if state == 'missing':  # Being replaced; keep the old data for now
+            return self.data
+        elif state in ('replaced', 'truncated'):
+            # Reopen, so that no stale buffered data is read
+            self._reopen()
+            self._init_header()
+            return self.init_data(*self.args, **self.kwargs)
+
+        rows = self._parse(self._read_new(state))
+        if rows:
+            self.data = self.append_rows(self.data, self._frame(rows))
+        return self.data
+
+    def switch_file(self, f, *args, **kwargs):
+        if f is not self.f:
+            self.close()
+        self.__init__(f)
         return self.init_data(*args, **kwargs)
 
+
+class ArrowReader(object):
+    """
+    Reader of columnar Parquet and Arrow IPC files (including Feather
+    version 2), using pyarrow. The format is recognized by the contents of
+    the file.
+
+        reader.init_data(columns=None, tail=None)
+
+    reads only the columns `columns` (default all) and, if `tail` is not
+    None, only the row groups (Parquet) or record batches (Arrow) that
+    hold the last `tail` rows. Arrow files are memory mapped, so that
+    numeric columns of uncompressed files without missing values become
+    DataFrame columns without being copied.
+
+    Arrow IPC streams, and Arrow files that are still being written (i.e.
+    have no footer yet), are read incrementally: `update_data` reads only
+    the record batches appended since the last read, and leaves a
+    partially written batch for a later update. Other files are read
+    again if they change.
+
+    Ranges of rows or times are read with `read_rows` and `read_times`,
+    which read only the row groups or record batches that cover the range.
+    Times are found with the row group statistics of Parquet files where
+    available.
+
+    See ReaderInterface for info on readers.
+    """
+    def __init__(self, f, *args, **kwargs):
+        self.filename = getattr(f, 'name', f)
+        if not isinstance(self.filename, StringTypes):
+            raise TypeError('f must be a file handle or filename.')
+        # Our own binary handle, to check for changes and read streams
+        self.f = io.open(self.filename, 'rb')
+        self.data = None
+        self.format = None
+        self._source = None  # ParquetFile or RecordBatchFileReader
+
+    def close(self):
+        self.f.close()
+        self._source = None
+
+    @property
+    def appends(self):
+        return self.format == 'stream'
+
+    append_rows = staticmethod(_append_rows)  # See ReaderInterface
+
+    def init_data(self, columns=None, tail=None):
+        if self.f.closed:
+            raise ValueError('I/O operation on closed file.')
+        import pandas as pd
+        import pyarrow as pa
+
+        self.columns = None if (columns is None) else list(columns)
+        self.tail = tail
+        self.offset = 0  # End of the stream messages read so far
+        self._schema = None
+        self._ended = False  # End of stream marker read
+        self._source = None
+        size = os.fstat(self.f.fileno()).st_size
+        magic = _pread(self.f, 0, 6)
+        self.format = None
+        if magic[:4] == b'PAR1':
+            import pyarrow.parquet as pq
+
+            try:
+                self._source = pq.ParquetFile(self.filename, memory_map=True)
+                self.format = 'parquet'
+            except (IOError, ValueError):  # Still being written
+                pass
+        elif (len(magic) < 6) and b'ARROW1'.startswith(magic):
+            pass  # Too short to tell the format yet
+        elif magic == b'ARROW1':
+            try:
+                self._source = pa.ipc.open_file(pa.memory_map(self.filename))
+                self.format = 'file'
+            except (IOError, ValueError):  # No footer yet, still written
+                self.format = 'stream'
+                self.offset = 8  # After the magic and padding
+        else:
+            self.format = 'stream'
+
+        if self._source is not None:
+            rows = self._chunk_rows()
+            first = 0
+            if tail is not None:
+                counts = np.cumsum(rows[::-1])
+                first = len(rows) - np.searchsorted(counts, tail) - 1
+                first = max(first, 0)
+            table = self._read_chunks(range(first, len(rows)))
+            if tail is not None:
+                table = table.slice(max(table.num_rows - tail, 0))
+            self.state = _FileState(self.f, size)
+            data = self._to_pandas(table)
+        else:
+            self.state = _FileState(self.f, self.offset)
+            batches = self._read_messages(size) if self.format else []
+            if self._schema is None:
+                data = pd.DataFrame()
+            else:
+                if batches:
+                    table = pa.Table.from_batches(batches)
+                else:
+                    table = self._select(self._schema.empty_table())
+                data = self._to_pandas(table)
+                if tail is not None:
+                    data = data.iloc[-tail:].reset_index(drop=True)
+        self.data = data
+        return data
+
+    def _select(self, table, columns=None):
+        """
+        The columns `columns` (default those read) of the Table or
+        RecordBatch `table`.
+        """
+        if columns is None:
+            columns = self.columns
+        if columns is None:
+            return table
+        arrays = [table.column(table.schema.get_field_index(c))
+                  for c in columns]
+        return type(table).from_arrays(arrays, columns)
+
+    @staticmethod
+    def _to_pandas(table):
+        # split_blocks lets numeric columns share memory with the table
+        return table.to_pandas(split_blocks=True)
+
+    def _chunk_rows(self):
+        """
+        Number of rows of each row group or record batch.
+        """
+        source = self._source
+        if self.format == 'parquet':
+            md = source.metadata
+            rows = [md.row_group(i).num_rows
+                    for i in range(md.num_row_groups)]
+        else:
+            rows = [source.get_batch(i).num_rows
+                    for i in range(source.num_record_batches)]
+        return np.array(rows, dtype=np.int64)
+
+    def _read_chunks(self, indices, columns=None):
+        """
+        Read the row groups or record batches `indices` into a Table.
+        """
+        import pyarrow as pa
+
+        indices = list(indices)
+        if columns is None:
+            columns = self.columns
+        source = self._source
+        if self.format == 'parquet':
+            if not indices:
+                schema = source.schema.to_arrow_schema()
+                return self._select(schema.empty_table(), columns)
+            return source.read_row_groups(indices, columns=columns)
+        batches = [source.get_batch(i) for i in indices]
+        table = pa.Table.from_batches(batches, source.schema)
+        return self._select(table, columns)
+
+    def _read_messages(self, size):
+        """
+        Returns the record batches of the complete stream messages written
+        from `self.offset` up to `size`, and marks them as read.
+        """
+        import pyarrow as pa
+
+        buf = _pread(self.f, self.offset, size - self.offset)
+        stream = pa.BufferReader(buf)
+        batches = []
+        pos = 0
+        while (not self._ended) and (pos < len(buf)):
+            marker = buf[pos:pos + 8]
+            if (marker == b'\xff\xff\xff\xff\x00\x00\x00\x00') or \
+                    (marker[:4] == b'\x00\x00\x00\x00'):  # Older format
+                self._ended = True  # End of stream
+                pos += len(marker) if (marker[0:1] == b'\xff') else 4
+                break
+            try:
+                message = pa.ipc.read_message(stream)
+            except (IOError, EOFError, ValueError):  # Partially written
+                break
+            if message is None:  # End of stream
+                self._ended = True
+            elif message.type == 'schema':
+                schema = pa.BufferReader(buf[pos:stream.tell()])
+                self._schema = pa.ipc.open_stream(schema).schema
+            elif message.type == 'record batch':
+                batch = pa.ipc.read_record_batch(message, self._schema)
+                batches.append(self._select(batch))
+            else:
+                raise ValueError('Unsupported Arrow stream message: '
+                                 '{0}.'.format(message.type))
+            pos = stream.tell()
+        self.offset += pos
+        self.state.mark(self.f, self.offset)
+        return batches
+
+    def update_data(self):
+        state = self.state.check(self.f, self.filename)
+        if state == 'missing':  # Being replaced; keep the old data for now
+            return self.data
+        elif state in ('replaced', 'truncated'):
+            self.f.close()
+            self.f = io.open(self.filename, 'rb')
+            return self.init_data(self.columns, self.tail)
+        elif self.format != 'stream':
+            if state != self.state.offset:  # Written since it was read
+                return self.init_data(self.columns, self.tail)
+            return self.data
+        elif state == self.offset:
+            return self.data
+
+        batches = self._read_messages(state)
+        if batches:
+            import pandas as pd
+            import pyarrow as pa
+
+            new = self._to_pandas(pa.Table.from_batches(batches))
+            if len(self.data.columns):
+                new = self.append_rows(self.data, new)
+            self.data = new
+        return self.data
+
     def switch_file(self, f, *args, **kwargs):
+        self.close()
         self.__init__(f)
         return self.init_data(*args, **kwargs)
+
+    def read_rows(self, start=None, stop=None):
+        """
+        Read the rows `start` up to `stop` of the file, reading only the
+        row groups or record batches that hold them.
+
+        Returns a DataFrame with the columns read by `init_data`. Streams
+        are read in full by `init_data` and `update_data`, so their rows
+        are taken from the data read so far.
+        """
+        if self._source is None:
+            return self.data.iloc[start:stop].reset_index(drop=True)
+        bounds = np.concatenate(([0], np.cumsum(self._chunk_rows())))
+        start = 0 if (start is None) else min(max(start, 0), bounds[-1])
+        stop = bounds[-1] if (stop is None) else min(stop, bounds[-1])
+        stop = max(stop, start)
+        first = max(np.searchsorted(bounds, start, 'right') - 1, 0)
+        last = np.searchsorted(bounds, stop, 'left')
+        table = self._read_chunks(range(first, last))
+        table = table.slice(start - bounds[first], stop - start)
+        return self._to_pandas(table)
+
+    def _time_stats(self, timecolumn):
+        """
+        Returns the minimum and maximum of the numeric column `timecolumn`
+        in each row group of a Parquet file, or None if they are not
+        available.
+        """
+        import pyarrow as pa
+
+        if self.format != 'parquet':
+            return None
+        schema = self._source.schema.to_arrow_schema()
+        j = schema.get_field_index(timecolumn)
+        kind = schema[j].type
+        if not (pa.types.is_integer(kind) or pa.types.is_floating(kind)):
+            return None
+        md = self._source.metadata
+        mins, maxs = [], []
+        for i in range(md.num_row_groups):
+            stats = md.row_group(i).column(j).statistics
+            if (stats is None) or not stats.has_min_max:
+                return None
+            mins.append(stats.min)
+            maxs.append(stats.max)
+        return np.array(mins, dtype=float), np.array(maxs, dtype=float)
+
+    def read_times(self, t0=None, t1=None, timecolumn=None):
+        """
+        Read the rows of the file with times from `t0` to `t1` (inclusive)
+        in the column `timecolumn` of increasing times, reading only the
+        row groups or record batches that hold them.
+
+        Times are numbers or datetimes, e.g. '2013-07-17T12:00'. None reads
+        from the start or up to the end. Returns a DataFrame with the
+        columns read by `init_data`.
+        """
+        if timecolumn is None:
+            raise ValueError("No time column specified.")
+        if (self.columns is not None) and (timecolumn not in self.columns):
+            raise ValueError("The time column {0} is not read.".format(
+                timecolumn))
+
+        if self._source is None:
+            data = self.data
+        else:
+            stats = self._time_stats(timecolumn)
+            if stats is None:
+                # Read just the time column to find the rows
+                table = self._read_chunks(range(len(self._chunk_rows())),
+                                          [timecolumn])
+                keys = _time_keys(self._to_pandas(table)[timecolumn])
+                start = 0 if (t0 is None) else \
+                    np.searchsorted(keys, _time_key(t0))
+                stop = len(keys) if (t1 is None) else \
+                    np.searchsorted(keys, _time_key(t1), 'right')
+                return self.read_rows(start, stop)
+            mins, maxs = stats
+            bounds = np.concatenate(([0], np.cumsum(self._chunk_rows())))
+            first = 0 if (t0 is None) else \
+                np.searchsorted(maxs, _time_key(t0))
+            last = len(mins) if (t1 is None) else \
+                np.searchsorted(mins, _time_key(t1), 'right')
+            data = self.read_rows(bounds[first], bounds[max(last, first)])
+
+        keys = _time_keys(data[timecolumn])
+        first = 0 if (t0 is None) else np.searchsorted(keys, _time_key(t0))
+        last = len(keys) if (t1 is None) else \
+            np.searchsorted(keys, _time_key(t1), 'right')
+        return data.iloc[first:last].reset_index(drop=True)
+
+
+def _block_frame(buffers, columns, n):
+    """
+    A DataFrame of the first `n` rows of `buffers`, sharing their memory.
+
+    `buffers` is a list of (array, positions) of Fortran-ordered (rows x
+    columns) arrays, one per dtype, whose columns are the columns
+    `positions` of the DataFrame, named by `columns`. Each array becomes a
+    single block of the DataFrame, so that it is not copied. Columns of
+    extension dtypes may be given as a DataFrame instead of an array.
+    """
+    import pandas as pd
+
+    index = pd.RangeIndex(n)
+    if not buffers:
+        return pd.DataFrame(index=index)
+    if int(pd.__version__.split('.')[0]) < 3:
+        # Putting the columns of a block in place copies it, unless the
+        # blocks are made with their places
+        try:
+            from pandas.core.internals import BlockManager, make_block
+
+            blocks = []
+            for array, positions in buffers:
+                if isinstance(array, pd.DataFrame):
+                    blocks += [make_block(array.iloc[:n, i].values,
+                                          placement=[j], ndim=2)
+                               for i, j in enumerate(positions)]
+                else:
+                    blocks.append(make_block(array[:n].T,
+                                             placement=positions))
+            return pd.DataFrame(BlockManager(blocks, [pd.Index(columns),
+                                                      index]))
+        except (ImportError, TypeError, ValueError, AssertionError):
+            pass
+    frames = []
+    for array, positions in buffers:
+        if isinstance(array, pd.DataFrame):
+            frame = array.iloc[:n]
+            frame.columns = positions
+            frame.index = index
+        else:
+            frame = pd.DataFrame(array[:n], columns=positions, copy=False)
+        frames.append(frame)
+    # Copy-on-write pandas (3.0 and later) does not copy here, and
+    # deprecates `copy` of concat
+    data = pd.concat(frames, axis=1)[list(range(len(columns)))]
+    data.columns = columns
+    return data
+
+
+def _hdf5_numeric(dset):
+    """
+    Whether the h5py Dataset `dset` can be read as columns by HDF5Reader.
+    """
+    dtype = getattr(dset, 'dtype', None)  # Groups have none
+    if dtype is None:
+        return False
+    elif dtype.names:
+        return (dset.ndim == 1) and all(dtype[name].kind in 'biuf'
+                                        for name in dtype.names)
+    return (dset.ndim in (1, 2)) and (dtype.kind in 'biuf')
+
+
+class HDF5Reader(object):
+    """
+    Reader of HDF5 files, using h5py, including files that are being
+    written in single-writer/multiple-reader (SWMR) mode.
+
+        reader.init_data(datasets=None, group='/')
+
+    reads the datasets `datasets` (paths, default all numeric datasets in
+    `group`), whose rows are along their first axis. A 1D dataset is a
+    column named after the dataset, a 2D dataset a column for each of its
+    columns, named by its 'columns' attribute if it has one, and a 1D
+    compound dataset a column for each field. Chunked and compressed
+    datasets are read as any other; only the chunks that hold the rows
+    being read are decompressed.
+
+    The file is only open while it is read, in SWMR read mode where
+    possible, so that writers that do not use SWMR are not locked out in
+    between. When the file has changed, `update_data` reads only the rows
+    appended since the previous read, up to the length of the shortest
+    dataset, into buffers that grow as needed. The returned DataFrame
+    shares the memory of the buffers, so the rows read before are not
+    copied. If the datasets shrink or the file is replaced, it is read
+    again.
+
+    See ReaderInterface for info on readers.
+    """
+    mincapacity = 1024  # Rows
+    appends = False  # The data share the buffers
+
+    def __init__(self, f, *args, **kwargs):
+        self.filename = getattr(f, 'name', f)
+        if not isinstance(self.filename, StringTypes):
+            raise TypeError('f must be a file handle or filename.')
+        self.closed = False
+        self.data = None
+        self._open().close()  # Fail early if it is not an HDF5 file
+
+    def _open(self):
+        """
+        Returns the file opened with h5py, and records its identity.
+        """
+        import h5py
+
+        self._stat = self._identity()
+        try:
+            f = h5py.File(self.filename, 'r', libver='latest', swmr=True)
+            self.swmr = True
+        except (IOError, OSError, ValueError):  # Not written for SWMR
+            f = h5py.File(self.filename, 'r')
+            self.swmr = False
+        return f
+
+    def _identity(self):
+        """
+        Returns the (device, inode, size, mtime) of the file, or None if it
+        does not exist.
+        """
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime)
+
+    def close(self):
+        self.closed = True
+
+    def init_data(self, datasets=None, group='/'):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        self.datasets = None if (datasets is None) else list(datasets)
+        self.group = group
+        f = self._open()
+        try:
+            return self._init(f, datasets, group)
+        finally:
+            f.close()
+
+    def _init(self, f, datasets, group):
+        if datasets is None:
+            prefix = group.rstrip('/') + '/'
+            datasets = [prefix + name for name in sorted(f[group])
+                        if _hdf5_numeric(f[prefix + name])]
+
+        # Columns as (dataset, selector, name, dtype), where the selector
+        # is None for 1D datasets, a column of 2D datasets or a field name
+        self._columns = []
+        for path in datasets:
+            dset = f[path]
+            if not _hdf5_numeric(dset):
+                raise ValueError("Cannot read dataset {0} of shape {1} and "
+                                 "dtype {2}.".format(path, dset.shape,
+                                                     dset.dtype))
+            base = path.rstrip('/').rsplit('/', 1)[-1]
+            dtype = dset.dtype
+            if dtype.names:
+                self._columns.extend((path, name, name, dtype[name])
+                                     for name in dtype.names)
+            elif dset.ndim == 1:
+                self._columns.append((path, None, base, dtype))
+            else:
+                names = dset.attrs.get('columns')
+                if names is None:
+                    names = ['{0}_{1}'.format(base, i)
+                             for i in range(dset.shape[1])]
+                names = [n.decode('utf-8') if isinstance(n, bytes) else n
+                         for n in names]
+                self._columns.extend((path, i, names[i], dtype)
+                                     for i in range(dset.shape[1]))
+
+        # Columns with the same dtype share a (rows x columns)
+        # Fortran-ordered buffer, which becomes a single block of the
+        # DataFrame without a copy, see _block_frame
+        self._blocks = []  # (dtype, column positions)
+        self._where = []  # (block, column in block) of each column
+        dtypes = []
+        for j, (path, sel, name, dtype) in enumerate(self._columns):
+            if dtype not in dtypes:
+                dtypes.append(dtype)
+                self._blocks.append((dtype, []))
+            b = dtypes.index(dtype)
+            self._where.append((b, len(self._blocks[b][1])))
+            self._blocks[b][1].append(j)
+        self._buffers = [np.empty((0, len(positions)), dtype, order='F')
+                         for dtype, positions in self._blocks]
+        self.nrows = 0
+        self.data = None
+        return self._read(f)
+
+    def _reserve(self, n):
+        """
+        Grow the buffers to hold at least `n` rows.
+        """
+        capacity = len(self._buffers[0]) if self._buffers else n
+        if n <= capacity:
+            return
+        capacity = max(n, 2*capacity, self.mincapacity)
+        for b, old in enumerate(self._buffers):
+            new = np.empty((capacity, old.shape[1]), old.dtype, order='F')
+            new[:self.nrows] = old[:self.nrows]
+            self._buffers[b] = new
+
+    def _read(self, f):
+        """
+        Read the rows appended since the last read of the open file `f`
+        into the buffers.
+
+        Returns the data, or None if the datasets shrank.
+        """
+        paths = []
+        for column in self._columns:
+            if column[0] not in paths:
+                paths.append(column[0])
+        dsets = [f[path] for path in paths]
+        n = min([dset.shape[0] for dset in dsets] or [0])
+        if n < self.nrows:
+            return None
+        start = self.nrows
+        if n > start:
+            self._reserve(n)
+            rows = np.s_[start:n]
+            for path, dset in zip(paths, dsets):
+                cols = [(j, c[1]) for j, c in enumerate(self._columns)
+                        if c[0] == path]
+                if cols[0][1] is None:  # 1D, read straight into the buffer
+                    b, k = self._where[cols[0][0]]
+                    dset.read_direct(self._buffers[b][:, k], rows, rows)
+                    continue
+                block = dset[rows]
+                for j, sel in cols:
+                    b, k = self._where[j]
+                    if isinstance(sel, int):
+                        self._buffers[b][rows, k] = block[:, sel]
+                    else:
+                        self._buffers[b][rows, k] = block[sel]
+            self.nrows = n
+        if (self.data is None) or (n > start):
+            self.data = self._frame()
+        return self.data
+
+    def _frame(self):
+        """
+        A DataFrame of the rows read so far, sharing the buffers.
+        """
+        buffers = [(buf, positions) for buf, (dtype, positions)
+                   in zip(self._buffers, self._blocks)]
+        return _block_frame(buffers, [c[2] for c in self._columns],
+                            self.nrows)
+
+    def update_data(self):
+        stat = self._identity()
+        if stat is None:  # Being replaced; keep the old data for now
+            return self.data
+        elif stat == self._stat:  # Unchanged
+            return self.data
+        # Open the file anew rather than keeping it open and refreshing the
+        # datasets: refreshing does not update the chunk index of
+        # uncompressed chunked datasets, so that new rows are read from the
+        # wrong chunks. Opening takes well under a millisecond.
+        replaced = (stat[:2] != self._stat[:2])
+        try:
+            f = self._open()
+        except (IOError, OSError):  # Not readable yet, try again later
+            return self.data
+        try:
+            data = None if replaced else self._read(f)
+        except KeyError:  # A dataset is gone
+            data = None
+        finally:
+            f.close()
+        if data is None:
+            return self.init_data(self.datasets, self.group)
+        return data
+
+    def switch_file(self, f, *args, **kwargs):
+        self.close()
+        self.__init__(f)
+        return self.init_data(*args, **kwargs)
+
+
+class SharedSource(object):
+    """
+    A reader of the file `f` shared by several views, e.g. several
+    PyOscopeRealtime plots of the same file with different channels or
+    windows. Made by SharedReader; see there.
+
+    `reader` is the reader class, constructed and initialized with `args`
+    and `kwargs`. `update` reads the changes to the file at most once per
+    round of updates of the views: a view that has not yet seen the data
+    read last gets them without the file being read again.
+    """
+    def __init__(self, f, reader, args, kwargs):
+        self.args = args
+        self.kwargs = dict(kwargs)
+        self.lock = threading.RLock()
+        self.reader = reader(f, *args, **kwargs)
+        try:
+            self.data = self.reader.init_data(*args, **dict(kwargs))
+        except Exception:
+            self.reader.close()
+            raise
+        self.filename = self.reader.filename
+        self.generation = 0  # Number of updates read
+        self.refs = 0  # Number of views
+
+    def update(self, seen):
+        """
+        Returns the data and their generation, for a view that has seen the
+        generation `seen`. Reads the changes to the file only if the view
+        has already seen the latest data.
+        """
+        with self.lock:
+            if seen >= self.generation:
+                self.data = self.reader.update_data()
+                self.generation += 1
+            return self.data, self.generation
+
+
+_sources = {}  # (path, reader class): SharedSource
+_sources_lock = threading.Lock()
+
+
+def _source_key(f, reader):
+    name = getattr(f, 'name', f)
+    if not isinstance(name, StringTypes):
+        raise TypeError('f must be a file handle or filename.')
+    return (os.path.abspath(name), reader)
+
+
+def _acquire(f, reader, args, kwargs):
+    """
+    Returns the SharedSource of `f` read by `reader`, made if there is none,
+    with a reference for a new view.
+    """
+    key = _source_key(f, reader)
+    with _sources_lock:
+        source = _sources.get(key)
+        if source is not None:
+            return _reference(source, key, args, kwargs)
+    # Read the file without holding up the other sources. Another view may
+    # make the source meanwhile, in which case this one is dropped.
+    made = SharedSource(f, reader, args, kwargs)
+    try:
+        with _sources_lock:
+            source = _sources.setdefault(key, made)
+            return _reference(source, key, args, kwargs)
+    finally:
+        if source is not made:
+            made.reader.close()
+
+
+def _reference(source, key, args, kwargs):
+    """
+    Add a reference to `source`, checking the arguments of the new view.
+    Call holding `_sources_lock`.
+    """
+    if (source.args != args) or (source.kwargs != kwargs):
+        raise ValueError("{0} is already read with other arguments."
+                         .format(key[0]))
+    source.refs += 1
+    return source
+
+
+def _release(source):
+    """
+    Drop a view's reference to `source`, closing it with the last one.
+    """
+    with _sources_lock:
+        source.refs -= 1
+        if source.refs > 0:
+            return
+        for key, value in list(_sources.items()):
+            if value is source:
+                del _sources[key]
+    with source.lock:
+        source.reader.close()
+
+
+class SharedReader(object):
+    """
+    Reader that shares the reading of a file with the other SharedReaders
+    of the same file, so that several plots of one file parse it once.
+
+        rt1 = PyOscopeRealtime(f='data.txt', reader=SharedReader, header=0)
+        rt2 = PyOscopeRealtime(f='data.txt', reader=SharedReader, header=0)
+        rt1.plot('time', 'voltage')
+        rt2.plot('time', 'current')
+
+    The file is read by a single SharedSource, made by the first view with
+    the reader class `base` (DefaultReader; see `shared` for others) and
+    the arguments of the view, which the other views of the file must
+    match. Each round of updates of the views reads the changes once:
+    whichever view updates first reads them, and the other views get the
+    same data. Each plot keeps its own plot, window and settings. The
+    file is closed when the last view is closed, e.g. its plot stopped.
+
+    The data are the same object for all views, so callbacks must not
+    change them in place. They are never dropped by a memory budget (see
+    memory.MemoryBudget), which would drop them for all views.
+
+    See ReaderInterface for info on readers.
+    """
+    base = DefaultReader
+    appends = False  # The data belong to all views
+
+    def __init__(self, f, *args, **kwargs):
+        self.source = None
+        self._attach(f, args, kwargs)
+
+    def _attach(self, f, args, kwargs):
+        source = _acquire(f, self.base, args, kwargs)
+        if self.source is not None:
+            _release(self.source)
+        self.source = source
+        self.filename = source.filename
+        self.data = source.data
+        self._seen = source.generation
+
+    def close(self):
+        source, self.source = self.source, None
+        if source is not None:
+            _release(source)
+
+    def init_data(self, *args, **kwargs):
+        if self.source is None:
+            raise ValueError('I/O operation on closed file.')
+        with self.source.lock:
+            self.data = self.source.data
+            self._seen = self.source.generation
+        return self.data
+
+    def update_data(self):
+        self.data, self._seen = self.source.update(self._seen)
+        return self.data
+
+    def switch_file(self, f, *args, **kwargs):
+        self._attach(f, args, kwargs)
+        return self.data
+
+    def read_rows(self, start=None, stop=None):
+        with self.source.lock:
+            return self.source.reader.read_rows(start, stop)
+
+    def read_times(self, t0=None, t1=None, timecolumn=None):
+        with self.source.lock:
+            return self.source.reader.read_times(t0, t1,
+                                                 timecolumn=timecolumn)
+
+
+_shared = {}  # reader class: SharedReader subclass
+
+
+def shared(reader=DefaultReader):
+    """
+    Returns a SharedReader class that reads files with `reader`, e.g.
+
+        PyOscopeRealtime(f='run.h5', reader=shared(HDF5Reader))
+    """
+    with _sources_lock:
+        if reader not in _shared:
+            _shared[reader] = type('Shared' + reader.__name__,
+                                   (SharedReader,), {'base': reader})
+        return _shared[reader]
@@ -0,0 +1,552 @@
+#!/bin/env python
+
+"""
+remote.py
+
+Streaming of realtime pyoscope plots to remote viewers.
+
+A FrameServer publishes the lines of a PyOscopeRealtime plot over TCP.
+Each frame, the window of every line is decimated and only the points that
+changed since the previous frame are sent, together with the axis limits.
+Every frame is encoded once, however many clients are connected. A client
+that falls behind skips frames and is sent a keyframe with the full state
+when it catches up.
+
+Start a server with `PyOscopeRealtime.serve` and watch it with ScopeClient,
+or from the command line:
+
+    python remote.py localhost:5555 --plot
+
+Protocol
+--------
+
+All numbers are little-endian. Each message is a uint32 byte count
+followed by that many bytes:
+
+    uint8   kind        0 for a keyframe, 1 for a delta
+    uint32  frame       frame number
+    uint16  naxes       number of axes
+    uint16  ntraces     number of traces in the message
+    naxes times:
+        4 float64       xmin, xmax, ymin, ymax
+    ntraces times:
+        uint16  trace   trace number
+        uint16  axes    index of the axes of the trace
+        uint32  drop    number of old points to drop from the start
+        uint32  head    number of new points to put before the old ones
+        uint32  keep    number of old points to keep after those dropped
+        uint32  count   number of new points
+        count float64   x of the new points
+        count float64   y of the new points
+
+The points of a trace become the first `head` new points, the `keep` old
+points after the first `drop` old points, and the remaining new points. A
+keyframe replaces all traces. A delta only lists the traces that changed;
+the other traces are unchanged.
+
+The client acknowledges each message by sending a single byte once it has
+read it. The server stops sending to a client that falls behind with its
+acknowledgements, see FrameServer.
+"""
+releasestatus = 'dev'
+
+import sys
+import time
+import struct
+import socket
+import argparse
+import threading
+from collections import deque
+import numpy as np
+
+
+__all__ = ['FrameServer', 'ScopeClient']
+
+KEYFRAME = 0
+DELTA = 1
+
+_header = struct.Struct('<BIHH')
+_limits = struct.Struct('<4d')
+_trace = struct.Struct('<HHIIII')
+_length = struct.Struct('<I')
+
+
+def _decimate(x, y, offset, maxpoints):
+    """
+    Reduce the samples `x`, `y` of the rows `offset`... to at most about
+    `maxpoints` points, keeping the minimum and maximum of each bucket of
+    rows.
+
+    Buckets are aligned to absolute row numbers and their size is a power
+    of two, so that the points of a bucket do not change as the window
+    slides or grows. Returns the points and the bucket size and bucket of
+    each point.
+    """
+    n = len(y)
+    if n <= maxpoints:
+        return x, y, 1, offset + np.arange(n)
+    size = 1 << int(np.ceil(np.log2(2.*n/maxpoints)))
+    lead = offset % size
+    nbuckets = -(-(lead + n)//size)
+    padded = np.empty(nbuckets*size)
+    padded[:lead] = np.nan
+    padded[lead:lead + n] = y
+    padded[lead + n:] = np.nan
+    padded = padded.reshape(nbuckets, size)
+    nans = np.isnan(padded)
+    imin = np.where(nans, np.inf, padded).argmin(axis=1)
+    imax = np.where(nans, -np.inf, padded).argmax(axis=1)
+    base = np.arange(nbuckets)*size - lead
+    lo = np.clip(base + np.minimum(imin, imax), 0, n - 1)
+    hi = np.clip(base + np.maximum(imin, imax), 0, n - 1)
+    idx = np.column_stack((lo, hi)).ravel()
+    return x[idx], y[idx], size, (offset + idx)//size
+
+
+def _same(a, b):
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+
+def _matching(old, new, drop, head):
+    """
+    Returns the number of points of `new` after the first `head` that are
+    the same as those of `old` after the first `drop`.
+    """
+    ox, oy, _, ob = old
+    nx, ny, _, nb = new
+    m = max(min(len(ox) - drop, len(nx) - head), 0)
+    same = (_same(ox[drop:drop + m], nx[head:head + m])
+            & _same(oy[drop:drop + m], ny[head:head + m])
+            & (ob[drop:drop + m] == nb[head:head + m]))
+    return m if same.all() else int(np.argmin(same))
+
+
+def _delta(old, new):
+    """
+    Returns the (drop, head, keep) of the smallest update of the decimated
+    trace `old` to `new` (see the protocol).
+    """
+    if (old[2] != new[2]) or not (len(old[0]) and len(new[0])):
+        return len(old[0]), 0, 0
+    buckets = new[3]
+    # Skip the old points of buckets that slid out of the window
+    drop = int(np.searchsorted(old[3], buckets[0]))
+    keep = _matching(old, new, drop, 0)
+    # The first bucket is partial when the window does not start at a
+    # bucket boundary, and changes as the window slides
+    head = int(np.searchsorted(buckets, buckets[0], 'right'))
+    if keep < head:
+        drop2 = int(np.searchsorted(old[3], buckets[0], 'right'))
+        keep2 = _matching(old, new, drop2, head)
+        if keep2 > keep:
+            return drop2, head, keep2
+    return drop, 0, keep
+
+
+def _snapshot(scope):
+    """
+    Returns copies of the data of the lines of `scope`, as a list of (axes
+    index, x, y, row of the first sample) tuples, and the limits of its
+    axes.
+    """
+    from pyoscope import ChannelCollection
+
+    with scope.lock:
+        if scope.axes is None:
+            return [], []
+        axes = list(scope.axes.flat)
+        limits = [ax.get_xlim() + ax.get_ylim() for ax in axes]
+        offset = 0
+        if (scope.mode == 'plot') and (scope.data is not None):
+            offset = scope._window(len(scope.data)).start or 0
+        traces = []
+        seen = set()
+        for artist in getattr(scope.lines, 'flat', scope.lines):
+            if (artist is None) or (id(artist) in seen):
+                continue
+            seen.add(id(artist))
+            if isinstance(artist, ChannelCollection):
+                k = axes.index(artist.ax)
+                segs = np.array(artist._segs, dtype=float)
+                traces.extend((k, seg[:, 0], seg[:, 1], offset)
+                              for seg in segs)
+            else:
+                k = axes.index(artist.axes)
+                x = artist.convert_xunits(artist.get_xdata())
+                y = artist.convert_yunits(artist.get_ydata())
+                traces.append((k, np.array(x, dtype=float),
+                               np.array(y, dtype=float), offset))
+    return traces, limits
+
+
+class _Client(object):
+    """
+    A connected viewer. Messages are queued by the publishing thread and
+    sent by the client's own thread, so that a slow viewer does not hold
+    up the others. Another thread counts the acknowledgements.
+    """
+    def __init__(self, conn, maxqueue):
+        self.conn = conn
+        self.maxqueue = maxqueue
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.sent = 0
+        self.acked = 0
+        self.resync = True  # Needs a keyframe
+        self.closed = False
+
+    def start(self):
+        for target in (self._send_loop, self._ack_loop):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def put(self, message):
+        """
+        Queue `message`. If the client is `maxqueue` messages behind, drops
+        all queued messages instead and asks for a keyframe.
+        """
+        with self.cond:
+            if len(self.queue) + self.sent - self.acked >= self.maxqueue:
+                self.queue.clear()
+                self.resync = True
+                return
+            self.queue.append(message)
+            self.cond.notify_all()
+
+    def _send_loop(self):
+        while True:
+            with self.cond:
+                while not (self.closed or (
+                        self.queue
+                        and (self.sent - self.acked < self.maxqueue))):
+                    self.cond.wait()
+                if self.closed:
+                    return
+                message = self.queue.popleft()
+                self.sent += 1
+            try:
+                self.conn.sendall(message)
+            except (socket.error, IOError):
+                self.close()
+                return
+
+    def _ack_loop(self):
+        while True:
+            try:
+                acks = self.conn.recv(4096)
+            except (socket.error, IOError):
+                acks = b''
+            if not acks:  # Disconnected
+                self.close()
+                return
+            with self.cond:
+                self.acked += len(acks)
+                self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify_all()
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except (socket.error, IOError):
+            pass
+        self.conn.close()
+
+
+class FrameServer(object):
+    """
+    Publishes the lines of the PyOscopeRealtime `scope` to TCP clients.
+
+    Listens on `host` and `port`, by default on a free port of the loopback
+    interface only; the actual address is in `address`. Every `interval`
+    milliseconds the window of each line is decimated to at most about
+    `maxpoints` points and the changes are sent to all clients, see the
+    module docstring for the protocol. A non-interactive scope is updated
+    before each frame, as by `export_frames`.
+
+    At most `maxqueue` frames are queued or unacknowledged per client. If a
+    client is too slow to keep up, its queued frames are dropped and it is
+    sent a keyframe once it has caught up.
+
+    Usually made by `PyOscopeRealtime.serve`.
+    """
+    def __init__(self, scope, host='127.0.0.1', port=0, interval=500,
+                 maxpoints=2000, maxqueue=8):
+        self.scope = scope
+        self.interval = max(interval, 10)/1000.
+        self.maxpoints = maxpoints
+        self.maxqueue = maxqueue
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(16)
+        self.address = self.sock.getsockname()
+        self.frame = 0
+        self._clients = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._state = []  # (axes, x, y, bucket size, buckets) as last sent
+        self._limits = []
+        self._threads = []
+
+    @property
+    def clients(self):
+        """
+        Number of connected clients.
+        """
+        with self._lock:
+            return len([c for c in self._clients if not c.closed])
+
+    def start(self):
+        for target in (self._accept_loop, self._publish_loop):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stop publishing and disconnect all clients.
+        """
+        self._stop.set()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except (socket.error, IOError):
+            pass
+        self.sock.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self._threads = []
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                conn, addr = self.sock.accept()
+            except (socket.error, IOError):
+                return  # The socket was closed by stop
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(conn, self.maxqueue)
+            with self._lock:
+                self._clients.append(client)
+            client.start()
+
+    def _publish_loop(self):
+        t0 = time.time()
+        while not self._stop.is_set():
+            self.publish()
+            # Stay on the fixed cadence, skipping ticks that were missed
+            elapsed = time.time() - t0
+            self._stop.wait(self.interval - (elapsed % self.interval))
+
+    def publish(self):
+        """
+        Send a frame of the current plot to all clients.
+        """
+        if not self.scope.interactive:
+            self.scope._update()
+        traces, limits = _snapshot(self.scope)
+        message = self._encode(traces, limits)
+        with self._lock:
+            self._clients = [c for c in self._clients if not c.closed]
+            clients = list(self._clients)
+        keyframe = None
+        for client in clients:
+            if client.resync:
+                if keyframe is None:
+                    keyframe = self._encode_keyframe()
+                client.resync = False
+                client.put(keyframe)
+            else:
+                client.put(message)
+
+    def _encode(self, traces, limits):
+        """
+        Encode the changes since the last frame, and remember the new
+        state. Returns a keyframe if the layout of the plot changed.
+        """
+        self.frame += 1
+        old, oldlimits = self._state, self._limits
+        state = []
+        for k, x, y, offset in traces:
+            x, y, size, buckets = _decimate(x, y, offset, self.maxpoints)
+            state.append((k, x, y, size, buckets))
+        self._state = state
+        self._limits = limits
+        layout = [s[0] for s in state]
+        if ((layout != [s[0] for s in old])
+                or (len(limits) != len(oldlimits))):
+            return self._encode_keyframe()
+
+        parts = []
+        for t, (new, prev) in enumerate(zip(state, old)):
+            drop, head, keep = _delta(prev[1:], new[1:])
+            if keep == len(prev[1]) == len(new[1]):
+                continue  # Unchanged
+            parts.append(self._encode_trace(t, new[0], new[1], new[2], drop,
+                                            head, keep))
+        return self._message(DELTA, limits, parts)
+
+    def _encode_keyframe(self):
+        parts = [self._encode_trace(t, s[0], s[1], s[2], 0, 0, 0)
+                 for t, s in enumerate(self._state)]
+        return self._message(KEYFRAME, self._limits, parts)
+
+    @staticmethod
+    def _encode_trace(t, k, x, y, drop, head, keep):
+        x = np.concatenate((x[:head], x[head + keep:])).astype('<f8')
+        y = np.concatenate((y[:head], y[head + keep:])).astype('<f8')
+        return b''.join([_trace.pack(t, k, drop, head, keep, len(x)),
+                         x.tobytes(), y.tobytes()])
+
+    def _message(self, kind, limits, parts):
+        body = b''.join([_header.pack(kind, self.frame, len(limits),
+                                      len(parts))]
+                        + [_limits.pack(*lim) for lim in limits] + parts)
+        return _length.pack(len(body)) + body
+
+
+class ScopeClient(object):
+    """
+    Reference client of a FrameServer at `host`, `port`.
+
+    Each call of `receive` reads a single frame and applies it. The current
+    state is in `frame` (the frame number), `limits` (the xmin, xmax, ymin,
+    ymax of each axes) and `traces` (a dictionary of trace number to the
+    axes index, x and y arrays of the trace). Iterating over a ScopeClient
+    receives frames until the server disconnects.
+
+    Example:
+
+        client = ScopeClient('localhost', 5555)
+        for frame in client:
+            print frame, len(client.traces)
+    """
+    def __init__(self, host='127.0.0.1', port=5555, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.frame = None
+        self.kind = None
+        self.nbytes = 0  # Size of the last message
+        self.limits = []
+        self.traces = {}
+
+    def _read(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise EOFError('Server closed the connection.')
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def receive(self):
+        """
+        Receive and apply a frame. Returns the frame number.
+
+        Raises EOFError if the server disconnected.
+        """
+        n = _length.unpack(self._read(_length.size))[0]
+        body = self._read(n)
+        self.sock.sendall(b'\x01')  # Acknowledge
+        self.nbytes = n + _length.size
+        kind, frame, naxes, ntraces = _header.unpack_from(body, 0)
+        pos = _header.size
+        limits = []
+        for i in range(naxes):
+            limits.append(_limits.unpack_from(body, pos))
+            pos += _limits.size
+        traces = {} if (kind == KEYFRAME) else self.traces
+        for i in range(ntraces):
+            t, k, drop, head, keep, count = _trace.unpack_from(body, pos)
+            pos += _trace.size
+            x = np.frombuffer(body, '<f8', count, pos)
+            pos += 8*count
+            y = np.frombuffer(body, '<f8', count, pos)
+            pos += 8*count
+            if t in traces:
+                _, px, py = traces[t]
+                x = np.concatenate((x[:head], px[drop:drop + keep],
+                                    x[head:]))
+                y = np.concatenate((y[:head], py[drop:drop + keep],
+                                    y[head:]))
+            traces[t] = (k, x, y)
+        self.kind = kind
+        self.frame = frame
+        self.limits = limits
+        self.traces = traces
+        return frame
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.receive()
+            except EOFError:
+                return
+
+    def close(self):
+        self.sock.close()
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Watch a pyoscope plot served by PyOscopeRealtime.serve.')
+    parser.add_argument('address', help='server address, HOST:PORT')
+    parser.add_argument('-n', '--frames', type=int, default=None,
+                        help='number of frames to receive (default: until '
+                             'the server disconnects)')
+    parser.add_argument('--plot', action='store_true',
+                        help='show the plot in a matplotlib window')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    host, _, port = args.address.rpartition(':')
+    client = ScopeClient(host or '127.0.0.1', int(port))
+
+    if args.plot:
+        import matplotlib.pyplot as plt
+        fig = plt.figure()
+        axes = []
+        lines = {}
+
+    count = 0
+    for frame in client:
+        npoints = sum(len(tr[1]) for tr in client.traces.values())
+        sys.stdout.write('frame {0:6d}  {1:8}  {2:8d} bytes  {3:3d} traces  '
+                         '{4:8d} points\n'.format(
+                             frame, 'keyframe' if client.kind == KEYFRAME
+                             else 'delta', client.nbytes,
+                             len(client.traces), npoints))
+        sys.stdout.flush()
+        if args.plot:
+            if client.kind == KEYFRAME:
+                fig.clf()
+                axes = [fig.add_subplot(len(client.limits), 1, i + 1)
+                        for i in range(len(client.limits))]
+                lines = {}
+            for t, (k, x, y) in client.traces.items():
+                if t not in lines:
+                    lines[t] = axes[k].plot(x, y)[0]
+                lines[t].set_data(x, y)
+            for ax, lim in zip(axes, client.limits):
+                ax.set_xlim(lim[:2])
+                ax.set_ylim(lim[2:])
+            plt.pause(0.001)
+        count += 1
+        if (args.frames is not None) and (count >= args.frames):
+            break
+    client.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
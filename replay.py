@@ -0,0 +1,345 @@
+#!/bin/env python
+
+"""
+replay.py
+
+Replays recorded data files, to load pyoscope like live data do.
+
+Re-emits the lines of a recorded data file to a file, a pipe or a socket,
+at the pace of a time column of the recording, or at a fixed rate, sped up
+or slowed down by a factor. Lines are written in bursts of a number of
+lines, like an acquisition program that writes out a buffer at a time.
+The recording may be looped, shifting the time column of each pass, to
+replay a short recording for hours. See benchmarks/soak.py for a soak test
+that plots a replayed file.
+
+Example:
+
+    rp = Replay('run1.txt', 'live.txt', timecolumn=0, speed=10., burst=50,
+                header=1)
+    rp.start()
+    rt = PyOscopeRealtime(f='live.txt', header=0)
+    ...
+    rp.stop()
+
+or from the command line:
+
+    pyoscope-replay run1.txt live.txt -t 0 --speed 10 --burst 50
+    pyoscope-replay run1.txt - --rate 1000 | some_program
+    pyoscope-replay run1.txt tcp://localhost:5555 --rate 1000 --loop 0
+"""
+releasestatus = 'dev'
+
+import sys
+import time
+import socket
+import argparse
+import threading
+from collections import namedtuple
+from readers import _open
+
+
+__all__ = ['Replay', 'ReplayStats']
+
+
+class ReplayStats(namedtuple('ReplayStats', ['rows', 'bytes', 'elapsed',
+                                             'maxlag'])):
+    """
+    Progress of a Replay.
+
+    `rows` and `bytes` are the numbers of data lines and bytes written so
+    far, `elapsed` the seconds since the replay started, and `maxlag` the
+    largest delay in seconds of a burst behind its schedule, e.g. because
+    the target was blocked.
+    """
+    __slots__ = ()
+
+
+class _SocketFile(object):
+    """
+    Write end of a TCP connection, for Replay.
+    """
+    def __init__(self, address):
+        host, port = address.rsplit(':', 1)
+        self.sock = socket.create_connection((host, int(port)))
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.sock.close()
+
+
+def _open_target(target):
+    """
+    Returns a binary file-like object to write `target` to, see Replay.
+    """
+    if hasattr(target, 'write'):
+        return target
+    elif target == '-':
+        return getattr(sys.stdout, 'buffer', sys.stdout)
+    elif target.startswith('tcp://'):
+        return _SocketFile(target[len('tcp://'):])
+    return open(target, 'wb')
+
+
+class Replay(object):
+    """
+    Replays the recorded data file `source` to `target`.
+
+    `source` may be compressed, see readers._decompressor. Its first
+    `header` lines are written at once, and the remaining lines are paced:
+
+        - by the time column `timecolumn` (index of the field split by
+          `delimiter`) of the recording, if not None,
+        - else at `rate` lines per second, if not None,
+        - else as fast as the target takes them,
+
+    where the time column or the rate is sped up by the factor `speed`.
+    Each write is a burst of `burst` lines, written when the last of them is
+    due. Lines whose time field does not parse are written with the lines
+    before them.
+
+    `target` is a filename, which is created or truncated, '-' for
+    standard output (e.g. a pipe), 'tcp://host:port' to connect to a TCP
+    server, or a writable binary file object. Files are flushed after each
+    burst, so that readers see every burst as soon as it is written.
+
+    The recording is replayed `loop` times, or forever if 0. The time
+    column of each repeat is shifted to follow on the previous one, so that
+    it keeps increasing.
+    """
+    def __init__(self, source, target, rate=None, speed=1., burst=1,
+                 timecolumn=None, delimiter=',', header=0, loop=1):
+        if (rate is not None) and (rate <= 0):
+            raise ValueError("rate must be positive.")
+        if speed <= 0:
+            raise ValueError("speed must be positive.")
+        self.source = source
+        self.target = target
+        self.rate = rate
+        self.speed = float(speed)
+        self.burst = max(1, int(burst))
+        self.timecolumn = timecolumn
+        self.delimiter = delimiter.encode('ascii')
+        self.header = int(header)
+        self.loop = int(loop)
+        self.stats = ReplayStats(0, 0, 0., 0.)
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _lines(self):
+        """
+        Iterator of the (time, line) of the data lines of all passes, with
+        shifted times. The time is None for lines without one.
+        """
+        col = self.timecolumn
+        delim = self.delimiter
+        shift = 0.
+        n = 0
+        while (self.loop == 0) or (n < self.loop):
+            f = _open(self.source)
+            count = 0
+            try:
+                first = last = None
+                step = 0.
+                for i, line in enumerate(f):
+                    if (i < self.header) or not line.strip():
+                        continue
+                    count += 1
+                    if not line.endswith(b'\n'):
+                        line += b'\n'
+                    t = None
+                    if col is not None:
+                        fields = line.split(delim)
+                        try:
+                            t = float(fields[col])
+                        except (IndexError, ValueError):
+                            pass
+                        else:
+                            if last is not None:
+                                step = t - last
+                            if first is None:
+                                first = t
+                            last = t
+                            if shift:
+                                fields[col] = repr(t + shift).encode('ascii')
+                                line = delim.join(fields)
+                                if not line.endswith(b'\n'):
+                                    line += b'\n'
+                            t += shift
+                    yield t, line
+            finally:
+                f.close()
+            if not count:  # Nothing to loop over
+                return
+            if last is not None:
+                shift += last - first + step
+            n += 1
+
+    def _headers(self):
+        f = _open(self.source)
+        try:
+            lines = []
+            for i, line in enumerate(f):
+                if i >= self.header:
+                    break
+                lines.append(line)
+            return b''.join(lines)
+        finally:
+            f.close()
+
+    def run(self):
+        """
+        Replay until done or stopped with `stop`. Returns the ReplayStats.
+        """
+        out = _open_target(self.target)
+        try:
+            return self._run(out)
+        finally:
+            if (out is not self.target) and (self.target != '-'):
+                out.close()
+
+    def _run(self, out):
+        start = time.time()
+        rows = nbytes = 0
+        maxlag = 0.
+        header = self._headers()
+        if header:
+            out.write(header)
+            out.flush()
+            nbytes += len(header)
+
+        t0 = None  # First time of the time column
+        pending = []
+        due = start
+        for t, line in self._lines():
+            if self._stop.is_set():
+                break
+            pending.append(line)
+            if self.timecolumn is not None:
+                if t is not None:
+                    if t0 is None:
+                        t0 = t
+                    due = start + (t - t0)/self.speed
+            elif self.rate is not None:
+                due = start + (rows + len(pending))/(self.rate*self.speed)
+            if len(pending) < self.burst:
+                continue
+            maxlag = max(maxlag, self._wait(due))
+            if self._stop.is_set():
+                break
+            data = b''.join(pending)
+            out.write(data)
+            out.flush()
+            rows += len(pending)
+            nbytes += len(data)
+            pending = []
+            self.stats = ReplayStats(rows, nbytes, time.time() - start,
+                                     maxlag)
+        if pending and not self._stop.is_set():
+            data = b''.join(pending)
+            out.write(data)
+            out.flush()
+            rows += len(pending)
+            nbytes += len(data)
+        self.stats = ReplayStats(rows, nbytes, time.time() - start, maxlag)
+        return self.stats
+
+    def _wait(self, due):
+        """
+        Wait until the time `due`, unless stopped. Returns how late it is.
+        """
+        delay = due - time.time()
+        if delay > 0:
+            self._stop.wait(delay)
+            return 0.
+        return -delay
+
+    def start(self):
+        """
+        Replay in a background thread.
+        """
+        self.stop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop replaying, and wait for the background thread to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def running(self):
+        return (self._thread is not None) and self._thread.is_alive()
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Replay a recorded data file to a file, a pipe or a '
+                    'socket.')
+    parser.add_argument('source', help='recorded data file')
+    parser.add_argument('target',
+                        help="file to write, '-' for standard output or "
+                             "tcp://host:port")
+    parser.add_argument('-t', '--timecolumn', type=int, default=None,
+                        help='index of the time column to pace lines by')
+    parser.add_argument('-r', '--rate', type=float, default=None,
+                        help='lines per second, if there is no time column')
+    parser.add_argument('-s', '--speed', type=float, default=1.,
+                        help='speed-up factor (default: 1)')
+    parser.add_argument('-b', '--burst', type=int, default=1,
+                        help='lines written at a time (default: 1)')
+    parser.add_argument('-d', '--delimiter', default=',')
+    parser.add_argument('--header', type=int, default=None,
+                        help='number of header lines (default: 1 if the '
+                             'first line does not parse as numbers)')
+    parser.add_argument('-n', '--loop', type=int, default=1,
+                        help='number of passes, 0 to loop forever')
+    return parser.parse_args(argv)
+
+
+def _count_header(source, delimiter):
+    """
+    1 if the first line of `source` is not numbers, i.e. column names.
+    """
+    f = _open(source)
+    try:
+        line = f.readline()
+    finally:
+        f.close()
+    try:
+        [float(field) for field in
+         line.split(delimiter.encode('ascii')) if field.strip()]
+    except ValueError:
+        return 1
+    return 0
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    header = args.header
+    if header is None:
+        header = _count_header(args.source, args.delimiter)
+    rp = Replay(args.source, args.target, rate=args.rate, speed=args.speed,
+                burst=args.burst, timecolumn=args.timecolumn,
+                delimiter=args.delimiter, header=header, loop=args.loop)
+    try:
+        stats = rp.run()
+    except KeyboardInterrupt:
+        stats = rp.stats
+    sys.stderr.write('{0} lines, {1} bytes in {2:.3f} s, max lag '
+                     '{3:.3f} s\n'.format(*stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
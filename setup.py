@@ -1,13 +1,23 @@
 #!/usr/bin/env python
 
+import sys
 from setuptools import setup
 
+modules = ['pyoscope', 'readers', 'batch', 'pyoscope_cli', 'remote',
+           'memory', 'replay']
+if sys.version_info >= (3, 6):  # The asyncio front end needs async/await
+    modules.append('aioscope')
+
 setup(name='PyOscope',
       version='1.0.1',
       description='Realtime plotter of data from files',
       author='Justin Lazear',
       author_email='jlazear@gmail.com',
       url='https://www.github.com/jlazear/pyoscope',
-      py_modules=['pyoscope', 'readers'],
-      install_requires=['numpy', 'matplotlib']
+      py_modules=modules,
+      install_requires=['numpy', 'matplotlib'],
+      entry_points={'console_scripts': ['pyoscope = pyoscope_cli:main',
+                                        'pyoscope-batch = batch:main',
+                                        'pyoscope-view = remote:main',
+                                        'pyoscope-replay = replay:main']}
       )